@@ -0,0 +1,25 @@
+"""
+Gunicorn profile for serving the ASGI application with uvicorn workers:
+
+    gunicorn -c deploy/gunicorn_asgi.py myproject.asgi:application
+
+Each worker runs one event loop, so the async views (dashboard data, order submission,
+price history, quotes, update-prices and the SSE stream) wait on the database and the
+price providers without holding a worker. Sync views still work; Django runs them in
+a thread.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# graceful_timeout bounds how long open SSE streams may delay a reload.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+# Connections are per thread and async requests don't reliably return to the same one,
+# so persistent connections pile up under ASGI; use a pooler (e.g. PgBouncer) instead.
+os.environ.setdefault("DB_CONN_MAX_AGE", "0")
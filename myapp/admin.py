@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Currency
+
+
+@admin.register(Currency)
+class CurrencyAdmin(admin.ModelAdmin):
+    list_display = ("base_currency", "quote_currency", "provider_id", "current_price", "price_updated_at")
+    search_fields = ("base_currency", "provider_id")
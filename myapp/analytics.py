@@ -0,0 +1,277 @@
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Currency, PriceCandle, PriceHistory, Profile, Trade
+from .rollups import source_for_resolution
+
+METHODS = ("fifo", "average")
+SECONDS_PER_YEAR = 365 * 86400
+
+
+def _column(values, dtype=float):
+    return np.array(values, dtype=dtype) if values else np.empty(0, dtype=dtype)
+
+
+def load_trades(user, pair=None):
+    """
+    A user's trades in execution order as parallel arrays (one query): ``ts`` (unix
+    seconds), ``pair`` (currency pair id), ``sign`` (+1 buy / -1 sell), ``amount``,
+    ``usd`` and ``price``.
+    """
+    qs = Trade.objects.filter(user=user)
+    if pair is not None:
+        qs = qs.filter(currency_pair=pair)
+    rows = list(qs.order_by("timestamp", "id").values_list(
+        "timestamp", "currency_pair_id", "side", "amount", "usd_value", "price"
+    ))
+    ts, pairs, sides, amounts, usd, prices = zip(*rows) if rows else ((),) * 6
+    return {
+        "ts": _column([t.timestamp() for t in ts]),
+        "pair": _column(pairs, np.int64),
+        "sign": _column([1.0 if side == "BUY" else -1.0 for side in sides]),
+        "amount": _column(amounts),
+        "usd": _column(usd),
+        "price": _column(prices),
+    }
+
+
+def load_prices(pair_ids, start=None, end=None, resolution=0):
+    """
+    Prices of ``pair_ids`` as parallel ``ts`` / ``pair`` / ``price`` arrays, ordered by
+    pair then time. With a ``resolution`` (seconds) of a minute or more they come from
+    the coarsest rollup that fine (each candle's close, stamped at the end of its bucket),
+    so a long window reads one row per bucket instead of every tick, and still works
+    past the raw retention. Each pair's newest, possibly partial, candle and anything
+    after it are read from raw ticks. One query for raw ticks, two with a rollup.
+    """
+    pair_ids = list(pair_ids)
+    source = source_for_resolution(resolution)
+    rows, raw = [], Q(currency_pair_id__in=pair_ids)
+    if source != "raw":
+        seconds = PriceCandle.INTERVAL_SECONDS[source]
+        candles = PriceCandle.objects.filter(currency_pair_id__in=pair_ids, interval=source)
+        if start is not None:
+            candles = candles.filter(bucket_start__gte=start)
+        if end is not None:
+            candles = candles.filter(bucket_start__lt=end)
+        by_pair = {}
+        for pair_id, bucket, close in candles.order_by("currency_pair_id", "bucket_start").values_list(
+            "currency_pair_id", "bucket_start", "close"
+        ):
+            by_pair.setdefault(pair_id, []).append((pair_id, bucket + timedelta(seconds=seconds), close))
+        raw = Q(currency_pair_id__in=[p for p in pair_ids if p not in by_pair])
+        for pair_id, closes in by_pair.items():
+            newest = closes.pop()
+            rows.extend(closes)
+            raw |= Q(currency_pair_id=pair_id, timestamp__gte=newest[1] - timedelta(seconds=seconds))
+    qs = PriceHistory.objects.filter(raw)
+    if start is not None:
+        qs = qs.filter(timestamp__gte=start)
+    if end is not None:
+        qs = qs.filter(timestamp__lt=end)
+    rows.extend(qs.values_list("currency_pair_id", "timestamp", "price"))
+    rows.sort(key=lambda row: (row[0], row[1]))
+    pairs, ts, prices = zip(*rows) if rows else ((),) * 3
+    return {
+        "ts": _column([t.timestamp() for t in ts]),
+        "pair": _column(pairs, np.int64),
+        "price": _column(prices),
+    }
+
+
+def linear_scan(a, b):
+    """
+    Solve ``x[i] = a[i] * x[i - 1] + b[i]`` (with ``x[-1] = 0``) for every ``i`` as a
+    log-step parallel prefix over the affine maps, so the recurrence runs in NumPy
+    rather than a Python loop and never divides by a shrinking running product.
+    """
+    a = np.asarray(a, dtype=float).copy()
+    x = np.asarray(b, dtype=float).copy()
+    shift = 1
+    while shift < len(x):
+        x[shift:] = a[shift:] * x[:-shift] + x[shift:]
+        a[shift:] = a[shift:] * a[:-shift]
+        shift *= 2
+    return x
+
+
+def fifo_pnl(sign, amount, usd):
+    """
+    FIFO cost basis of one pair's trades. Buys laid end to end form a piecewise-linear
+    "cost of the first u units" curve, so the cost of everything sold is one
+    interpolation at the total units sold. Returns ``(position, cost_basis, realized)``.
+    """
+    buys = sign > 0
+    lot_units = np.concatenate(([0.0], np.cumsum(amount[buys])))
+    lot_cost = np.concatenate(([0.0], np.cumsum(usd[buys])))
+    sold = amount[~buys].sum()
+    consumed = float(np.interp(sold, lot_units, lot_cost))
+    return lot_units[-1] - sold, lot_cost[-1] - consumed, usd[~buys].sum() - consumed
+
+
+def average_cost_pnl(sign, amount, usd):
+    """
+    Average-cost basis of one pair's trades: buys add their cost, sells keep the cost
+    per unit and shrink the basis in proportion to the position. Returns
+    ``(position, cost_basis, realized)``.
+    """
+    position = np.maximum(np.cumsum(sign * amount), 0.0)
+    before = np.concatenate(([0.0], position[:-1]))
+    kept = np.divide(position, before, out=np.zeros_like(position), where=before > 0)
+    cost = linear_scan(np.where(sign > 0, 1.0, kept), np.where(sign > 0, usd, 0.0))
+    released = np.concatenate(([0.0], cost[:-1])) - cost
+    sells = sign < 0
+    return position[-1], cost[-1], (usd[sells] - released[sells]).sum()
+
+
+def positions(trades, method="fifo"):
+    """``{pair_id: (position, cost_basis, realized)}`` for every pair in ``trades``."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    pnl = fifo_pnl if method == "fifo" else average_cost_pnl
+    out = {}
+    for pair_id in np.unique(trades["pair"]):
+        mask = trades["pair"] == pair_id
+        out[int(pair_id)] = pnl(trades["sign"][mask], trades["amount"][mask], trades["usd"][mask])
+    return out
+
+
+def forward_fill(ts, values, grid):
+    """Last value at or before each grid time; NaN before the first observation."""
+    index = np.searchsorted(ts, grid, side="right") - 1
+    return np.where(index >= 0, values[np.maximum(index, 0)], np.nan) if len(ts) else np.full(len(grid), np.nan)
+
+
+def equity_curve(grid, trades, prices, start_cash):
+    """
+    Cash plus marked-to-market holdings at every time in ``grid``. Positions and cash
+    are step functions of the trade log; each pair is priced at its latest tick (or
+    fill, whichever is newer) at or before the grid time.
+    """
+    executed = np.searchsorted(trades["ts"], grid, side="right")
+    cash = start_cash + np.concatenate(([0.0], np.cumsum(-trades["sign"] * trades["usd"])))[executed]
+    equity = cash
+    for pair_id in np.unique(trades["pair"]):
+        mine = trades["pair"] == pair_id
+        held = np.concatenate(([0.0], np.cumsum(trades["sign"][mine] * trades["amount"][mine])))
+        position = held[np.searchsorted(trades["ts"][mine], grid, side="right")]
+        ticks = prices["pair"] == pair_id
+        ts = np.concatenate((prices["ts"][ticks], trades["ts"][mine]))
+        px = np.concatenate((prices["price"][ticks], trades["price"][mine]))
+        order = np.argsort(ts, kind="stable")
+        mark = forward_fill(ts[order], px[order], grid)
+        equity = equity + np.where(position != 0, position * mark, 0.0)
+    return equity
+
+
+def simple_returns(values):
+    return np.diff(values) / values[:-1] if len(values) > 1 else np.empty(0)
+
+
+def drawdown(values):
+    """Fractional distance below the running peak (0 at a new high, negative otherwise)."""
+    if not len(values):
+        return np.empty(0)
+    return values / np.maximum.accumulate(values) - 1.0
+
+
+def rolling_volatility(returns, window, periods_per_year=None):
+    """
+    Sample standard deviation of ``returns`` over each trailing ``window`` from running
+    sums of the (demeaned) returns and their squares: O(n) however wide the window.
+    Annualized when ``periods_per_year`` is given. Returns ``len(returns) - window + 1`` values.
+    """
+    if window < 2 or len(returns) < window:
+        return np.empty(0)
+    r = returns - returns.mean()
+    s1 = np.concatenate(([0.0], np.cumsum(r)))
+    s2 = np.concatenate(([0.0], np.cumsum(r * r)))
+    total, squares = s1[window:] - s1[:-window], s2[window:] - s2[:-window]
+    vol = np.sqrt(np.maximum(squares - total * total / window, 0.0) / (window - 1))
+    return vol * math.sqrt(periods_per_year) if periods_per_year else vol
+
+
+def time_grid(start, end, step):
+    """Regular sample times from ``start`` to ``end``; ``step`` widens so there are at most ANALYTICS_MAX_POINTS."""
+    max_points = getattr(settings, "ANALYTICS_MAX_POINTS", 5000)
+    step = max(step, math.ceil((end - start) / max(max_points - 1, 1)))
+    first = start - start % step
+    return np.arange(first, end + step, step, dtype=float), step
+
+
+def _num(value, places=2):
+    value = float(value)
+    return round(value, places) if math.isfinite(value) else None
+
+
+def portfolio_report(user, method="fifo", step=3600, window=24, now=None):
+    """
+    Realized/unrealized P&L per pair plus the equity curve, total return, drawdown and
+    rolling volatility sampled every ``step`` seconds since the first trade, marked from
+    the rollup matching ``step``. Five queries however long the history.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    if step <= 0 or window < 2:
+        raise ValueError("step must be positive and window at least 2")
+    trades = load_trades(user)
+    balance = float(Profile.objects.filter(user=user).values_list("balance", flat=True).first() or 0)
+    report = {
+        "method": method, "positions": [], "realized": 0.0, "unrealized": 0.0,
+        "equity": {"t": [], "v": []}, "return": None, "max_drawdown": None, "drawdown": None, "volatility": None,
+    }
+    if not len(trades["ts"]):
+        return report
+
+    now = now if now is not None else time.time()
+    pairs = {
+        pk: (symbol, float(price))
+        for pk, symbol, price in Currency.objects.filter(pk__in=np.unique(trades["pair"]).tolist())
+        .values_list("pk", "base_currency", "current_price")
+    }
+    for pair_id, (position, cost_basis, realized) in positions(trades, method).items():
+        symbol, price = pairs[pair_id]
+        value = position * price
+        report["positions"].append({
+            "symbol": symbol, "position": _num(position, 8), "cost_basis": _num(cost_basis),
+            "market_value": _num(value), "realized": _num(realized), "unrealized": _num(value - cost_basis),
+        })
+        report["realized"] += realized
+        report["unrealized"] += value - cost_basis
+    report["realized"], report["unrealized"] = _num(report["realized"]), _num(report["unrealized"])
+
+    grid, step = time_grid(trades["ts"][0], now, step)
+    prices = load_prices(pairs, start=datetime.fromtimestamp(trades["ts"][0], tz=dt_timezone.utc), resolution=step)
+    start_cash = balance + float((trades["sign"] * trades["usd"]).sum())
+    equity = equity_curve(grid, trades, prices, start_cash)
+    dd = drawdown(equity)
+    vol = rolling_volatility(simple_returns(equity), window, SECONDS_PER_YEAR / step)
+    report.update({
+        "step": step,
+        "equity": {"t": grid.astype(int).tolist(), "v": [_num(v) for v in equity]},
+        "return": _num(equity[-1] / equity[0] - 1.0, 6),
+        "max_drawdown": _num(dd.min(), 6),
+        "drawdown": _num(dd[-1], 6),
+        "volatility": _num(vol[-1], 6) if len(vol) else None,
+    })
+    return report
+
+
+def pair_report(pair, start=None, end=None, window=60):
+    """Return, drawdown and per-tick rolling volatility of one pair's raw ticks (one query)."""
+    prices = load_prices([pair.pk], start=start, end=end)["price"]
+    if not len(prices):
+        return {"symbol": pair.base_currency, "ticks": 0, "return": None, "max_drawdown": None, "volatility": None}
+    vol = rolling_volatility(np.diff(np.log(prices)), window)
+    return {
+        "symbol": pair.base_currency,
+        "ticks": len(prices),
+        "return": _num(prices[-1] / prices[0] - 1.0, 6),
+        "max_drawdown": _num(drawdown(prices).min(), 6),
+        "volatility": _num(vol[-1], 8) if len(vol) else None,
+    }
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import symbols  # noqa: F401  (connects index invalidation signals)
+        from .metrics import install_query_timer
+
+        connection_created.connect(install_query_timer)
@@ -0,0 +1,281 @@
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+
+from .analytics import fifo_pnl
+from .db_router import replica_reads
+from .models import Currency, PriceHistory
+
+# Prices are held as integers in units of 1e-8 USD and holdings in units of 1e-8 coins
+# (the precision of the DecimalFields), cash in cents, so fills round exactly like
+# Trade.units_for / Trade._apply without Decimal arithmetic in the replay loop.
+PRICE_SCALE = 10 ** 8
+START_CASH = Decimal("10000.00")
+
+
+class Portfolio:
+    """
+    In-memory account for one backtest: cash in cents, one int64 holding slot per pair
+    and a columnar fill log in ``array`` buffers. ``execute()`` applies the same checks
+    as ``Trade.execute``.
+    """
+
+    def __init__(self, cash, pairs):
+        self.cash = int(Decimal(cash) * 100)
+        self.units = np.zeros(pairs, dtype=np.int64)
+        self.rejected = 0
+        self.fill_ts = array("d")
+        self.fill_pair = array("q")
+        self.fill_sign = array("b")
+        self.fill_units = array("q")
+        self.fill_cents = array("q")
+
+    def execute(self, ts, pair, side, cents, price):
+        """Fill ``cents`` worth of ``pair`` at integer ``price``; ``cents=None`` sells the whole position."""
+        if cents is None:
+            cents = int(self.units[pair]) * price // 10 ** 14
+        units = cents * 10 ** 14 // price
+        if units <= 0:
+            self.rejected += 1
+            return False
+        if side == "BUY":
+            if self.cash < cents:
+                self.rejected += 1
+                return False
+            self.cash -= cents
+            self.units[pair] += units
+        else:
+            if self.units[pair] < units:
+                self.rejected += 1
+                return False
+            self.cash += cents
+            self.units[pair] -= units
+        self.fill_ts.append(ts)
+        self.fill_pair.append(pair)
+        self.fill_sign.append(1 if side == "BUY" else -1)
+        self.fill_units.append(units)
+        self.fill_cents.append(cents)
+        return True
+
+    def __len__(self):
+        return len(self.fill_ts)
+
+    def fills(self, first=0):
+        """The fill log from index ``first`` on, as NumPy arrays."""
+        # Slicing copies, so the buffers can keep growing while these arrays are alive.
+        return {
+            "ts": np.frombuffer(self.fill_ts[first:], dtype=float),
+            "pair": np.frombuffer(self.fill_pair[first:], dtype=np.int64),
+            "sign": np.frombuffer(self.fill_sign[first:], dtype=np.int8),
+            "units": np.frombuffer(self.fill_units[first:], dtype=np.int64).astype(float),
+            "cents": np.frombuffer(self.fill_cents[first:], dtype=np.int64).astype(float),
+        }
+
+
+class Strategy:
+    """
+    Turns a chunk of ticks into orders. ``orders()`` receives parallel arrays of tick
+    times, pair indexes and float prices (plus the read-only portfolio) and returns
+    ``(tick_index, pair_index, side, cents)`` tuples in tick order; ``cents=None`` on a
+    SELL means the whole position. Strategies keep whatever state they need across chunks.
+    """
+
+    def orders(self, ts, pair, price, portfolio):
+        return []
+
+
+class BuyAndHold(Strategy):
+    """Buy ``usd`` of every pair on its first tick and hold."""
+
+    def __init__(self, usd=1000):
+        self.cents = int(Decimal(str(usd)) * 100)
+        self.bought = set()
+
+    def orders(self, ts, pair, price, portfolio):
+        out = []
+        for p in np.unique(pair):
+            if p not in self.bought:
+                self.bought.add(p)
+                out.append((int(np.argmax(pair == p)), int(p), "BUY", self.cents))
+        return sorted(out)
+
+
+class MovingAverageCross(Strategy):
+    """Buy ``usd`` when the ``fast``-tick mean crosses above the ``slow`` one; sell everything on the cross back."""
+
+    def __init__(self, fast=20, slow=100, usd=1000):
+        if not 0 < int(fast) < int(slow):
+            raise ValueError("fast must be positive and shorter than slow")
+        self.fast, self.slow = int(fast), int(slow)
+        self.cents = int(Decimal(str(usd)) * 100)
+        self.tail = {}
+        self.above = {}
+
+    def orders(self, ts, pair, price, portfolio):
+        out = []
+        for p in np.unique(pair):
+            idx = np.flatnonzero(pair == p)
+            tail = self.tail.get(p, np.empty(0))
+            series = np.concatenate((tail, price[idx]))
+            self.tail[p] = series[-(self.slow - 1):]
+            if len(series) < self.slow:
+                continue
+            sums = np.concatenate(([0.0], np.cumsum(series)))
+            slow_ma = (sums[self.slow:] - sums[:-self.slow]) / self.slow
+            fast_ma = ((sums[self.fast:] - sums[:-self.fast]) / self.fast)[self.slow - self.fast:]
+            # above[k] describes series[slow - 1 + k]; keep only this chunk's ticks.
+            above = (fast_ma > slow_ma)[max(len(tail) - self.slow + 1, 0):]
+            previous = self.above.get(p)
+            self.above[p] = bool(above[-1])
+            flips = np.flatnonzero(above[1:] != above[:-1]) + 1
+            if previous is not None and above[0] != previous:
+                flips = np.concatenate(([0], flips))
+            offset = len(idx) - len(above)
+            for k in flips:
+                out.append((int(idx[k + offset]), int(p), "BUY" if above[k] else "SELL", self.cents if above[k] else None))
+        return sorted(out)
+
+
+STRATEGIES = {"buy_and_hold": BuyAndHold, "ma_cross": MovingAverageCross}
+
+
+def make_strategy(name, params=None):
+    if name not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {', '.join(STRATEGIES)}")
+    return STRATEGIES[name](**(params or {}))
+
+
+def tick_chunks(pair_ids, start=None, end=None, chunk_size=None):
+    """
+    Stream ticks of ``pair_ids`` in time order as ``(ts, pair_index, price)`` array
+    chunks, ``pair_index`` being the position in ``pair_ids`` and ``price`` an integer
+    in 1e-8 USD. Rows come from a server-side cursor, so memory stays at one chunk.
+    """
+    chunk_size = chunk_size or getattr(settings, "BACKTEST_CHUNK_SIZE", 50_000)
+    index = {pk: i for i, pk in enumerate(pair_ids)}
+    qs = PriceHistory.objects.filter(currency_pair_id__in=list(pair_ids))
+    if start is not None:
+        qs = qs.filter(timestamp__gte=start)
+    if end is not None:
+        qs = qs.filter(timestamp__lt=end)
+    rows = qs.order_by("timestamp", "id").values_list("timestamp", "currency_pair_id", "price").iterator(
+        chunk_size=chunk_size
+    )
+    ts, pair, price = array("d"), array("q"), array("q")
+    for stamp, pair_id, value in rows:
+        ts.append(stamp.timestamp())
+        pair.append(index[pair_id])
+        price.append(int(value.scaleb(8)))
+        if len(ts) == chunk_size:
+            yield np.frombuffer(ts), np.frombuffer(pair, dtype=np.int64), np.frombuffer(price, dtype=np.int64)
+            ts, pair, price = array("d"), array("q"), array("q")
+    if ts:
+        yield np.frombuffer(ts), np.frombuffer(pair, dtype=np.int64), np.frombuffer(price, dtype=np.int64)
+
+
+def _chunk_equity(pair, price, at, fills, cash, units, last):
+    """
+    Equity in cents after every tick of a chunk, given the tick indexes ``at`` of the
+    chunk's fills. Cash and holdings are step functions of the fills and each pair is
+    marked at its latest tick; ``last`` (the marks before the chunk) is updated in place.
+    """
+    n = len(pair)
+    steps = np.searchsorted(np.asarray(at, dtype=np.int64), np.arange(n), side="right")
+    signed = fills["sign"].astype(float)
+    equity = np.cumsum(np.concatenate(([float(cash)], -signed * fills["cents"])))[steps]
+    for p in range(len(units)):
+        mine = pair == p
+        seen = np.maximum.accumulate(np.where(mine, np.arange(n), -1))
+        mark = np.where(seen >= 0, price[np.maximum(seen, 0)], last[p]).astype(float)
+        delta = np.where(fills["pair"] == p, signed * fills["units"], 0.0)
+        held = float(units[p]) + np.concatenate(([0.0], np.cumsum(delta)))[steps]
+        equity += held * mark / 10 ** 14
+        if seen[-1] >= 0:
+            last[p] = price[seen[-1]]
+    return equity
+
+
+def replay(strategy, chunks, pairs, cash=START_CASH):
+    """
+    Run ``strategy`` over ``chunks`` of ``(ts, pair_index, price)`` ticks for ``pairs``
+    pairs. Equity (cash plus holdings at each pair's last price) is evaluated at every
+    tick with array operations to track the drawdown. Returns ``(portfolio, stats)``.
+    """
+    portfolio = Portfolio(cash, pairs)
+    last = np.zeros(pairs, dtype=np.int64)
+    start_cents = portfolio.cash
+    peak, max_dd, ticks = float(start_cents), 0.0, 0
+    started = time.perf_counter()
+
+    for ts, pair, price in chunks:
+        ticks += len(ts)
+        cash, units, first = portfolio.cash, portfolio.units.copy(), len(portfolio)
+        at = []
+        for i, p, side, cents in strategy.orders(ts, pair, price / PRICE_SCALE, portfolio):
+            if portfolio.execute(float(ts[i]), p, side, cents, int(price[i])):
+                at.append(i)
+        equity = _chunk_equity(pair, price, at, portfolio.fills(first), cash, units, last)
+        peaks = np.maximum.accumulate(np.concatenate(([peak], equity)))[1:]
+        max_dd = min(max_dd, float((equity / peaks - 1.0).min()))
+        peak = float(peaks[-1])
+
+    elapsed = time.perf_counter() - started
+    final = portfolio.cash + int(sum(int(u) * int(p) // 10 ** 14 for u, p in zip(portfolio.units, last)))
+    fills = portfolio.fills()
+    realized = 0.0
+    for p in np.unique(fills["pair"]):
+        mine = fills["pair"] == p
+        realized += fifo_pnl(fills["sign"][mine], fills["units"][mine] / PRICE_SCALE, fills["cents"][mine] / 100)[2]
+    return portfolio, {
+        "ticks": ticks,
+        "fills": len(portfolio),
+        "rejected": portfolio.rejected,
+        "start_cash": start_cents / 100,
+        "cash": portfolio.cash / 100,
+        "final_equity": final / 100,
+        "return": round(final / start_cents - 1.0, 6),
+        "realized": round(float(realized), 2),
+        "max_drawdown": round(max_dd, 6),
+        "seconds": round(elapsed, 3),
+        "ticks_per_second": round(ticks / elapsed) if elapsed else None,
+    }
+
+
+def run_backtest(strategy, params=None, symbols=None, start=None, end=None, cash=START_CASH, chunk_size=None):
+    """
+    Backtest the named strategy on the stored ``PriceHistory`` of ``symbols`` (default:
+    every USD pair). Only reads the database (a replica, when configured); returns the
+    stats dict from ``replay()`` plus the run's configuration.
+    """
+    with replica_reads():
+        qs = Currency.objects.filter(quote_currency="USD")
+        if symbols:
+            qs = qs.filter(base_currency__in=[s.upper() for s in symbols])
+        pairs = dict(qs.order_by("base_currency").values_list("pk", "base_currency"))
+        if not pairs:
+            raise ValueError("no matching pairs")
+        chunks = tick_chunks(list(pairs), start, end, chunk_size)
+        _, stats = replay(make_strategy(strategy, params), chunks, len(pairs), cash)
+    return {"strategy": strategy, "params": params or {}, "symbols": list(pairs.values()), **stats}
+
+
+def _run_spec(spec):
+    return run_backtest(**spec)
+
+
+def run_many(specs, workers=None):
+    """
+    Run independent backtests (``run_backtest`` keyword dicts) across a process pool,
+    one strategy per task. Results come back in ``specs`` order.
+    """
+    if workers == 1 or len(specs) <= 1:
+        return [_run_spec(spec) for spec in specs]
+    # Don't let forked workers inherit the parent's open database sockets.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run_spec, specs))
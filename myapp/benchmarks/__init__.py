@@ -0,0 +1,62 @@
+"""
+Reproducible benchmarks (``python manage.py benchmark``):
+
+* ``micro`` - single hot paths timed in-process at several data sizes (micro.py)
+* ``load`` - concurrent signup/login/dashboard/trade sessions against a local server
+  with a stubbed price provider (load.py)
+
+Both produce JSON reports with p50/p99 latency and throughput plus enough about the
+environment to compare runs between releases.
+"""
+import json
+import platform
+import subprocess
+import sys
+
+import django
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+
+def summarize(latencies, seconds=None, errors=0):
+    """p50/p99/mean latency (ms) of ``latencies`` (seconds) and throughput over ``seconds``
+    (the wall-clock time of the run; defaults to the latencies' sum, i.e. one at a time)."""
+    ms = np.asarray(latencies, dtype=float) * 1000
+    seconds = float(ms.sum() / 1000) if seconds is None else seconds
+    return {
+        "n": int(len(ms)),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3) if len(ms) else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 3) if len(ms) else None,
+        "mean_ms": round(float(ms.mean()), 3) if len(ms) else None,
+        "per_second": round(len(ms) / seconds, 1) if seconds else None,
+    }
+
+
+def environment():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "started_at": timezone.now().isoformat(),
+        "revision": revision,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "platform": platform.platform(),
+        "database": settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1],
+        "argv": sys.argv[1:],
+    }
+
+
+def write_report(report, path=None, stdout=None):
+    """Write ``report`` as JSON to ``path``, or to ``stdout`` when no path is given."""
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        stdout.write(text)
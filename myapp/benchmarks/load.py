@@ -0,0 +1,94 @@
+"""
+Load generator: virtual users sign up, log in again, open the dashboard and trade
+through the HTML forms, ``concurrency`` of them at a time, against a running server.
+"""
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from . import summarize
+
+STEPS = ("signup", "login", "dashboard", "trade")
+PASSWORD = "load-test-pw-1"
+
+
+class _Session:
+    def __init__(self, client, timings, errors):
+        self.client = client
+        self.timings = timings
+        self.errors = errors
+
+    def _csrf(self):
+        return {"csrfmiddlewaretoken": self.client.cookies.get("csrftoken", "")}
+
+    async def form(self, path, data):
+        """GET ``path`` for its CSRF cookie, then POST ``data`` to it."""
+        await self.client.get(path)
+        return await self.client.post(path, data={**self._csrf(), **data})
+
+    async def step(self, name, expect, send):
+        """Time ``send()`` as one ``name`` step; False (and an error counted) unless it answers ``expect``."""
+        start = time.perf_counter()
+        try:
+            ok = (await send()).status_code == expect
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            self.timings[name].append(time.perf_counter() - start)
+        else:
+            self.errors[name] += 1
+        return ok
+
+
+async def _user_flow(session, username, pair_id, trades):
+    credentials = {"username": username, "password": PASSWORD}
+    if not await session.step("signup", 302, lambda: session.form(
+        "/signup/", {**credentials, "email": f"{username}@example.com", "confirm_password": PASSWORD}
+    )):
+        return
+
+    async def login():
+        await session.client.get("/logout/")
+        return await session.form("/login/", credentials)
+
+    if not await session.step("login", 302, login):
+        return
+    for i in range(trades):
+        if not await session.step("dashboard", 200, lambda: session.client.get("/dashboard/")):
+            return
+        side = "BUY" if i % 2 == 0 else "SELL"
+        amount = "25" if side == "BUY" else "10"
+        if not await session.step("trade", 302, lambda: session.client.post("/dashboard/", data={
+            **session._csrf(), "currency_pair": pair_id, "side": side, "amount": amount,
+        })):
+            return
+
+
+async def run_load(base_url, pair_id, users=20, concurrency=10, trades=5):
+    """
+    Run ``users`` virtual users (``concurrency`` at once), each doing signup, login and
+    ``trades`` dashboard-then-trade rounds in ``pair_id``. Returns per-step latency and
+    throughput over the whole run.
+    """
+    timings = {step: [] for step in STEPS}
+    errors = {step: 0 for step in STEPS}
+    prefix = f"load-{uuid.uuid4().hex[:8]}"
+    slots = asyncio.Semaphore(concurrency)
+
+    async def virtual_user(i):
+        async with slots, httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            await _user_flow(_Session(client, timings, errors), f"{prefix}-{i}", pair_id, trades)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    done = sum(len(t) for t in timings.values())
+    return {
+        "seconds": round(elapsed, 3),
+        "steps_completed": done,
+        "steps_failed": sum(errors.values()),
+        "steps_per_second": round(done / elapsed, 1) if elapsed else None,
+        "steps": {step: summarize(timings[step], elapsed, errors[step]) for step in STEPS},
+    }
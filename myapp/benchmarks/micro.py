@@ -0,0 +1,176 @@
+"""
+Micro-benchmarks: hot paths timed in-process against the configured database at
+several data sizes. Every (benchmark, size) run seeds its own rows inside a
+transaction that is rolled back afterwards, so nothing is left behind.
+"""
+import itertools
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from ..caching import prices
+from ..models import Currency, Holding, PortfolioValuation, PriceHistory, Trade
+from ..price_cache import price_cache
+from ..symbols import symbol_index
+from ..tasks import fetch_and_update_prices
+from . import summarize
+from .server import stub_provider
+
+PRICE = Decimal("50000")
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register ``fn(size)``, which seeds ``size`` rows and returns the callable to time."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def _rolled_back():
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def _pair(symbol, price=PRICE):
+    return Currency.objects.create(
+        base_currency=symbol, quote_currency="USD", provider_id=f"bench-{symbol.lower()}", current_price=price
+    )
+
+
+def _trader(name, pair, trades):
+    """A user with ``trades`` past trades (and the matching holding) in ``pair``."""
+    user = User.objects.create(username=name)
+    unit = Decimal("0.0002")
+    now = timezone.now()
+    Trade.objects.bulk_create([
+        Trade(user=user, currency_pair=pair, side="BUY", amount=unit, usd_value=Decimal("10"), price=PRICE,
+              timestamp=now - timedelta(seconds=trades - i))
+        for i in range(trades)
+    ], batch_size=5000)
+    Holding.objects.create(user=user, currency_pair=pair, amount=unit * trades)
+    PortfolioValuation.revalue(users=[user])
+    return user
+
+
+@benchmark("trade_execute")
+def _trade_execute(size):
+    """Alternating $10 buys and sells for a user with ``size`` past trades."""
+    pair = _pair("BENCHTX")
+    user = _trader("bench-trader", pair, size)
+    sides = itertools.cycle(("BUY", "SELL"))
+    return lambda: Trade.execute(user, pair, next(sides), Decimal("10"), price=PRICE)
+
+
+@benchmark("dashboard_queries")
+def _dashboard(size):
+    """The dashboard's valuation, holdings and recent-trades queries for a user with ``size`` trades."""
+    from ..views import dashboard_queries
+
+    user = _trader("bench-dashboard", _pair("BENCHDB"), size)
+
+    def run():
+        valuation, holdings, trades = dashboard_queries(user)
+        return valuation, list(holdings), list(trades)
+    return run
+
+
+def _history_view(symbol, size):
+    from ..views import price_history_api
+
+    pair = _pair(symbol)
+    now = timezone.now()
+    PriceHistory.objects.bulk_create([
+        PriceHistory(currency_pair=pair, price=PRICE + i % 100, timestamp=now - timedelta(seconds=size - i))
+        for i in range(size)
+    ], batch_size=5000)
+    request = RequestFactory().get(f"/api/price-history/{symbol}/")
+    view = async_to_sync(price_history_api)
+
+    def run():
+        response = view(request, symbol)
+        if response.status_code != 200:
+            raise RuntimeError(f"price_history_api answered {response.status_code}")
+        return response
+    return run
+
+
+@benchmark("price_history_api")
+def _price_history(size):
+    """``price_history_api`` over ``size`` ticks, rebuilding the body each time (shared cache bumped)."""
+    view = _history_view("BENCHPH", size)
+
+    def run():
+        prices.bump()
+        return view()
+    return run
+
+
+@benchmark("price_history_api_cached")
+def _price_history_cached(size):
+    """``price_history_api`` over ``size`` ticks, served from the shared cache."""
+    return _history_view("BENCHPC", size)
+
+
+@benchmark("fetch_and_update_prices")
+def _fetch_and_update(size):
+    """One ingestion tick for ``size`` tracked symbols from a local stub provider."""
+    Currency.objects.bulk_create([
+        Currency(base_currency=f"BENCH{i}", quote_currency="USD", provider_id=f"bench-coin-{i}")
+        for i in range(size)
+    ])
+    symbol_index.invalidate()
+    return fetch_and_update_prices
+
+
+def run_micro(sizes, repeat=20, warmup=2, names=None):
+    """
+    Time each benchmark in ``names`` (default: all) ``repeat`` times at every size in
+    ``sizes``, after ``warmup`` untimed calls. Returns one result dict per (benchmark, size).
+    A call that raises is counted in ``errors`` and left out of the latencies.
+    """
+    results = []
+    for name in names or BENCHMARKS:
+        setup = BENCHMARKS[name]
+        for size in sizes:
+            with stub_provider() as provider_url, override_settings(
+                COINGECKO_URL=provider_url, PRICE_PROVIDERS="coingecko", PRICE_PROVIDER_RATE_LIMIT=0
+            ):
+                try:
+                    with _rolled_back():
+                        fn = setup(size)
+                        for _ in range(warmup):
+                            fn()
+                        latencies, errors = [], 0
+                        for _ in range(repeat):
+                            start = time.perf_counter()
+                            try:
+                                fn()
+                            except Exception:
+                                errors += 1
+                                continue
+                            latencies.append(time.perf_counter() - start)
+                finally:
+                    # Rolled-back pairs must not linger in this process's caches.
+                    symbol_index.invalidate()
+                    price_cache.clear()
+            results.append({"benchmark": name, "size": size, **summarize(latencies, errors=errors)})
+    return results
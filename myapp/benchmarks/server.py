@@ -0,0 +1,128 @@
+"""A stub price provider and throwaway gunicorn servers for the load benchmarks."""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from django.conf import settings
+from django.core.management.base import CommandError
+
+SERVERS = {
+    "wsgi": ["myproject.wsgi:application", "--worker-class", "sync"],
+    "asgi": ["-c", "deploy/gunicorn_asgi.py", "myproject.asgi:application"],
+}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """CoinGecko ``simple/price`` stand-in: quotes every requested id after ``server.delay`` seconds."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as two writes; with Nagle on, the body waits for the
+    # client's delayed ACK (~40ms) on every keep-alive request.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        query = parse_qs(urlsplit(self.path).query)
+        ids = [i for i in query.get("ids", ["bitcoin"])[0].split(",") if i]
+        body = json.dumps({i: {"usd": self.server.prices.get(i, 100)} for i in ids}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def stub_provider(delay=0.0, prices=None):
+    """Serve the stub provider on a free local port; yields its ``simple/price`` URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.prices = {"bitcoin": 60000, "ethereum": 3000, **(prices or {})}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/simple/price"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def throwaway_env(directory, provider_url, **overrides):
+    """Environment for a server on a fresh SQLite database in ``directory`` using the stub provider."""
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'db.sqlite3')}",
+        "DATABASE_REPLICA_URLS": "",
+        "COINGECKO_URL": provider_url,
+        "PRICE_PROVIDERS": "coingecko",
+        "PRICE_PROVIDER_RATE_LIMIT": "0",
+        "ALLOWED_HOST": "127.0.0.1",
+        "SECRET_KEY": os.environ.get("SECRET_KEY") or "benchmark",
+        **overrides,
+    }
+
+
+def manage(env, *args):
+    """Run ``manage.py`` with ``env``; returns its stdout."""
+    return subprocess.run(
+        [sys.executable, "manage.py", *args], cwd=settings.BASE_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def prepare_database(env):
+    """Migrate the throwaway database and make sure BTC/USD exists; returns its primary key."""
+    manage(env, "migrate", "--noinput", "-v", "0")
+    return int(manage(env, "shell", "-v", "0", "-c", (
+        "from myapp.models import Currency; "
+        "pair, _ = Currency.objects.update_or_create(base_currency='BTC', quote_currency='USD', "
+        "defaults={'provider_id': 'bitcoin'}); print(pair.pk)"
+    )).strip())
+
+
+@contextmanager
+def serve(name, env, workers, ready_path="/"):
+    """Run gunicorn with the ``name`` profile (see ``SERVERS``) until the block exits; yields its base URL."""
+    port = free_port()
+    cmd = [
+        sys.executable, "-m", "gunicorn", *SERVERS[name],
+        "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning",
+    ]
+    server = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base_url + ready_path, server)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def _wait_ready(url, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise CommandError(f"server exited with status {server.returncode}")
+        try:
+            if httpx.get(url, timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise CommandError(f"server did not answer {url} within {timeout}s")
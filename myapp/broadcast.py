@@ -0,0 +1,111 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .caching import prices
+from .models import Currency, PriceHistory
+
+
+def tick_payload(row):
+    return {
+        "id": row["id"],
+        "symbol": row["currency_pair__base_currency"],
+        "price": str(row["price"]),
+        "timestamp": row["timestamp"].isoformat(),
+    }
+
+
+def ticks_since(last_id, symbols=None, limit=1000):
+    """New ticks after ``last_id`` (oldest first), optionally limited to ``symbols``."""
+    qs = PriceHistory.objects.filter(id__gt=last_id, currency_pair__quote_currency="USD")
+    if symbols:
+        qs = qs.filter(currency_pair__base_currency__in=symbols)
+    rows = qs.order_by("id").values("id", "currency_pair__base_currency", "price", "timestamp")[:limit]
+    return [tick_payload(row) for row in rows]
+
+
+def current_prices(symbols=None):
+    """Snapshot of the USD pairs' prices, shared by every worker until the next ingested tick."""
+    def load():
+        qs = Currency.objects.filter(quote_currency="USD")
+        if symbols:
+            qs = qs.filter(base_currency__in=symbols)
+        return [
+            {"symbol": symbol, "price": str(price), "updated_at": updated_at.isoformat() if updated_at else None}
+            for symbol, price, updated_at in qs.order_by("base_currency").values_list(
+                "base_currency", "current_price", "price_updated_at"
+            )
+        ]
+
+    return prices.get_or_set(("snapshot", ",".join(sorted(symbols or ()))), load)
+
+
+def latest_tick_id():
+    return PriceHistory.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+class Broadcaster:
+    """
+    Fans new price ticks out to every subscribed stream in this process.
+
+    One poller reads ``PriceHistory`` rows newer than the last one it has seen (a single
+    query per ``PRICE_STREAM_POLL_INTERVAL`` however many clients are connected) and
+    pushes them onto each subscriber's queue. Ticks are written by the separate
+    ``ingest_prices`` process, so polling the table is the only delivery path; the
+    poller runs only while someone listens.
+    """
+
+    def __init__(self, poll_interval=None, queue_size=256):
+        self._poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.last_id = None
+        self._task = None
+
+    @property
+    def poll_interval(self):
+        if self._poll_interval is not None:
+            return self._poll_interval
+        return getattr(settings, "PRICE_STREAM_POLL_INTERVAL", 1.0)
+
+    async def subscribe(self, symbols=None):
+        """Register a subscriber; returns its queue. ``symbols`` of None means every pair."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[queue] = set(symbols) if symbols else None
+        if self.last_id is None:
+            self.last_id = await sync_to_async(latest_tick_id)()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.pop(queue, None)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.last_id = None
+
+    def _deliver(self, ticks):
+        ticks = [t for t in ticks if t["id"] > (self.last_id or 0)]
+        if not ticks:
+            return
+        self.last_id = ticks[-1]["id"]
+        for queue, symbols in list(self.subscribers.items()):
+            batch = [t for t in ticks if symbols is None or t["symbol"] in symbols]
+            if not batch:
+                continue
+            if queue.full():
+                # Slow consumer: drop its backlog rather than grow without bound.
+                while not queue.empty():
+                    queue.get_nowait()
+            queue.put_nowait(batch)
+
+    async def _poll(self):
+        while self.subscribers:
+            ticks = await sync_to_async(ticks_since)(self.last_id or 0)
+            self._deliver(ticks)
+            await asyncio.sleep(self.poll_interval)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,69 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+_MISSING = object()
+
+
+class Namespace:
+    """
+    A family of shared-cache entries that go stale together.
+
+    Every key embeds the namespace's current version, which lives in the shared cache
+    itself, so ``bump()`` retires all entries at once for every worker: they are never
+    read again and simply expire. A lost version (eviction, cache restart) restarts
+    from the clock rather than from 1, so old entries can't become current again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.version_key = f"{name}:version"
+
+    def version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def bump(self):
+        try:
+            return cache.incr(self.version_key)
+        except ValueError:
+            return self.version()
+
+    def bump_after_commit(self):
+        """
+        Bump now, for readers inside the current transaction, and again when it commits:
+        a worker that rebuilt an entry from the old rows in between can't keep serving it.
+        """
+        self.bump()
+        transaction.on_commit(self.bump)
+
+    def key(self, *parts):
+        return ":".join([self.name, str(self.version()), *(str(p) for p in parts)])
+
+    def get_or_set(self, parts, build, timeout=DEFAULT_TIMEOUT):
+        """The entry for ``parts`` at the current version, computed with ``build()`` on a miss."""
+        key = self.key(*parts)
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = build()
+            cache.set(key, value, timeout)
+        return value
+
+    async def aget_or_set(self, parts, build, timeout=DEFAULT_TIMEOUT):
+        """Async ``get_or_set()``; ``build`` is a sync callable and runs in a thread."""
+        key = await sync_to_async(self.key)(*parts)
+        value = await cache.aget(key, _MISSING)
+        if value is _MISSING:
+            value = await sync_to_async(build)()
+            await cache.aset(key, value, timeout)
+        return value
+
+
+# Everything derived from stored prices: bumped whenever prices are ingested or a pair changes.
+prices = Namespace("prices")
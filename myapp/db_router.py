@@ -0,0 +1,161 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import transaction
+
+# Per request (or per replica_reads() block): the replica reads may go to (None if not
+# allowed) and whether this context has written. A dict so writes made in sync_to_async threads,
+# which run in a copy of the context, are still seen by the caller.
+_routing = ContextVar("db_routing", default=None)
+
+
+def replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def _state():
+    # Outside a request or replica_reads() block nothing is tracked: reads go to default.
+    state = _routing.get()
+    return state if state is not None else {"replica": None, "pinned": False, "wrote": False}
+
+
+def read_alias():
+    """The database this context's reads go to: its replica when allowed, else ``default``."""
+    state = _state()
+    if not state["replica"] or state["pinned"] or state["wrote"]:
+        return "default"
+    # Reads inside a transaction on the primary must see its uncommitted writes.
+    if transaction.get_connection("default").in_atomic_block:
+        return "default"
+    return state["replica"]
+
+
+class ReplicaRouter:
+    """
+    Sends writes, migrations and by default all reads to ``default``. Code that opts in
+    with ``replica_reads()`` / ``@read_replica`` (history, exports, analytics) reads
+    from one of ``DATABASE_REPLICAS``, unless its user wrote recently (see
+    ``ReplicaPinningMiddleware``) or it has written itself.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        _state()["wrote"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+@contextmanager
+def replica_reads():
+    """
+    Let reads in this block go to a replica (routing state is otherwise inherited). One
+    replica, picked at random, serves the whole block, so its queries see a single
+    consistent snapshot rather than replicas at different lag.
+    """
+    state = _state()
+    aliases = replicas()
+    state = dict(state, replica=state["replica"] or (random.choice(aliases) if aliases else None))
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+def read_replica(view):
+    """View decorator for read-only, lag-tolerant views: ``replica_reads()`` around the view."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _pin_key(user_id):
+    return f"db:pin:{user_id}"
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for replica reads. A request that writes pins its user to the
+    primary for ``REPLICA_PIN_SECONDS`` (longer than the replicas' lag) in the shared
+    cache, so every worker routes that user's next reads to ``default``. The user id is
+    taken from the session, which avoids a user lookup.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        user_id = self._user_id(request)
+        pinned = bool(user_id and cache.get(_pin_key(user_id)))
+        token = _routing.set({"replica": False, "pinned": pinned, "wrote": False})
+        try:
+            response = self.get_response(request)
+            user_id = self._user_id(request) if _routing.get()["wrote"] else None
+            if user_id:
+                cache.set(_pin_key(user_id), time.time(), self._seconds())
+        finally:
+            _routing.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        user_id = await self._auser_id(request)
+        pinned = bool(user_id and await cache.aget(_pin_key(user_id)))
+        token = _routing.set({"replica": False, "pinned": pinned, "wrote": False})
+        try:
+            response = await self.get_response(request)
+            if _routing.get()["wrote"]:
+                user_id = await self._auser_id(request)
+                if user_id:
+                    await cache.aset(_pin_key(user_id), time.time(), self._seconds())
+        finally:
+            _routing.reset(token)
+        return response
+
+    @staticmethod
+    def _user_id(request):
+        session = getattr(request, "session", None)
+        return session.get(SESSION_KEY) if session is not None else None
+
+    @staticmethod
+    async def _auser_id(request):
+        session = getattr(request, "session", None)
+        return await session.aget(SESSION_KEY) if session is not None else None
+
+    @staticmethod
+    def _seconds():
+        return getattr(settings, "REPLICA_PIN_SECONDS", 10)
@@ -0,0 +1,93 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import PriceHistory, Trade
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+TRADE_COLUMNS = ("id", "timestamp", "user", "symbol", "side", "amount", "usd_value", "price")
+PRICE_COLUMNS = ("id", "timestamp", "symbol", "price")
+
+
+def _chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+def trade_rows(user=None, start=None, end=None, using=None):
+    """Trades as tuples in ``TRADE_COLUMNS`` order, streamed from a server-side cursor on ``using``."""
+    qs = Trade.objects.using(using)
+    if user is not None:
+        qs = qs.filter(user=user)
+    if start is not None:
+        qs = qs.filter(timestamp__gte=start)
+    if end is not None:
+        qs = qs.filter(timestamp__lt=end)
+    return qs.order_by("id").values_list(
+        "id", "timestamp", "user__username", "currency_pair__base_currency", "side", "amount", "usd_value", "price"
+    ).iterator(chunk_size=_chunk_size())
+
+
+def price_rows(symbol=None, start=None, end=None, using=None):
+    """Raw ticks as tuples in ``PRICE_COLUMNS`` order, streamed from a server-side cursor on ``using``."""
+    qs = PriceHistory.objects.using(using).filter(currency_pair__quote_currency="USD")
+    if symbol is not None:
+        qs = qs.filter(currency_pair__base_currency=symbol.upper())
+    if start is not None:
+        qs = qs.filter(timestamp__gte=start)
+    if end is not None:
+        qs = qs.filter(timestamp__lt=end)
+    return qs.order_by("id").values_list(
+        "id", "timestamp", "currency_pair__base_currency", "price"
+    ).iterator(chunk_size=_chunk_size())
+
+
+def _value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (int, str)) or value is None:
+        return value
+    return str(value)
+
+
+class _Line:
+    """File-like sink that hands back whatever ``csv.writer`` writes."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_value(v) for v in row])
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, (_value(v) for v in row)))) + "\n"
+
+
+def serialize(columns, rows, fmt):
+    """Lazily encode ``rows`` as ``fmt`` ("csv" or "ndjson"), one line at a time."""
+    if fmt == "csv":
+        return csv_lines(columns, rows)
+    if fmt == "ndjson":
+        return ndjson_lines(columns, rows)
+    raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+
+async def achunks(lines, size=None):
+    """
+    Async iterator over the lazily encoded ``lines`` in blocks of ``size`` lines, for
+    ASGI, which would otherwise read a sync iterator to the end before sending anything.
+    Every block is pulled through one thread-sensitive ``sync_to_async`` call, so the
+    server-side cursor stays on the same thread and connection.
+    """
+    pull = sync_to_async(lambda: "".join(islice(lines, size or _chunk_size())))
+    while chunk := await pull():
+        yield chunk
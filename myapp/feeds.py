@@ -0,0 +1,353 @@
+import asyncio
+import json
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from decimal import Decimal
+from itertools import groupby
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .provider import RateLimiter, coincap_client, provider
+from .symbols import chunk_ids
+
+logger = logging.getLogger(__name__)
+
+COINCAP_URL = "https://api.coincap.io/v2/assets"
+
+
+class PriceProvider:
+    """
+    A source of USD quotes. ``fetch()`` takes the tracked universe (``{symbol:
+    provider_id}``, the ids being CoinGecko's) and returns ``{symbol: Decimal}`` for the
+    symbols it could price; it raises on failure. ``afetch()`` is the async version; by
+    default it runs ``fetch()`` in a worker thread.
+    """
+
+    name = ""
+
+    def fetch(self, id_map):
+        raise NotImplementedError
+
+    async def afetch(self, id_map):
+        return await sync_to_async(self.fetch, thread_sensitive=False)(id_map)
+
+
+class CoinGeckoProvider(PriceProvider):
+    """CoinGecko ``simple/price``, split into id batches that run ``max_in_flight`` at a time under the rate limiter."""
+
+    name = "coingecko"
+
+    def __init__(self, client=None, limiter=None, max_in_flight=None):
+        self.client = client or provider
+        self.limiter = limiter or RateLimiter(getattr(settings, "PRICE_PROVIDER_RATE_LIMIT", 30))
+        self.max_in_flight = max_in_flight or getattr(settings, "PRICE_INGEST_MAX_IN_FLIGHT", 4)
+
+    def _batch(self, ids):
+        self.limiter.wait()
+        return self.client.get_prices(ids)
+
+    def fetch(self, id_map):
+        batches = chunk_ids(id_map.values())
+        if not batches:
+            return {}
+        if len(batches) == 1:
+            payloads = [self._batch(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as pool:
+                payloads = list(pool.map(self._batch, batches))
+        return self._quotes(id_map, payloads)
+
+    async def afetch(self, id_map):
+        slots = asyncio.Semaphore(self.max_in_flight)
+
+        async def batch(ids):
+            async with slots:
+                await self.limiter.async_wait()
+                return await self.client.aget_prices(ids)
+
+        payloads = await asyncio.gather(*(batch(ids) for ids in chunk_ids(id_map.values())))
+        return self._quotes(id_map, payloads)
+
+    @staticmethod
+    def _quotes(id_map, payloads):
+        data = {}
+        for payload in payloads:
+            data.update(payload)
+        return {
+            symbol: Decimal(str(data[provider_id]["usd"]))
+            for symbol, provider_id in id_map.items()
+            if provider_id in data and data[provider_id].get("usd") is not None
+        }
+
+
+class CoinCapProvider(PriceProvider):
+    """
+    CoinCap ``/v2/assets``. Asset ids are looked up by the CoinGecko id (they agree for
+    most coins) and matched back by ticker symbol, so a mismatched id only leaves that
+    symbol to the other providers.
+    """
+
+    name = "coincap"
+
+    def __init__(self, client=None, url=None, api_key=None):
+        self.client = client or coincap_client
+        self.url = url
+        self.api_key = api_key
+
+    def _request(self):
+        url = self.url or getattr(settings, "COINCAP_URL", COINCAP_URL)
+        api_key = self.api_key or getattr(settings, "COINCAP_API_KEY", "")
+        return url, {"Authorization": f"Bearer {api_key}"} if api_key else None
+
+    @staticmethod
+    def _quotes(id_map, payloads):
+        quotes = {}
+        for payload in payloads:
+            for asset in payload.get("data", []):
+                symbol = str(asset.get("symbol", "")).upper()
+                if symbol in id_map and asset.get("priceUsd") is not None:
+                    quotes[symbol] = Decimal(str(asset["priceUsd"]))
+        return quotes
+
+    def fetch(self, id_map):
+        url, headers = self._request()
+        return self._quotes(id_map, [
+            self.client.get_json(url, params={"ids": ",".join(batch)}, headers=headers)
+            for batch in chunk_ids(id_map.values())
+        ])
+
+    async def afetch(self, id_map):
+        url, headers = self._request()
+        return self._quotes(id_map, await asyncio.gather(*(
+            self.client.aget_json(url, params={"ids": ",".join(batch)}, headers=headers)
+            for batch in chunk_ids(id_map.values())
+        )))
+
+
+class FileProvider(PriceProvider):
+    """
+    Quotes from a local file, for tests and offline development.
+
+    * ``*.ndjson`` in the ``export_data prices --format ndjson`` layout is replayed: each
+      fetch returns the next timestamp's prices, and the replay raises once exhausted.
+    * Any other file is a JSON object (``{"BTC": 60000, ...}``), re-read on every fetch.
+    """
+
+    name = "file"
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, "PRICE_REPLAY_FILE", "")
+        self._lock = threading.Lock()
+        self._frames = None
+
+    def _replay(self):
+        with open(self.path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        for _, group in groupby(rows, key=lambda row: row["timestamp"]):
+            yield {row["symbol"]: Decimal(str(row["price"])) for row in group}
+
+    def fetch(self, id_map):
+        if not self.path:
+            raise FileNotFoundError("PRICE_REPLAY_FILE is not set")
+        if self.path.endswith(".ndjson"):
+            with self._lock:
+                if self._frames is None:
+                    self._frames = self._replay()
+                frame = next(self._frames, None)
+            if frame is None:
+                raise EOFError(f"replay of {self.path} is exhausted")
+        else:
+            with open(self.path) as f:
+                frame = {symbol.upper(): Decimal(str(price)) for symbol, price in json.load(f).items()}
+        return {symbol: price for symbol, price in frame.items() if symbol in id_map}
+
+
+PROVIDERS = {"coingecko": CoinGeckoProvider, "coincap": CoinCapProvider, "file": FileProvider}
+
+
+def median_quote(prices, max_deviation):
+    """
+    Median of the providers' prices for one symbol after dropping quotes more than
+    ``max_deviation`` (a fraction) away from the median of all of them. Returns None when
+    nothing survives (e.g. two providers that disagree), so a bad quote is never published.
+    """
+    center = statistics.median(prices)
+    kept = [p for p in prices if center and abs(p - center) / center <= max_deviation]
+    return statistics.median(kept) if kept else None
+
+
+class PriceFeed:
+    """
+    Queries every configured provider concurrently and merges their quotes per symbol
+    with ``median_quote()``. It returns as soon as ``quorum`` providers have answered (or
+    all have finished, or ``timeout`` passed), so a tick waits for the fastest quorum
+    rather than the slowest provider; stragglers finish in the background and are ignored.
+
+    If no provider answers, the first provider's error is raised so callers can back off
+    (honouring ``Retry-After``) as they would for a single provider.
+
+    ``afetch()`` does the same on the running event loop, cancelling the stragglers.
+
+    The worker threads are started once and kept. There are two per provider, so the
+    stragglers of one fetch, which hold a worker until their read timeout, never delay
+    the next fetch.
+    """
+
+    def __init__(self, providers, quorum=None, max_deviation=None, timeout=None):
+        if not providers:
+            raise ValueError("at least one price provider is required")
+        self.providers = list(providers)
+        quorum = quorum or getattr(settings, "PRICE_FEED_QUORUM", 2)
+        self.quorum = max(1, min(quorum, len(self.providers)))
+        self.max_deviation = Decimal(str(
+            max_deviation if max_deviation is not None else getattr(settings, "PRICE_FEED_MAX_DEVIATION", 0.02)
+        ))
+        self.timeout = timeout or getattr(settings, "PRICE_FEED_TIMEOUT", 10)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=2 * len(self.providers), thread_name_prefix="price-feed")
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _collect(self, id_map):
+        if len(self.providers) == 1:
+            p = self.providers[0]
+            return {p.name: p.fetch(id_map)}, {}
+        results, errors = {}, {}
+        pool = self._executor()
+        pending = {pool.submit(p.fetch, id_map): p for p in self.providers}
+        deadline = time.monotonic() + self.timeout
+        while pending and len(results) < self.quorum:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                p = pending.pop(future)
+                try:
+                    results[p.name] = future.result()
+                except Exception as e:
+                    logger.warning("Price provider %s failed: %s", p.name, e)
+                    errors[p.name] = e
+        for future in pending:
+            future.cancel()
+        return results, errors
+
+    async def _acollect(self, id_map):
+        if len(self.providers) == 1:
+            p = self.providers[0]
+            return {p.name: await p.afetch(id_map)}, {}
+        results, errors = {}, {}
+        pending = {asyncio.ensure_future(p.afetch(id_map)): p for p in self.providers}
+        try:
+            deadline = time.monotonic() + self.timeout
+            while pending and len(results) < self.quorum:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    p = pending.pop(task)
+                    try:
+                        results[p.name] = task.result()
+                    except Exception as e:
+                        logger.warning("Price provider %s failed: %s", p.name, e)
+                        errors[p.name] = e
+        finally:
+            for task in pending:
+                task.cancel()
+        return results, errors
+
+    def fetch(self, id_map):
+        """Merged ``{symbol: Decimal}`` quotes for ``id_map``."""
+        return self._merge(*self._collect(id_map))
+
+    async def afetch(self, id_map):
+        """Async ``fetch()``."""
+        return self._merge(*await self._acollect(id_map))
+
+    def _merge(self, results, errors):
+        if not results:
+            first = next((errors[p.name] for p in self.providers if p.name in errors), None)
+            if first is not None:
+                raise first
+            raise requests.Timeout(f"no price provider answered within {self.timeout}s")
+
+        by_symbol = {}
+        for quotes in results.values():
+            for symbol, price in quotes.items():
+                by_symbol.setdefault(symbol, []).append(price)
+        merged = {}
+        for symbol, prices in by_symbol.items():
+            price = median_quote(prices, self.max_deviation)
+            if price is None:
+                logger.warning("Providers disagree on %s (%s); skipping it this tick", symbol, prices)
+            else:
+                merged[symbol] = price
+        return merged
+
+
+def feed_from_settings(**kwargs):
+    """
+    A ``PriceFeed`` over the providers named in ``PRICE_PROVIDERS`` (comma-separated,
+    default ``coingecko``). Keyword arguments go to the CoinGecko provider.
+    """
+    names = [n.strip() for n in getattr(settings, "PRICE_PROVIDERS", "coingecko").split(",") if n.strip()]
+    unknown = set(names) - set(PROVIDERS)
+    if unknown:
+        raise ValueError(f"unknown price providers: {', '.join(sorted(unknown))}")
+    return PriceFeed([
+        PROVIDERS[name](**kwargs) if name == "coingecko" else PROVIDERS[name]() for name in names
+    ])
+
+
+class SharedFeed:
+    """
+    The process-wide ``feed_from_settings()`` feed used for on-demand price refreshes, so
+    every request shares one rate limiter and one worker pool. Built on first use and
+    rebuilt after a ``PRICE_*``/``COINCAP_*`` setting changes (tests, ``override_settings``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._feed = None
+
+    def get(self):
+        feed = self._feed
+        if feed is not None:
+            return feed
+        with self._lock:
+            if self._feed is None:
+                self._feed = feed_from_settings()
+            return self._feed
+
+    def invalidate(self):
+        with self._lock:
+            feed, self._feed = self._feed, None
+        if feed is not None:
+            feed.close()
+
+
+shared_feed = SharedFeed()
+
+
+@receiver(setting_changed)
+def _feed_setting_changed(setting, **kwargs):
+    if setting.startswith(("PRICE_", "COINCAP_", "COINGECKO_")):
+        shared_feed.invalidate()
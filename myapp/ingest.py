@@ -0,0 +1,129 @@
+import logging
+import random
+import time
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections
+
+from .feeds import feed_from_settings
+from .leaderboard import ensure_built
+from .orderbook import MatchingEngine
+from .symbols import symbol_index
+from .tasks import store_quotes
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PriceIngester:
+    """
+    Long-running price poller. Each tick fetches every tracked symbol through the price
+    feed (see feeds.py: the ``PRICE_PROVIDERS`` queried concurrently and merged by
+    median), writes the quotes to the database and publishes them to the quote cache, so
+    web requests never have to call a provider.
+
+    Large universes are split into multi-id requests (see ``symbols.chunk_ids``) that are
+    spaced to respect ``PRICE_PROVIDER_RATE_LIMIT`` requests per minute, at most
+    ``max_in_flight`` at once.
+
+    After publishing, resting limit/stop orders crossed by the new prices are filled by
+    the in-memory matching engine, which is rebuilt from open orders on startup. The
+    leaderboard is re-ranked here too (see ``leaderboard.ensure_built``).
+
+    Sleeps ``interval`` seconds (+/- ``jitter`` as a fraction) between ticks. After a
+    429/5xx, a network error or an open provider circuit it backs off exponentially,
+    honouring ``Retry-After``.
+    """
+
+    def __init__(self, interval=None, jitter=None, max_in_flight=None, max_backoff=None,
+                 feed=None, sleep=time.sleep, rng=None):
+        self.interval = interval if interval is not None else getattr(settings, "PRICE_INGEST_INTERVAL", 15)
+        self.jitter = jitter if jitter is not None else getattr(settings, "PRICE_INGEST_JITTER", 0.2)
+        self.max_backoff = max_backoff or getattr(settings, "PRICE_INGEST_MAX_BACKOFF", 300)
+        self.feed = feed or feed_from_settings(max_in_flight=max_in_flight)
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.engine = MatchingEngine()
+        self.failures = 0
+        self.retry_after = None
+
+    def tick(self):
+        """Fetch and publish one round of prices. Returns the published pairs."""
+        id_map = symbol_index.get()
+        if not id_map:
+            return []
+        published = store_quotes(self.feed.fetch(id_map), id_map=id_map)
+        self.match(published)
+        self.rank()
+        return published
+
+    def match(self, pairs):
+        try:
+            self.engine.sync()
+            self.engine.on_prices({pair.pk: pair.current_price for pair in pairs})
+        except Exception:
+            logger.exception("Order matching failed")
+
+    def rank(self):
+        try:
+            ensure_built()
+        except Exception:
+            logger.exception("Leaderboard rebuild failed")
+
+    def run_once(self):
+        """
+        Run one tick, recording the outcome for backoff. Returns True on success. Any
+        failure (provider errors, a database restart, a malformed payload) only fails
+        the tick, so the daemon keeps running and retries after backing off.
+        """
+        close_old_connections()
+        self.retry_after = None
+        try:
+            published = self.tick()
+        except requests.HTTPError as e:
+            response = e.response
+            status = response.status_code if response is not None else None
+            self.failures += 1
+            if status in RETRYABLE_STATUSES:
+                self.retry_after = _retry_after(response)
+                logger.warning("Price provider returned %s (attempt %s)", status, self.failures)
+            else:
+                logger.error("Price provider rejected the request with %s (attempt %s)", status, self.failures)
+            return False
+        except (requests.ConnectionError, requests.Timeout, OSError, EOFError) as e:
+            self.failures += 1
+            logger.warning("Price provider unreachable: %s (attempt %s)", e, self.failures)
+            return False
+        except Exception:
+            self.failures += 1
+            logger.exception("Price ingestion tick failed (attempt %s)", self.failures)
+            return False
+        self.failures = 0
+        logger.info("Published %s prices", len(published))
+        return True
+
+    def next_delay(self):
+        if self.failures:
+            delay = min(self.max_backoff, self.interval * 2 ** self.failures)
+            if self.retry_after is not None:
+                delay = max(delay, self.retry_after)
+        else:
+            delay = self.interval
+        return max(0.0, delay * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def run(self, iterations=None):
+        count = 0
+        while iterations is None or count < iterations:
+            self.run_once()
+            count += 1
+            if iterations is None or count < iterations:
+                self.sleep(self.next_delay())
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
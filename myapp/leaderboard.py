@@ -0,0 +1,279 @@
+"""
+Equity leaderboard over ``PortfolioValuation.equity``, which trades and ingested ticks
+already keep current.
+
+With a Redis ``CACHE_URL`` the ranking lives in a sorted set (user id -> equity) that
+is updated after every committed trade, revaluation and signup, so top-N pages and
+"my rank" are O(log n) (``ZRANGE`` / ``ZRANK``). The set is rebuilt from the table
+when it is missing (cache restart), by ``ensure_built()`` on each ingestion tick or
+``rebuild_leaderboard``.
+
+With any other cache backend, ``ensure_built()`` numbers every valuation into the
+indexed ``equity_rank`` column instead (one window-function UPDATE per ingestion
+tick), so pages and "my rank" are index seeks too. Positions lag by up to one tick;
+the equity shown is always current.
+
+Before the first build, and for users who signed up since, the same queries are
+answered live from the ``(-equity, user)`` index, which is O(n) per rank and page.
+
+All of them order equal equity by ascending user id.
+"""
+import functools
+import logging
+from decimal import Decimal
+
+import redis
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import connections, router, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH = 1000
+CENT = Decimal("0.01")
+
+
+def _valuations():
+    return apps.get_model("myapp", "PortfolioValuation").objects.all()
+
+
+def _ordered():
+    return _valuations().order_by("-equity", "user_id")
+
+
+class LiveRanking:
+    """Rankings read straight from the equity index; O(n), used until ranks are stored."""
+
+    stored = False
+
+    def ready(self):
+        return True
+
+    def total(self):
+        # Counting every row is a full scan; the exact total can lag by a minute.
+        return cache.get_or_set("leaderboard:total", lambda: _valuations().count(), 60)
+
+    def page(self, offset, limit):
+        rows = _ordered().values_list("user_id", "equity")[offset:offset + limit]
+        return [(offset + i + 1, user_id, equity) for i, (user_id, equity) in enumerate(rows)]
+
+    def rank(self, user_id):
+        equity = _valuations().filter(user_id=user_id).values_list("equity", flat=True).first()
+        if equity is None:
+            return None
+        ahead = _valuations().filter(Q(equity__gt=equity) | Q(equity=equity, user_id__lt=user_id)).count()
+        return ahead + 1, equity
+
+
+class DatabaseRanking:
+    """Rankings from the ``equity_rank`` column, renumbered by ``rebuild()`` (see module docstring)."""
+
+    stored = False
+
+    def ready(self):
+        return _valuations().filter(equity_rank__isnull=False).exists()
+
+    def stale(self):
+        # Every trade and tick can reorder users, so renumber whenever asked.
+        return True
+
+    def total(self):
+        return _valuations().aggregate(last=Max("equity_rank"))["last"] or 0
+
+    def page(self, offset, limit):
+        rows = _valuations().filter(equity_rank__gt=offset, equity_rank__lte=offset + limit).order_by("equity_rank")
+        return list(rows.values_list("equity_rank", "user_id", "equity"))
+
+    def rank(self, user_id):
+        row = _valuations().filter(user_id=user_id).values_list("equity_rank", "equity").first()
+        if row is None:
+            return None
+        if row[0] is None:
+            # Signed up since the last rebuild.
+            return _live.rank(user_id)
+        return row
+
+    def rebuild(self):
+        """Number every valuation in leaderboard order with one UPDATE, writing only changed ranks."""
+        model = _valuations().model
+        connection = connections[router.db_for_write(model)]
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {table} SET equity_rank = ranked.position
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY equity DESC, user_id) AS position FROM {table}
+                ) AS ranked
+                WHERE {table}.id = ranked.id
+                  AND ({table}.equity_rank IS NULL OR {table}.equity_rank <> ranked.position)
+            """)
+
+
+def _member(user_id):
+    # Zero-padded so that ties, which Redis orders by member bytes, go by ascending user id.
+    return f"{user_id:012d}"
+
+
+class RedisRanking:
+    """
+    Rankings from a Redis sorted set kept in step with the table (see module docstring).
+    Scores are negated equity, so the ascending ``ZRANGE`` / ``ZRANK`` order matches the
+    database's ``(-equity, user_id)``.
+    """
+
+    stored = True
+
+    def __init__(self, backend, url):
+        # Django's RedisCache doesn't expose sorted sets, so talk to the same server directly.
+        self.client = _client(url)
+        self.key = backend.make_key("leaderboard:ranking")
+        self.ready_key = backend.make_key("leaderboard:ranking:ready")
+
+    def ready(self):
+        return bool(self.client.exists(self.ready_key))
+
+    def stale(self):
+        return not self.ready()
+
+    def total(self):
+        return self.client.zcard(self.key)
+
+    def page(self, offset, limit):
+        rows = self.client.zrange(self.key, offset, offset + limit - 1, withscores=True)
+        return [(offset + i + 1, int(member), _equity(-score)) for i, (member, score) in enumerate(rows)]
+
+    def rank(self, user_id):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrank(self.key, _member(user_id))
+        pipe.zscore(self.key, _member(user_id))
+        rank, score = pipe.execute()
+        return None if rank is None else (rank + 1, _equity(-score))
+
+    def store(self, rows, key=None):
+        """ZADD ``(user_id, equity)`` rows in batches."""
+        key = key or self.key
+        batch = {}
+        for user_id, equity in rows:
+            batch[_member(user_id)] = -float(equity)
+            if len(batch) == BATCH:
+                self.client.zadd(key, batch)
+                batch = {}
+        if batch:
+            self.client.zadd(key, batch)
+
+    def forget(self, user_ids):
+        if user_ids:
+            self.client.zrem(self.key, *map(_member, user_ids))
+
+    def rebuild(self):
+        """
+        Load every valuation into a scratch set and swap it in atomically. Rows that
+        changed during the scan (``updated_at``) are re-applied after the swap.
+        """
+        started = timezone.now()
+        scratch = f"{self.key}:rebuild"
+        self.client.delete(scratch)
+        self.store(_valuations().values_list("user_id", "equity").iterator(chunk_size=BATCH), key=scratch)
+        if self.client.exists(scratch):
+            self.client.rename(scratch, self.key)
+        else:
+            self.client.delete(self.key)
+        self.store(_valuations().filter(updated_at__gte=started).values_list("user_id", "equity"))
+        self.client.set(self.ready_key, 1)
+
+
+def _equity(score):
+    return Decimal(repr(score)).quantize(CENT)
+
+
+@functools.lru_cache(maxsize=None)
+def _client(url):
+    return redis.Redis.from_url(url)
+
+
+def _cache_url():
+    location = settings.CACHES["default"]["LOCATION"]
+    # Like RedisCache: a list or comma-separated servers, the first one takes writes.
+    return (location.split(",") if isinstance(location, str) else location)[0]
+
+
+_live = LiveRanking()
+_database = DatabaseRanking()
+
+
+def backend():
+    """The ranking in use: ``LEADERBOARD_BACKEND`` (auto, redis, database); auto means Redis when the cache is."""
+    choice = getattr(settings, "LEADERBOARD_BACKEND", "auto")
+    default = caches["default"]
+    if choice == "redis" or (choice == "auto" and isinstance(default, RedisCache)):
+        return RedisRanking(default, _cache_url())
+    return _database
+
+
+def _reader():
+    ranking = backend()
+    return ranking if ranking.ready() else _live
+
+
+def record_after_commit(valuations):
+    """Copy the current equity of ``valuations`` (a queryset) into the ranking once the transaction commits."""
+    ranking = backend()
+    if ranking.stored:
+        transaction.on_commit(lambda: ranking.store(valuations.values_list("user_id", "equity").iterator(BATCH)))
+
+
+def forget_after_commit(user_ids):
+    ranking = backend()
+    if ranking.stored:
+        transaction.on_commit(lambda: ranking.forget(user_ids))
+
+
+def ensure_built():
+    """
+    Rebuild the ranking if it needs it (a missing sorted set; stored database ranks
+    always do); one process at a time. True when a rebuild ran.
+    """
+    ranking = backend()
+    if not ranking.stale() or not cache.add("leaderboard:rebuilding", 1, 600):
+        return False
+    try:
+        ranking.rebuild()
+    finally:
+        cache.delete("leaderboard:rebuilding")
+    logger.debug("Rebuilt the equity leaderboard")
+    return True
+
+
+def page(number, size):
+    """
+    Page ``number`` (1-based, clamped to the last page) of the leaderboard:
+    ``{"total", "page", "page_size", "results"}``.
+    """
+    ranking = _reader()
+    total = ranking.total()
+    number = min(number, max(1, -(-total // size)))
+    rows = ranking.page((number - 1) * size, size)
+    names = dict(User.objects.filter(pk__in=[user_id for _, user_id, _ in rows]).values_list("pk", "username"))
+    return {
+        "total": total,
+        "page": number,
+        "page_size": size,
+        "results": [
+            {"rank": rank, "username": names.get(user_id, ""), "equity": equity.quantize(CENT)}
+            for rank, user_id, equity in rows
+        ],
+    }
+
+
+def rank_of(user):
+    """``{"rank", "equity"}`` for ``user``, or None if they have no valuation."""
+    found = _reader().rank(user.pk)
+    if found is None:
+        return None
+    rank, equity = found
+    return {"rank": rank, "equity": equity.quantize(CENT)}
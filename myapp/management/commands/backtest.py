@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from myapp.backtest import STRATEGIES, run_many
+
+
+def _spec(value):
+    """``name`` or ``name:key=value,key=value``."""
+    name, _, raw = value.partition(":")
+    params = {}
+    for item in filter(None, raw.split(",")):
+        key, sep, param = item.partition("=")
+        if not sep:
+            raise CommandError(f"Bad strategy parameter {item!r}; expected key=value.")
+        params[key] = param
+    if name not in STRATEGIES:
+        raise CommandError(f"Unknown strategy {name!r}; choose from {', '.join(STRATEGIES)}.")
+    return name, params
+
+
+class Command(BaseCommand):
+    help = "Replay stored PriceHistory through one or more strategies (read-only) and print summary stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "strategies", nargs="+", metavar="STRATEGY",
+            help="e.g. buy_and_hold:usd=500 or ma_cross:fast=20,slow=100,usd=1000",
+        )
+        parser.add_argument("--symbols", help="Comma-separated pairs (default: every USD pair).")
+        parser.add_argument("--start", help="ISO 8601 lower bound (inclusive).")
+        parser.add_argument("--end", help="ISO 8601 upper bound (exclusive).")
+        parser.add_argument("--cash", default="10000.00")
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument("--workers", type=int, help="Processes to spread strategies over (default: one per CPU).")
+        parser.add_argument("--json", action="store_true", help="Print one JSON object per run.")
+
+    def handle(self, *args, **options):
+        symbols = options["symbols"].split(",") if options["symbols"] else None
+        start, end = self._time(options["start"]), self._time(options["end"])
+        specs = [
+            {
+                "strategy": name, "params": params, "symbols": symbols, "start": start, "end": end,
+                "cash": options["cash"], "chunk_size": options["chunk_size"],
+            }
+            for name, params in map(_spec, options["strategies"])
+        ]
+        try:
+            results = run_many(specs, workers=options["workers"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for result in results:
+            if options["json"]:
+                self.stdout.write(json.dumps(result))
+                continue
+            params = ",".join(f"{k}={v}" for k, v in result["params"].items())
+            self.stdout.write(
+                f"{result['strategy']}{':' + params if params else ''} on {','.join(result['symbols'])}: "
+                f"{result['ticks']} ticks, {result['fills']} fills ({result['rejected']} rejected), "
+                f"equity ${result['final_equity']:.2f} ({result['return']:+.2%}), "
+                f"max drawdown {result['max_drawdown']:.2%}, {result['ticks_per_second']} ticks/s"
+            )
+
+    def _time(self, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f"Invalid time {value!r}.")
+        return parsed
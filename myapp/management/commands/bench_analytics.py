@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from myapp.analytics import (
+    average_cost_pnl, drawdown, equity_curve, fifo_pnl, rolling_volatility, simple_returns,
+)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _loop_drawdown(values):
+    peak, out = values[0], []
+    for v in values:
+        peak = max(peak, v)
+        out.append(v / peak - 1.0)
+    return out
+
+
+def _loop_average_cost(sign, amount, usd):
+    position = cost = realized = 0.0
+    for s, a, u in zip(sign.tolist(), amount.tolist(), usd.tolist()):
+        if s > 0:
+            position, cost = position + a, cost + u
+        else:
+            released = cost * a / position
+            position, cost, realized = position - a, cost - released, realized + u - released
+    return position, cost, realized
+
+
+class Command(BaseCommand):
+    help = "Time the vectorized analytics on synthetic ticks and trades (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ticks", type=int, default=1_000_000)
+        parser.add_argument("--trades", type=int, default=10_000)
+        parser.add_argument("--pairs", type=int, default=3)
+        parser.add_argument("--window", type=int, default=60)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        n, k, pairs = options["ticks"], options["trades"], options["pairs"]
+
+        # Geometric random walks, one tick per second per pair.
+        per_pair = n // pairs
+        ts = np.tile(np.arange(per_pair, dtype=float), pairs)
+        pair = np.repeat(np.arange(pairs), per_pair)
+        price = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, (pairs, per_pair)), axis=1)).ravel()
+        prices = {"ts": ts, "pair": pair, "price": price}
+
+        # Alternate buys and smaller sells so positions never go short.
+        trade_ts = np.sort(rng.uniform(0, per_pair, k))
+        trade_pair = rng.integers(0, pairs, k)
+        sign = np.empty(k)
+        for p in range(pairs):
+            mine = np.flatnonzero(trade_pair == p)
+            sign[mine] = np.where(np.arange(len(mine)) % 2 == 0, 1.0, -1.0)
+        amount = np.where(sign > 0, 1.0, 0.5)
+        fill = price[trade_pair * per_pair + trade_ts.astype(int)]
+        trades = {"ts": trade_ts, "pair": trade_pair, "sign": sign, "amount": amount, "usd": amount * fill, "price": fill}
+
+        series = price[:per_pair]
+        returns = simple_returns(series)
+        mask = trade_pair == 0
+        rows = [
+            ("drawdown", _timed(drawdown, series)[1], _timed(_loop_drawdown, series.tolist())[1]),
+            ("rolling_volatility", _timed(rolling_volatility, returns, options["window"])[1], None),
+            ("fifo_pnl", _timed(fifo_pnl, sign[mask], amount[mask], trades["usd"][mask])[1], None),
+            (
+                "average_cost_pnl",
+                _timed(average_cost_pnl, sign[mask], amount[mask], trades["usd"][mask])[1],
+                _timed(_loop_average_cost, sign[mask], amount[mask], trades["usd"][mask])[1],
+            ),
+            ("equity_curve", _timed(equity_curve, np.arange(0, per_pair, 60.0), trades, prices, 1e6)[1], None),
+        ]
+        self.stdout.write(f"{n} ticks, {k} trades, {pairs} pairs")
+        self.stdout.write(f"{'step':<20} {'numpy ms':>10} {'loop ms':>10}")
+        for name, vectorized, loop in rows:
+            loop = f"{loop:>10.1f}" if loop is not None else f"{'-':>10}"
+            self.stdout.write(f"{name:<20} {vectorized:>10.1f} {loop}")
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from myapp.tasks import store_prices
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure queries and time per ingestion tick as the number of tracked symbols grows (changes are rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="3,30,300,1000", help="Comma-separated symbol counts.")
+        parser.add_argument("--ticks", type=int, default=3, help="Ticks to run per size; the first creates the pairs.")
+
+    def handle(self, *args, **options):
+        sizes = [int(n) for n in options["sizes"].split(",")]
+        self.stdout.write(f"{'symbols':>8} {'tick':>5} {'queries':>8} {'ms':>9}")
+        for n in sizes:
+            id_map = {f"SYM{i}": f"bench-coin-{i}" for i in range(n)}
+            data = {coin_id: {"usd": 100 + i} for i, coin_id in enumerate(id_map.values())}
+            try:
+                with transaction.atomic():
+                    for tick in range(options["ticks"]):
+                        with CaptureQueriesContext(connection) as ctx:
+                            start = time.perf_counter()
+                            store_prices(data, id_map=id_map)
+                            elapsed = (time.perf_counter() - start) * 1000
+                        self.stdout.write(f"{n:>8} {tick:>5} {len(ctx.captured_queries):>8} {elapsed:>9.1f}")
+                    raise _Rollback
+            except _Rollback:
+                pass
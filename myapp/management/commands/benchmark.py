@@ -0,0 +1,67 @@
+import asyncio
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.benchmarks import environment, write_report
+from myapp.benchmarks.load import run_load
+from myapp.benchmarks.micro import BENCHMARKS, run_micro
+from myapp.benchmarks.server import SERVERS, prepare_database, serve, stub_provider, throwaway_env
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the micro-benchmarks (in-process, rolled back) or the load benchmark (a local gunicorn "
+        "server on a throwaway database with a stub price provider) and report JSON."
+    )
+
+    def add_arguments(self, parser):
+        suites = parser.add_subparsers(dest="suite", required=True)
+
+        micro = suites.add_parser("micro", help="Time hot paths at several data sizes.")
+        micro.add_argument("--sizes", type=_ints, default=[100, 1000, 10000], help="Comma-separated row counts.")
+        micro.add_argument("--repeat", type=int, default=20, help="Timed calls per benchmark and size.")
+        micro.add_argument("--warmup", type=int, default=2)
+        micro.add_argument("--only", default="", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}.")
+        micro.add_argument("--output", help="Write the JSON report here instead of stdout.")
+
+        load = suites.add_parser("load", help="Drive signup/login/dashboard/trade flows concurrently.")
+        load.add_argument("--server", choices=sorted(SERVERS), default="asgi")
+        load.add_argument("--workers", type=int, default=2, help="Gunicorn workers.")
+        load.add_argument("--users", type=int, default=50, help="Virtual users, each signing up once.")
+        load.add_argument("--concurrency", type=int, default=10, help="Virtual users active at once.")
+        load.add_argument("--trades", type=int, default=5, help="Dashboard-and-trade rounds per user.")
+        load.add_argument("--upstream-delay", type=float, default=0.05, help="Seconds the stub provider takes.")
+        load.add_argument("--output", help="Write the JSON report here instead of stdout.")
+
+    def handle(self, *args, **options):
+        suite = options["suite"]
+        report = {"suite": suite, "environment": environment()}
+        if suite == "micro":
+            names = [n.strip() for n in options["only"].split(",") if n.strip()] or list(BENCHMARKS)
+            unknown = set(names) - set(BENCHMARKS)
+            if unknown:
+                raise CommandError(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+            report["parameters"] = {"sizes": options["sizes"], "repeat": options["repeat"], "warmup": options["warmup"]}
+            report["results"] = run_micro(options["sizes"], options["repeat"], options["warmup"], names)
+        else:
+            report["parameters"] = {
+                key: options[key] for key in ("server", "workers", "users", "concurrency", "trades", "upstream_delay")
+            }
+            report["results"] = self._load(options)
+        write_report(report, options["output"], self.stdout)
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def _load(self, options):
+        with stub_provider(delay=options["upstream_delay"]) as provider_url, tempfile.TemporaryDirectory() as tmp:
+            env = throwaway_env(tmp, provider_url, PRICE_PROVIDER_POOL_SIZE=str(options["concurrency"]))
+            pair_id = prepare_database(env)
+            with serve(options["server"], env, options["workers"], ready_path="/login/") as base_url:
+                return asyncio.run(run_load(
+                    base_url, pair_id, users=options["users"], concurrency=options["concurrency"], trades=options["trades"],
+                ))
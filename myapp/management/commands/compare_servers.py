@@ -0,0 +1,102 @@
+import asyncio
+import json
+import tempfile
+import time
+
+import httpx
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.benchmarks.server import SERVERS, prepare_database, serve, stub_provider, throwaway_env
+
+
+async def _load(url, requests, concurrency):
+    """Send ``requests`` GETs with ``concurrency`` in flight; returns (latencies, errors, seconds)."""
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test /api/quote/ served by gunicorn sync workers (WSGI) and by uvicorn workers (ASGI) "
+        "against a slow stub provider, on a throwaway SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", default="wsgi,asgi", help="Comma-separated: wsgi, asgi.")
+        parser.add_argument("--workers", type=int, default=2, help="Gunicorn workers per server.")
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight.")
+        parser.add_argument("--upstream-delay", type=float, default=0.2, help="Seconds the stub provider takes.")
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        servers = [s.strip() for s in options["servers"].split(",") if s.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"unknown servers: {', '.join(sorted(unknown))}")
+
+        results = []
+        with stub_provider(delay=options["upstream_delay"]) as provider_url, tempfile.TemporaryDirectory() as tmp:
+            env = throwaway_env(
+                tmp,
+                provider_url,
+                PRICE_PROVIDER_POOL_SIZE=str(options["concurrency"]),
+                # Every request misses the quote cache and goes to the provider.
+                PRICE_CACHE_TTL="0",
+                PRICE_CACHE_MAX_STALENESS="0",
+            )
+            prepare_database(env)
+            for name in servers:
+                results.append(self._run(name, env, options))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'server':>6} {'workers':>7} {'conc':>5} {'ok':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for r in results:
+            p50 = f"{r['p50_ms']:>8.1f}" if r["p50_ms"] is not None else f"{'-':>8}"
+            p99 = f"{r['p99_ms']:>8.1f}" if r["p99_ms"] is not None else f"{'-':>8}"
+            self.stdout.write(
+                f"{r['server']:>6} {r['workers']:>7} {r['concurrency']:>5} {r['ok']:>6} {r['errors']:>6} "
+                f"{r['rps']:>8.1f} {p50} {p99}"
+            )
+
+    def _run(self, name, env, options):
+        with serve(name, env, options["workers"], ready_path="/api/quote/BTC/") as base_url:
+            latencies, errors, elapsed = asyncio.run(
+                _load(f"{base_url}/api/quote/BTC/", options["requests"], options["concurrency"])
+            )
+        ms = np.array(latencies) * 1000
+        return {
+            "server": name,
+            "workers": options["workers"],
+            "concurrency": options["concurrency"],
+            "upstream_delay": options["upstream_delay"],
+            "ok": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(float(np.percentile(ms, 50)), 1) if len(ms) else None,
+            "p99_ms": round(float(np.percentile(ms, 99)), 1) if len(ms) else None,
+        }
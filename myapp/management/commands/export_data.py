@@ -0,0 +1,58 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from myapp.db_router import replica_reads
+from myapp.exports import FORMATS, PRICE_COLUMNS, TRADE_COLUMNS, price_rows, serialize, trade_rows
+
+
+class Command(BaseCommand):
+    help = "Stream trades or price history to a CSV/NDJSON file in constant memory (read from a replica when configured)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=["trades", "prices"])
+        parser.add_argument("--format", choices=list(FORMATS), default="csv")
+        parser.add_argument("--output", help="File to write (default: stdout).")
+        parser.add_argument("--user", help="Only this username's trades.")
+        parser.add_argument("--symbol", help="Only this pair's prices, e.g. BTC.")
+        parser.add_argument("--start", help="ISO 8601 lower bound (inclusive).")
+        parser.add_argument("--end", help="ISO 8601 upper bound (exclusive).")
+
+    def handle(self, *args, **options):
+        with replica_reads():
+            self._export(options)
+
+    def _export(self, options):
+        start = self._time(options["start"])
+        end = self._time(options["end"])
+        if options["dataset"] == "trades":
+            user = None
+            if options["user"]:
+                user = User.objects.filter(username=options["user"]).first()
+                if user is None:
+                    raise CommandError(f"No user {options['user']!r}.")
+            columns, rows = TRADE_COLUMNS, trade_rows(user=user, start=start, end=end)
+        else:
+            columns, rows = PRICE_COLUMNS, price_rows(symbol=options["symbol"], start=start, end=end)
+
+        out = open(options["output"], "w", newline="") if options["output"] else sys.stdout
+        count = -1 if options["format"] == "csv" else 0  # don't count the CSV header
+        try:
+            for line in serialize(columns, rows, options["format"]):
+                out.write(line)
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {count} rows to {options['output']}."))
+
+    def _time(self, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise CommandError(f"Invalid time {value!r}.")
+        return parsed
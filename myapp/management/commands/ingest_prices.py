@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from myapp.ingest import PriceIngester
+
+
+class Command(BaseCommand):
+    help = "Continuously poll the price provider and publish quotes to the DB and price cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, help="Seconds between polls.")
+        parser.add_argument("--jitter", type=float, help="Random +/- fraction applied to each delay.")
+        parser.add_argument("--max-in-flight", type=int, help="Maximum concurrent provider requests.")
+        parser.add_argument("--iterations", type=int, help="Stop after this many polls (default: run forever).")
+        parser.add_argument("--once", action="store_true", help="Poll a single time and exit.")
+
+    def handle(self, *args, **options):
+        ingester = PriceIngester(
+            interval=options["interval"],
+            jitter=options["jitter"],
+            max_in_flight=options["max_in_flight"],
+        )
+        iterations = 1 if options["once"] else options["iterations"]
+        self.stdout.write(f"Ingesting prices every ~{ingester.interval}s")
+        try:
+            ingester.run(iterations=iterations)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Price ingestion stopped."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from myapp import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Re-rank the leaderboard from PortfolioValuation (the Redis sorted set, or the stored database ranks)."
+
+    def handle(self, *args, **options):
+        ranking = leaderboard.backend()
+        ranking.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Ranked {ranking.total()} users."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from myapp.rollups import prune, rollup_all
+
+
+class Command(BaseCommand):
+    help = "Compact raw price ticks into 1m/1h/1d OHLC candles and optionally apply the retention policy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prune", action="store_true", help="Delete raw ticks and 1m candles past retention.")
+
+    def handle(self, *args, **options):
+        for interval, written in rollup_all().items():
+            self.stdout.write(f"{interval}: {written} candles written")
+        if options["prune"]:
+            raw, minute = prune()
+            self.stdout.write(f"Pruned {raw} raw ticks and {minute} 1m candles.")
+        self.stdout.write(self.style.SUCCESS("Rollup complete."))
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.stress import run_stress
+
+
+class Command(BaseCommand):
+    help = "Run concurrent orders through Trade.execute against the configured database and verify balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=4)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=400)
+        parser.add_argument("--pair", default="BTC")
+        parser.add_argument("--seed", type=int)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated stress users and trades.")
+
+    def handle(self, *args, **options):
+        report = run_stress(
+            users=options["users"],
+            threads=options["threads"],
+            orders=options["orders"],
+            pair=options["pair"],
+            seed=options["seed"],
+        )
+        if not options["keep"]:
+            User.objects.filter(username__in=report["usernames"]).delete()
+
+        self.stdout.write(
+            f"{report['orders']} orders ({report['filled']} filled, {report['rejected']} rejected) "
+            f"in {report['seconds']}s: {report['orders_per_second']} orders/s overall, "
+            f"{report['orders_per_second_per_user']} orders/s per user"
+        )
+        if report["mismatches"]:
+            for mismatch in report["mismatches"]:
+                self.stderr.write(str(mismatch))
+            raise CommandError("Balances do not match the trade log.")
+        self.stdout.write(self.style.SUCCESS("All balances match the trade log."))
@@ -0,0 +1,315 @@
+"""
+In-process metrics, exposed in the Prometheus text format on ``/metrics``.
+
+``MetricsMiddleware`` times every request and counts its queries; ``Trade.execute``
+times itself; provider calls are already measured by each ``ProviderClient`` and are
+rendered from ``CLIENTS`` at scrape time. Each worker process keeps its own registry
+(like the provider status), so scrape every worker or run one worker per target.
+Recording is a dict lookup and a short locked update per observation, cheap enough
+to leave on.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .provider import CLIENTS, LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus layout."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def lines(self):
+        with self._lock:
+            series = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for label_values, (counts, total, n) in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labels, label_values, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {n}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collector(self, collect):
+        """Register ``collect()``, which returns text-format lines, to run at each scrape."""
+        self.collectors.append(collect)
+        return collect
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}", *metric.lines()]
+        for collect in self.collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.counter(
+    "cryptoo_http_requests_total", "HTTP requests by view, method and status.", ("view", "method", "status")
+)
+request_seconds = registry.histogram(
+    "cryptoo_http_request_duration_seconds", "Time spent handling a request.", ("view", "method")
+)
+request_queries = registry.histogram(
+    "cryptoo_http_request_db_queries", "Database queries per request.", ("view",), QUERY_COUNT_BUCKETS
+)
+request_db_seconds = registry.histogram(
+    "cryptoo_http_request_db_seconds", "Time spent in database queries per request.", ("view",)
+)
+trade_seconds = registry.histogram(
+    "cryptoo_trade_execute_seconds", "Trade.execute() duration by side and outcome (ok, rejected, error).",
+    ("side", "outcome"),
+)
+
+
+@registry.collector
+def provider_lines():
+    """The provider clients' own counters (``ProviderClient.status()``), per upstream."""
+    statuses = {name: client.status() for name, client in CLIENTS.items()}
+    out = []
+
+    def family(name, kind, help, rows):
+        out.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}"])
+        out.extend(f"{name}{labels} {_number(value)}" for labels, value in rows)
+
+    family("cryptoo_provider_requests_total", "counter", "Calls sent to the price provider.",
+           [(_labels(("provider",), (p,)), s["requests"]) for p, s in statuses.items()])
+    family("cryptoo_provider_failures_total", "counter", "Failed provider calls by error.",
+           [(_labels(("provider", "error"), (p, error)), n)
+            for p, s in statuses.items() for error, n in sorted(s["failures"].items())])
+    family("cryptoo_provider_short_circuited_total", "counter", "Calls rejected by the open circuit breaker.",
+           [(_labels(("provider",), (p,)), s["short_circuited"]) for p, s in statuses.items()])
+    family("cryptoo_provider_circuit_open", "gauge", "1 while the provider circuit breaker is not closed.",
+           [(_labels(("provider",), (p,)), int(s["circuit"] != "closed")) for p, s in statuses.items()])
+    name = "cryptoo_provider_latency_seconds"
+    out.extend([f"# HELP {name} Provider call latency.", f"# TYPE {name} histogram"])
+    for p, s in statuses.items():
+        latency = s["latency_seconds"]
+        for bound in (*LATENCY_BUCKETS, "+Inf"):
+            out.append(f"{name}_bucket{_labels(('provider',), (p,), [('le', bound)])} {latency['buckets'][str(bound)]}")
+        out.append(f"{name}_sum{_labels(('provider',), (p,))} {_number(latency['sum'])}")
+        out.append(f"{name}_count{_labels(('provider',), (p,))} {latency['count']}")
+    return out
+
+
+class RequestStats:
+    """Queries made while handling one request (shared with its sync_to_async threads)."""
+
+    __slots__ = ("queries", "db_seconds", "sql")
+
+    def __init__(self, keep_sql):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.sql = [] if keep_sql else None
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper, installed on every connection (see ``install_query_timer``)."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.sql is not None:
+            stats.sql.append((elapsed, sql))
+
+
+def install_query_timer(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _slow_seconds():
+    return getattr(settings, "METRICS_SLOW_REQUEST_SECONDS", 0)
+
+
+class MetricsMiddleware:
+    """
+    Records each request's latency, query count and query time under its URL name.
+    Requests slower than ``METRICS_SLOW_REQUEST_SECONDS`` (0 disables) are logged
+    with their slowest SQL statements.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, stats, start)
+        return response
+
+    @staticmethod
+    def _start():
+        stats = RequestStats(keep_sql=_slow_seconds() > 0)
+        return stats, _current.set(stats), time.perf_counter()
+
+    @staticmethod
+    def _method(request):
+        # The method is client-controlled: collapse anything unusual so it can't mint label sets.
+        return request.method if request.method in HTTP_METHODS else "other"
+
+    @classmethod
+    def _finish(cls, request, response, stats, start):
+        # Streaming responses are timed up to their first byte, which is what the view controls.
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        view = (match.view_name or match._func_path) if match else "unmatched"
+        method = cls._method(request)
+        requests_total.inc(view, method, response.status_code)
+        request_seconds.observe(elapsed, view, method)
+        request_queries.observe(stats.queries, view)
+        request_db_seconds.observe(stats.db_seconds, view)
+        threshold = _slow_seconds()
+        if threshold and elapsed >= threshold:
+            slowest = sorted(stats.sql, key=lambda q: q[0], reverse=True)[:5]
+            logger.warning(
+                "Slow request %s %s (%s) took %.3fs: %s queries in %.3fs%s",
+                request.method, request.path, view, elapsed, stats.queries, stats.db_seconds,
+                "".join(f"\n  {seconds * 1000:.1f}ms {sql}" for seconds, sql in slowest),
+            )
+
+
+class timed:
+    """``with timed(trade_seconds, side):`` observes the block's duration, labelled with its outcome."""
+
+    def __init__(self, histogram, *label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = "ok" if exc_type is None else "rejected" if issubclass(exc_type, ValueError) else "error"
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values, outcome)
+        return False
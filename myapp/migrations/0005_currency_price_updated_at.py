@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_trade_usd_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currency',
+            name='price_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
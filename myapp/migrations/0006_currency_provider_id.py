@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:53
+
+from django.db import migrations, models
+
+# Pairs previously hardcoded in tasks.ID_MAP.
+INITIAL_PROVIDER_IDS = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "SOL": "solana",
+}
+
+
+def seed_provider_ids(apps, schema_editor):
+    Currency = apps.get_model("myapp", "Currency")
+    for symbol, provider_id in INITIAL_PROVIDER_IDS.items():
+        pair, _ = Currency.objects.get_or_create(base_currency=symbol, quote_currency="USD")
+        if not pair.provider_id:
+            pair.provider_id = provider_id
+            pair.save(update_fields=["provider_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_currency_price_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currency',
+            name='provider_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(seed_provider_ids, migrations.RunPython.noop),
+    ]
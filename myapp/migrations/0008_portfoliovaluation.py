@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:58
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_valuations(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Profile = apps.get_model("myapp", "Profile")
+    Holding = apps.get_model("myapp", "Holding")
+    PortfolioValuation = apps.get_model("myapp", "PortfolioValuation")
+
+    cash = dict(Profile.objects.values_list("user_id", "balance"))
+    holdings = {}
+    for user_id, amount, price in Holding.objects.values_list("user_id", "amount", "currency_pair__current_price"):
+        holdings[user_id] = holdings.get(user_id, Decimal("0")) + amount * price
+    PortfolioValuation.objects.bulk_create(
+        [
+            PortfolioValuation(
+                user_id=user_id,
+                cash=cash.get(user_id, Decimal("10000.00")),
+                holdings_value=holdings.get(user_id, Decimal("0")),
+                equity=cash.get(user_id, Decimal("10000.00")) + holdings.get(user_id, Decimal("0")),
+            )
+            for user_id in User.objects.values_list("id", flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_pricehistory_index_pricecandle'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioValuation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cash', models.DecimalField(decimal_places=2, default=Decimal('10000.00'), max_digits=20)),
+                ('holdings_value', models.DecimalField(decimal_places=8, default=Decimal('0'), max_digits=28)),
+                ('equity', models.DecimalField(db_index=True, decimal_places=8, default=Decimal('10000.00'), max_digits=28)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='valuation', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_valuations, migrations.RunPython.noop),
+    ]
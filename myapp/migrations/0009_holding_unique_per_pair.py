@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_holdings(apps, schema_editor):
+    """The unique constraint was dropped in 0003; fold any duplicate rows into one."""
+    Holding = apps.get_model("myapp", "Holding")
+    duplicates = (
+        Holding.objects.values("user_id", "currency_pair_id")
+        .annotate(rows=Count("id"), total=Sum("amount"))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        rows = Holding.objects.filter(user_id=dup["user_id"], currency_pair_id=dup["currency_pair_id"]).order_by("id")
+        keep = rows.first()
+        rows.exclude(pk=keep.pk).delete()
+        keep.amount = dup["total"]
+        keep.save(update_fields=["amount"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_portfoliovaluation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_holdings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='holding',
+            constraint=models.UniqueConstraint(fields=('user', 'currency_pair'), name='holding_user_pair_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:48
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_trade_user_timestamp_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='portfoliovaluation',
+            name='equity',
+            field=models.DecimalField(decimal_places=8, default=Decimal('10000.00'), max_digits=28),
+        ),
+        migrations.AddIndex(
+            model_name='portfoliovaluation',
+            index=models.Index(fields=['-equity', 'user'], name='valuation_equity_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_valuation_equity_rank_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfoliovaluation',
+            name='equity_rank',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='portfoliovaluation',
+            index=models.Index(fields=['equity_rank'], name='valuation_stored_rank_idx'),
+        ),
+    ]
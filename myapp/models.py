@@ -1,10 +1,22 @@
-from decimal import Decimal
-from django.db import models, transaction
+import logging
+import random
+import time
+from decimal import ROUND_DOWN, Decimal
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
-import requests
+from .caching import prices
+from .leaderboard import forget_after_commit, record_after_commit
+from .metrics import timed, trade_seconds
+from .price_cache import price_cache
+
+logger = logging.getLogger(__name__)
 
 
 class Profile(models.Model):
@@ -19,12 +31,99 @@ class Profile(models.Model):
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+        PortfolioValuation.objects.create(user=instance)
+        record_after_commit(PortfolioValuation.objects.filter(user=instance))
+
+
+class PortfolioValuation(models.Model):
+    """
+    Denormalized per-user equity. ``Trade.execute`` applies cash and holdings deltas in
+    its transaction, and ``revalue()`` reprices every affected user in one UPDATE when
+    new prices are ingested, so equity can be read without touching ``Holding``.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="valuation")
+    cash = models.DecimalField(max_digits=20, decimal_places=2, default=Decimal("10000.00"))
+    holdings_value = models.DecimalField(max_digits=28, decimal_places=8, default=Decimal("0"))
+    equity = models.DecimalField(max_digits=28, decimal_places=8, default=Decimal("10000.00"))
+    updated_at = models.DateTimeField(auto_now=True)
+    # Leaderboard position as of the last re-rank (see leaderboard.py); null until then.
+    equity_rank = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        # Leaderboard order (see leaderboard.py): the live ranking scans the equity index,
+        # the stored one seeks by rank.
+        indexes = [
+            models.Index(fields=["-equity", "user"], name="valuation_equity_rank_idx"),
+            models.Index(fields=["equity_rank"], name="valuation_stored_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} equity: {self.equity}"
+
+    @classmethod
+    def for_user(cls, user):
+        try:
+            return cls.objects.get(user=user)
+        except cls.DoesNotExist:
+            cls.objects.create(user=user)
+            cls.revalue(users=[user])
+            return cls.objects.get(user=user)
+
+    @classmethod
+    def apply_trade(cls, user, cash_delta, holdings_delta):
+        valuation = cls.objects.filter(user=user)
+        valuation.update(
+            cash=F("cash") + cash_delta,
+            holdings_value=F("holdings_value") + holdings_delta,
+            equity=F("equity") + cash_delta + holdings_delta,
+            updated_at=timezone.now(),
+        )
+        record_after_commit(valuation)
+
+    @classmethod
+    def revalue(cls, currency_ids=None, users=None):
+        """
+        Recompute holdings value and equity from current prices (and resync cash from
+        ``Profile``) with a single UPDATE, optionally limited to holders of ``currency_ids``.
+        """
+        value = Coalesce(
+            Subquery(
+                Holding.objects.filter(user=OuterRef("user"))
+                .values("user")
+                .annotate(total=Sum(F("amount") * F("currency_pair__current_price")))
+                .values("total")
+            ),
+            Value(Decimal("0")),
+            output_field=models.DecimalField(max_digits=28, decimal_places=8),
+        )
+        # A user without a Profile (e.g. created outside signup) has the starting balance.
+        cash = Coalesce(
+            Subquery(Profile.objects.filter(user=OuterRef("user")).values("balance")),
+            Value(Profile._meta.get_field("balance").default),
+            output_field=models.DecimalField(max_digits=20, decimal_places=2),
+        )
+        qs = cls.objects.all()
+        if currency_ids is not None:
+            qs = qs.filter(user__in=Holding.objects.filter(currency_pair_id__in=currency_ids).values("user"))
+        if users is not None:
+            qs = qs.filter(user__in=users)
+        updated = qs.update(cash=cash, holdings_value=value, equity=cash + value, updated_at=timezone.now())
+        record_after_commit(qs)
+        return updated
+
+
+@receiver(post_delete, sender=PortfolioValuation)
+def _forget_valuation(sender, instance, **kwargs):
+    forget_after_commit([instance.user_id])
 
 
 class Currency(models.Model):
     base_currency = models.CharField(max_length=10)  # e.g. BTC
     quote_currency = models.CharField(max_length=10, default="USD")
     current_price = models.DecimalField(max_digits=20, decimal_places=8, default=Decimal("0.0"))
+    price_updated_at = models.DateTimeField(null=True, blank=True)
+    provider_id = models.CharField(max_length=64, blank=True, default="")  # CoinGecko id, e.g. "bitcoin"; blank = not tracked
 
     class Meta:
         unique_together = ("base_currency", "quote_currency")
@@ -32,19 +131,77 @@ class Currency(models.Model):
     def __str__(self):
         return f"{self.base_currency}/{self.quote_currency}"
 
+    def _is_fresh(self):
+        max_age = getattr(settings, "PRICE_CACHE_MAX_STALENESS", 300)
+        return self.price_updated_at and (timezone.now() - self.price_updated_at).total_seconds() < max_age
+
+    def _stored_price(self):
+        return Currency.objects.filter(pk=self.pk).values_list("current_price", "price_updated_at").get()
+
+    def load_price(self):
+        """
+        Return the latest stored price if the ingester refreshed it recently enough,
+        otherwise fall back to fetching it from the provider. The stored price is read
+        through the shared cache, so workers share one database read per ingested tick.
+        """
+        self.current_price, self.price_updated_at = prices.get_or_set(("pair", self.pk), self._stored_price)
+        if self._is_fresh():
+            return self.current_price
+        return self.update_price()
+
+    async def aload_price(self):
+        """Async ``load_price()``."""
+        self.current_price, self.price_updated_at = await prices.aget_or_set(("pair", self.pk), self._stored_price)
+        if self._is_fresh():
+            return self.current_price
+        return await self.aupdate_price()
+
     def update_price(self):
-        """Fetch real-time price from CoinGecko API."""
+        """
+        Fetch the real-time price through the configured price feed (see feeds.py). If
+        every provider is failing, the stored price is returned and nothing is written.
+        """
+        from .feeds import shared_feed  # feeds -> symbols -> models
+
+        if not self.provider_id or self.quote_currency != "USD":
+            return self.current_price
+        try:
+            quotes = shared_feed.get().fetch({self.base_currency: self.provider_id})
+        except (OSError, EOFError) as e:
+            logger.warning("Serving stored %s price: %s", self.base_currency, e)
+            return self.current_price
+        if self.base_currency not in quotes:
+            return self.current_price
+        return self.record_price(quotes[self.base_currency])
+
+    async def aupdate_price(self):
+        """Async ``update_price()``: the providers are queried on the event loop."""
+        from .feeds import shared_feed
+
+        if not self.provider_id or self.quote_currency != "USD":
+            return self.current_price
         try:
-            url = f"https://api.coingecko.com/api/v3/simple/price?ids={self.base_currency.lower()}&vs_currencies={self.quote_currency.lower()}"
-            response = requests.get(url).json()
-            new_price = Decimal(str(response[self.base_currency.lower()][self.quote_currency.lower()]))
-            self.current_price = new_price
-            self.save()
+            quotes = await shared_feed.get().afetch({self.base_currency: self.provider_id})
+        except (OSError, EOFError) as e:
+            logger.warning("Serving stored %s price: %s", self.base_currency, e)
+            return self.current_price
+        if self.base_currency not in quotes:
+            return self.current_price
+        return await sync_to_async(self.record_price)(quotes[self.base_currency])
 
-            PriceHistory.objects.create(currency_pair=self, price=new_price)
-            return new_price
-        except Exception:
-            return self.current_price  # fallback if API fails
+    def record_price(self, price):
+        """Store ``price`` as the current price and append it to the history."""
+        self.current_price = price
+        self.price_updated_at = timezone.now()
+        self.save(update_fields=["current_price", "price_updated_at"])
+        PriceHistory.objects.create(currency_pair=self, price=self.current_price, timestamp=self.price_updated_at)
+        return self.current_price
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+def _bump_prices(sender, **kwargs):
+    prices.bump_after_commit()
 
 
 class Holding(models.Model):
@@ -52,6 +209,9 @@ class Holding(models.Model):
     currency_pair = models.ForeignKey(Currency, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=20, decimal_places=8, default=Decimal("0.0"))
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "currency_pair"], name="holding_user_pair_uniq")]
+
     @property
     def market_value(self):
         return self.amount * self.currency_pair.current_price
@@ -71,49 +231,79 @@ class Trade(models.Model):
     price = models.DecimalField(max_digits=20, decimal_places=8)
     timestamp = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "-timestamp", "-id"], name="trade_user_ts_id_idx")]
+
     def __str__(self):
         return f"{self.user.username} {self.side} {self.amount} {self.currency_pair.base_currency} @ {self.price}"
 
     @classmethod
-    def execute(cls, user, currency, side, usd_amount):
+    def execute(cls, user, currency, side, usd_amount, price=None):
         """
         Executes a trade (buy/sell).
         Users enter USD value they want to trade, not raw crypto amount.
+
+        Balances move through conditional UPDATEs (``... WHERE balance >= x``) instead of
+        read-modify-write, so concurrent orders from one user can neither lose updates nor
+        overspend. Rows are always touched in the same order (profile, holding, valuation)
+        and lock conflicts / deadlocks are retried with jittered backoff.
         """
+        with timed(trade_seconds, side if side in ("BUY", "SELL") else "invalid"):
+            return cls._execute(user, currency, side, usd_amount, price)
+
+    @classmethod
+    def _execute(cls, user, currency, side, usd_amount, price):
         usd_amount = Decimal(usd_amount)
-        price = currency.update_price()
+        if side not in ("BUY", "SELL"):
+            raise ValueError("Side must be BUY or SELL.")
+        price = price or price_cache.get(currency)
+        if not price:
+            raise ValueError("Price unavailable, try again shortly.")
 
+        crypto_amount = cls.units_for(usd_amount, price)
+        if crypto_amount <= 0:
+            raise ValueError("Amount too small to trade.")
+
+        # Retrying is only safe when we own the transaction.
+        attempts = 1 if transaction.get_connection().in_atomic_block else getattr(settings, "TRADE_MAX_ATTEMPTS", 5)
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic():
+                    return cls._apply(user, currency, side, usd_amount, crypto_amount, price)
+            except OperationalError:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(random.uniform(0, min(0.2, 0.01 * 2 ** attempt)))
+
+    @staticmethod
+    def units_for(usd_amount, price):
         # Convert USD value to crypto units (e.g. $100 / $60,000 = 0.001666 BTC)
-        crypto_amount = usd_amount / price
-
-        with transaction.atomic():
-            profile = user.profile
-            holding, _ = Holding.objects.get_or_create(user=user, currency_pair=currency)
-
-            if side == "BUY":
-                if profile.balance < usd_amount:
-                    raise ValueError("Insufficient balance to buy.")
-                profile.balance -= usd_amount
-                holding.amount += crypto_amount
-                profile.save()
-                holding.save()
-
-            elif side == "SELL":
-                if holding.amount < crypto_amount:
-                    raise ValueError("Insufficient holdings to sell.")
-                profile.balance += usd_amount
-                holding.amount -= crypto_amount
-                profile.save()
-                holding.save()
-
-            return cls.objects.create(
-                user=user,
-                currency_pair=currency,
-                side=side,
-                amount=crypto_amount,
-                usd_value=usd_amount,
-                price=price,
-            )
+        return (usd_amount / price).quantize(Decimal("0.00000001"), rounding=ROUND_DOWN)
+
+    @classmethod
+    def _apply(cls, user, currency, side, usd_amount, crypto_amount, price):
+        profiles = Profile.objects.filter(user=user)
+        holdings = Holding.objects.filter(user=user, currency_pair=currency)
+        if side == "BUY":
+            if not profiles.filter(balance__gte=usd_amount).update(balance=F("balance") - usd_amount):
+                raise ValueError("Insufficient balance to buy.")
+            if not holdings.update(amount=F("amount") + crypto_amount):
+                Holding.objects.create(user=user, currency_pair=currency, amount=crypto_amount)
+            PortfolioValuation.apply_trade(user, -usd_amount, crypto_amount * currency.current_price)
+        else:
+            profiles.update(balance=F("balance") + usd_amount)
+            if not holdings.filter(amount__gte=crypto_amount).update(amount=F("amount") - crypto_amount):
+                raise ValueError("Insufficient holdings to sell.")
+            PortfolioValuation.apply_trade(user, usd_amount, -crypto_amount * currency.current_price)
+
+        return cls.objects.create(
+            user=user,
+            currency_pair=currency,
+            side=side,
+            amount=crypto_amount,
+            usd_value=usd_amount,
+            price=price,
+        )
 
 
 class PriceHistory(models.Model):
@@ -121,5 +311,71 @@ class PriceHistory(models.Model):
     price = models.DecimalField(max_digits=20, decimal_places=8)
     timestamp = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [models.Index(fields=["currency_pair", "timestamp"], name="pricehistory_pair_ts_idx")]
+
     def __str__(self):
         return f"{self.currency_pair.base_currency} @ {self.price} ({self.timestamp})"
+
+
+class PriceCandle(models.Model):
+    """OHLC rollup of raw PriceHistory ticks (see rollups.py)."""
+
+    INTERVAL_CHOICES = (("1m", "1 minute"), ("1h", "1 hour"), ("1d", "1 day"))
+    INTERVAL_SECONDS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+    currency_pair = models.ForeignKey(Currency, on_delete=models.CASCADE)
+    interval = models.CharField(max_length=2, choices=INTERVAL_CHOICES)
+    bucket_start = models.DateTimeField()
+    open = models.DecimalField(max_digits=20, decimal_places=8)
+    high = models.DecimalField(max_digits=20, decimal_places=8)
+    low = models.DecimalField(max_digits=20, decimal_places=8)
+    close = models.DecimalField(max_digits=20, decimal_places=8)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["currency_pair", "interval", "bucket_start"], name="pricecandle_pair_interval_bucket_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.currency_pair.base_currency} {self.interval} {self.bucket_start}: {self.close}"
+
+
+class Order(models.Model):
+    """
+    Resting limit/stop order, filled by the matching engine (orderbook.py) when an
+    ingested price crosses ``trigger_price``. BUY LIMIT and SELL STOP fire at or below
+    the trigger; SELL LIMIT and BUY STOP fire at or above it.
+    """
+
+    TYPE_CHOICES = (("LIMIT", "Limit"), ("STOP", "Stop"))
+    STATUS_CHOICES = (("OPEN", "Open"), ("FILLED", "Filled"), ("CANCELLED", "Cancelled"), ("REJECTED", "Rejected"))
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    currency_pair = models.ForeignKey(Currency, on_delete=models.CASCADE)
+    side = models.CharField(max_length=4, choices=Trade.SIDE_CHOICES)
+    order_type = models.CharField(max_length=5, choices=TYPE_CHOICES)
+    usd_amount = models.DecimalField(max_digits=20, decimal_places=2)
+    trigger_price = models.DecimalField(max_digits=20, decimal_places=8)
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default="OPEN")
+    reason = models.CharField(max_length=100, blank=True, default="")
+    trade = models.OneToOneField(Trade, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="order_status_id_idx"),
+            models.Index(fields=["updated_at"], name="order_updated_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.side} {self.order_type} ${self.usd_amount} {self.currency_pair.base_currency} @ {self.trigger_price} ({self.status})"
+
+    @property
+    def fires_below(self):
+        """True if the order triggers when the price falls to the trigger, False if it rises to it."""
+        return (self.side, self.order_type) in (("BUY", "LIMIT"), ("SELL", "STOP"))
@@ -0,0 +1,148 @@
+import heapq
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, Trade
+
+logger = logging.getLogger(__name__)
+
+
+class OrderBook:
+    """
+    Resting orders of one pair, kept in two price heaps:
+
+    * ``below``: orders that fire when the price falls to their trigger (BUY LIMIT,
+      SELL STOP), as a max-heap so the highest trigger is checked first;
+    * ``above``: orders that fire when the price rises to their trigger (SELL LIMIT,
+      BUY STOP), as a min-heap.
+
+    A tick pops only the orders it triggers, so matching costs O(log n) per fired order.
+    Removed orders are dropped lazily when they surface.
+    """
+
+    def __init__(self):
+        self.below = []
+        self.above = []
+        self.orders = {}
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order):
+        if order.pk in self.orders:
+            return
+        self.orders[order.pk] = order
+        if order.fires_below:
+            heapq.heappush(self.below, (-order.trigger_price, order.pk))
+        else:
+            heapq.heappush(self.above, (order.trigger_price, order.pk))
+
+    def remove(self, order_id):
+        self.orders.pop(order_id, None)
+
+    def crossing(self, price):
+        """Pop and return the live orders triggered by ``price``, oldest first within a level."""
+        fired = []
+        while self.below and -self.below[0][0] >= price:
+            _, order_id = heapq.heappop(self.below)
+            if order_id in self.orders:
+                fired.append(self.orders.pop(order_id))
+        while self.above and self.above[0][0] <= price:
+            _, order_id = heapq.heappop(self.above)
+            if order_id in self.orders:
+                fired.append(self.orders.pop(order_id))
+        return fired
+
+
+class MatchingEngine:
+    """
+    In-memory books for every pair, rebuilt from the ``OPEN`` orders in the database on
+    ``load()`` and kept current with ``sync()``. ``on_prices()`` fills the orders a tick
+    crosses.
+
+    ``sync()`` re-reads every order whose ``updated_at`` falls in a window reaching
+    ``ORDER_SYNC_OVERLAP`` seconds before the previous sync, so an order saved in a
+    transaction that committed late is still picked up (adding is idempotent). A
+    transaction slower than that is covered by the full reload every
+    ``ORDER_BOOK_RESYNC_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        self.books = {}
+        self.synced_at = None
+        self.loaded_at = None
+        self.loaded = False
+
+    def book(self, pair_id):
+        if pair_id not in self.books:
+            self.books[pair_id] = OrderBook()
+        return self.books[pair_id]
+
+    def load(self):
+        self.books = {}
+        self.synced_at = self.loaded_at = timezone.now()
+        open_orders = Order.objects.filter(status="OPEN").select_related("user", "currency_pair").order_by("id")
+        for order in open_orders.iterator(chunk_size=2000):
+            self.book(order.currency_pair_id).add(order)
+        self.loaded = True
+
+    def sync(self):
+        now = timezone.now()
+        resync = getattr(settings, "ORDER_BOOK_RESYNC_INTERVAL", 300)
+        if not self.loaded or (now - self.loaded_at).total_seconds() >= resync:
+            return self.load()
+        since = self.synced_at - timedelta(seconds=getattr(settings, "ORDER_SYNC_OVERLAP", 60))
+        changed = Order.objects.filter(updated_at__gte=since).select_related("user", "currency_pair")
+        for order in changed.order_by("id"):
+            if order.status == "OPEN":
+                self.book(order.currency_pair_id).add(order)
+            elif order.currency_pair_id in self.books:
+                self.books[order.currency_pair_id].remove(order.pk)
+        self.synced_at = now
+
+    def on_prices(self, prices):
+        """
+        Fill every resting order crossed by ``prices`` (``{pair_id: price}``). Returns the
+        orders handled. An order whose fill fails unexpectedly goes back on its book (its
+        transaction rolled back, so it is still OPEN) and the remaining orders still fill.
+        """
+        handled = []
+        for pair_id, price in prices.items():
+            book = self.books.get(pair_id)
+            if not book:
+                continue
+            for order in book.crossing(price):
+                try:
+                    fill(order, price)
+                except Exception:
+                    logger.exception("Filling order %s failed; it stays on the book", order.pk)
+                    book.add(order)
+                    continue
+                handled.append(order)
+        return handled
+
+
+def fill(order, price):
+    """
+    Execute a triggered order at ``price``. The OPEN -> FILLED claim is a conditional
+    update, so an order cancelled since the last sync is skipped. Orders the account can
+    no longer cover are marked REJECTED.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, status="OPEN").update(status="FILLED", updated_at=timezone.now()):
+            return None
+        try:
+            trade = Trade.execute(order.user, order.currency_pair, order.side, order.usd_amount, price=price)
+        except ValueError as e:
+            Order.objects.filter(pk=order.pk).update(status="REJECTED", reason=str(e)[:100])
+            order.status = "REJECTED"
+            return None
+        Order.objects.filter(pk=order.pk).update(trade=trade)
+        order.status = "FILLED"
+        order.trade = trade
+        logger.info("Filled order %s at %s", order.pk, price)
+        return trade
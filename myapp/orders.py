@@ -0,0 +1,153 @@
+import asyncio
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .models import Currency, Holding, PortfolioValuation, Profile, Trade
+from .price_cache import price_cache
+
+MODES = ("all_or_nothing", "best_effort")
+
+
+class BatchRejected(Exception):
+    """Raised inside the batch transaction to roll back an all-or-nothing batch."""
+
+
+def parse_orders(raw_orders):
+    """
+    Validate a list of ``{"symbol", "side", "usd_amount"}`` dicts. Returns
+    ``(orders, errors)`` where ``errors`` maps an order's index to its problem.
+    """
+    max_orders = getattr(settings, "ORDER_BATCH_MAX", 100)
+    if not isinstance(raw_orders, list) or not raw_orders:
+        raise ValueError("orders must be a non-empty list")
+    if len(raw_orders) > max_orders:
+        raise ValueError(f"at most {max_orders} orders per batch")
+
+    orders, errors = [], {}
+    for index, raw in enumerate(raw_orders):
+        if not isinstance(raw, dict):
+            errors[index] = "order must be an object"
+            orders.append(None)
+            continue
+        symbol = str(raw.get("symbol", "")).upper()
+        side = str(raw.get("side", "")).upper()
+        try:
+            usd_amount = Decimal(str(raw.get("usd_amount")))
+        except InvalidOperation:
+            usd_amount = None
+        if not symbol:
+            errors[index] = "symbol is required"
+        elif side not in ("BUY", "SELL"):
+            errors[index] = "side must be BUY or SELL"
+        elif usd_amount is None or not usd_amount.is_finite() or usd_amount <= 0:
+            errors[index] = "usd_amount must be a positive number"
+        orders.append({"symbol": symbol, "side": side, "usd_amount": usd_amount})
+    return orders, errors
+
+
+def execute_batch(user, raw_orders, mode="all_or_nothing"):
+    """
+    Price every order from one quote snapshot and apply the whole batch in one
+    transaction: the profile and holdings are locked once (in the same order as
+    ``Trade.execute``), balances are netted in memory, and the results are written with
+    one profile update, bulk holding writes and one ``bulk_create`` of ``Trade`` rows.
+
+    In ``all_or_nothing`` mode any failing order rejects the batch; in ``best_effort``
+    mode failing orders are skipped. Returns ``(executed, results)`` with one result
+    per submitted order.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    orders, errors = parse_orders(raw_orders)
+    pairs = {c.base_currency: c for c in _pairs(orders)}
+    quotes = {symbol: price_cache.get(pair) for symbol, pair in pairs.items()}
+    return _fill(user, orders, errors, pairs, quotes, mode)
+
+
+async def aexecute_batch(user, raw_orders, mode="all_or_nothing"):
+    """
+    Async ``execute_batch()``: the pairs are loaded and every quote is fetched
+    concurrently on the event loop, then the batch transaction runs in a worker thread.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    orders, errors = parse_orders(raw_orders)
+    pairs = {c.base_currency: c async for c in _pairs(orders)}
+    prices = await asyncio.gather(*(price_cache.aget(pair) for pair in pairs.values()))
+    quotes = dict(zip(pairs, prices))
+    return await sync_to_async(_fill)(user, orders, errors, pairs, quotes, mode)
+
+
+def _pairs(orders):
+    return Currency.objects.filter(quote_currency="USD", base_currency__in={o["symbol"] for o in orders if o})
+
+
+def _fill(user, orders, errors, pairs, quotes, mode):
+    results = [None] * len(orders)
+    try:
+        with transaction.atomic():
+            # Users created outside signup (e.g. in the admin) may have no profile yet.
+            profile, _ = Profile.objects.select_for_update().get_or_create(user=user)
+            holdings = {
+                h.currency_pair_id: h
+                for h in Holding.objects.select_for_update().filter(user=user, currency_pair__in=list(pairs.values()))
+            }
+            cash = profile.balance
+            holdings_delta = Decimal("0")
+            trades, touched = [], set()
+
+            for index, order in enumerate(orders):
+                error = errors.get(index)
+                pair = pairs.get(order["symbol"]) if order else None
+                price = quotes.get(order["symbol"]) if order else None
+                if error is None and pair is None:
+                    error = f"unknown symbol {order['symbol']}"
+                elif error is None and not price:
+                    error = "price unavailable"
+                if error is None:
+                    usd_amount = order["usd_amount"]
+                    units = Trade.units_for(usd_amount, price)
+                    holding = holdings.get(pair.pk) or Holding(user=user, currency_pair=pair, amount=Decimal("0"))
+                    if units <= 0:
+                        error = "amount too small to trade"
+                    elif order["side"] == "BUY" and cash < usd_amount:
+                        error = "insufficient balance to buy"
+                    elif order["side"] == "SELL" and holding.amount < units:
+                        error = "insufficient holdings to sell"
+                if error is not None:
+                    results[index] = {"index": index, "status": "rejected", "error": error}
+                    continue
+
+                sign = 1 if order["side"] == "BUY" else -1
+                cash -= sign * usd_amount
+                holding.amount += sign * units
+                holdings_delta += sign * units * pair.current_price
+                holdings[pair.pk] = holding
+                touched.add(pair.pk)
+                trades.append(Trade(
+                    user=user, currency_pair=pair, side=order["side"], amount=units, usd_value=usd_amount, price=price,
+                ))
+                results[index] = {
+                    "index": index, "status": "filled", "symbol": order["symbol"], "side": order["side"],
+                    "amount": str(units), "usd_value": str(usd_amount), "price": str(price),
+                }
+
+            if mode == "all_or_nothing" and len(trades) < len(orders):
+                raise BatchRejected
+            if trades:
+                Profile.objects.filter(pk=profile.pk).update(balance=cash)
+                changed = [holdings[pk] for pk in touched]
+                Holding.objects.bulk_update([h for h in changed if h.pk], ["amount"])
+                Holding.objects.bulk_create([h for h in changed if not h.pk])
+                Trade.objects.bulk_create(trades)
+                PortfolioValuation.apply_trade(user, cash - profile.balance, holdings_delta)
+    except BatchRejected:
+        results = [
+            r if r["status"] == "rejected" else {"index": r["index"], "status": "not_executed"}
+            for r in results
+        ]
+        return 0, results
+    return len(trades), results
@@ -0,0 +1,42 @@
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, pk)`` from a cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        stamp, pk = raw.rsplit("|", 1)
+        timestamp = parse_datetime(stamp)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+    if timestamp is None:
+        raise ValueError("invalid cursor")
+    return timestamp, pk
+
+
+def keyset_page(queryset, cursor=None, page_size=50, field="timestamp"):
+    """
+    Newest-first page of ``queryset`` ordered by ``(field, id)``. Instead of an OFFSET,
+    each page resumes strictly after the last row of the previous one, so it costs the
+    same index range scan however deep it is. Returns ``(rows, next_cursor)``;
+    ``next_cursor`` is None on the last page.
+    """
+    queryset = queryset.order_by(f"-{field}", "-id")
+    if cursor:
+        after, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f"{field}__lt": after}) | Q(**{field: after, "id__lt": pk}))
+    rows = list(queryset[: page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, field), last.pk)
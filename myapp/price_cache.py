@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+import weakref
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+class _Entry:
+    __slots__ = ("price", "fetched_at")
+
+    def __init__(self, price, fetched_at):
+        self.price = price
+        self.fetched_at = fetched_at
+
+
+class PriceCache:
+    """
+    In-process, per-pair price snapshot shared by every thread of a worker.
+
+    A quote younger than ``ttl`` seconds is served as-is. An expired quote that is
+    still within ``max_staleness`` is served immediately while one background refresh
+    runs. A miss (or a quote past ``max_staleness``) blocks on a single-flight refresh:
+    concurrent callers for the same pair wait for the one upstream fetch in progress.
+
+    ``aget()`` is the same policy for async views. Its blocking refresh runs as one task
+    per pair on the event loop, so waiting callers don't hold a thread each.
+    """
+
+    def __init__(self, ttl=None, max_staleness=None, clock=time.monotonic):
+        self._ttl = ttl
+        self._max_staleness = max_staleness
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._tasks = weakref.WeakKeyDictionary()
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "PRICE_CACHE_TTL", 30)
+
+    @property
+    def max_staleness(self):
+        if self._max_staleness is not None:
+            return self._max_staleness
+        return getattr(settings, "PRICE_CACHE_MAX_STALENESS", 300)
+
+    @staticmethod
+    def key(currency):
+        return (currency.base_currency.upper(), currency.quote_currency.upper())
+
+    def get(self, currency):
+        """Return a quote for ``currency``, refreshing from the provider only when needed."""
+        key = self.key(currency)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = self._clock() - entry.fetched_at
+            if age < self.ttl:
+                return entry.price
+            if age < self.max_staleness:
+                self._refresh(key, currency, wait=False)
+                return entry.price
+        return self._refresh(key, currency, wait=True)
+
+    async def aget(self, currency):
+        """Async ``get()``."""
+        key = self.key(currency)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = self._clock() - entry.fetched_at
+            if age < self.ttl:
+                return entry.price
+            if age < self.max_staleness:
+                self._refresh(key, currency, wait=False)
+                return entry.price
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(self._aload(key, currency))
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _aload(self, key, currency):
+        price = await currency.aload_price()
+        if price:
+            self.set(key, price)
+        return price
+
+    def publish(self, currency, price, updated_at=None):
+        """
+        Store a quote obtained elsewhere (e.g. by the ingester). It counts as fetched
+        just now, or at ``updated_at`` (an aware datetime) when given, so an old stored
+        price ages out on the usual schedule.
+        """
+        age = (timezone.now() - updated_at).total_seconds() if updated_at is not None else 0
+        self.set(self.key(currency), price, age=max(age, 0))
+
+    def set(self, key, price, age=0):
+        with self._lock:
+            self._entries[key] = _Entry(Decimal(price), self._clock() - age)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _refresh(self, key, currency, wait):
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = threading.Event()
+
+        if not leader:
+            if wait:
+                flight.wait()
+                entry = self._entries.get(key)
+                return entry.price if entry is not None else currency.current_price
+            return None
+
+        if wait:
+            return self._load(key, currency, flight)
+        threading.Thread(target=self._load_in_background, args=(key, currency, flight), daemon=True).start()
+        return None
+
+    def _load_in_background(self, key, currency, flight):
+        try:
+            self._load(key, currency, flight)
+        finally:
+            connections.close_all()
+
+    def _load(self, key, currency, flight):
+        try:
+            price = currency.load_price()
+            if price:
+                self.set(key, price)
+            return price
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.set()
+
+
+price_cache = PriceCache()
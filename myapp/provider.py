@@ -0,0 +1,325 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_URL = "https://api.coingecko.com/api/v3/simple/price"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def provider_url():
+    return getattr(settings, "COINGECKO_URL", COINGECKO_URL)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``threshold`` consecutive failures and rejects calls for ``reset_timeout``
+    seconds. After that one trial call is let through (half-open): success closes the
+    circuit, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.threshold):
+                logger.warning("Price provider circuit opened after %s failures", self.failures)
+                self.opened_at = self.clock()
+            self._trial = False
+
+    def release_trial(self):
+        """Give up a half-open trial that ended without an outcome (e.g. cancelled); the next call may try again."""
+        with self._lock:
+            self._trial = False
+
+    def reset(self):
+        self.record_success()
+
+
+class RateLimiter:
+    """Spaces request starts so at most ``per_minute`` go out in any minute, across threads."""
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.spacing = 60.0 / per_minute if per_minute else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def _reserve(self):
+        with self._lock:
+            now = self.clock()
+            start = max(now, self._next)
+            self._next = start + self.spacing
+        return start - now
+
+    def wait(self):
+        delay = self._reserve()
+        if delay > 0:
+            self.sleep(delay)
+
+    async def async_wait(self):
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ProviderMetrics:
+    """Request counters and a latency histogram (seconds, cumulative buckets) for the provider client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._zero()
+
+    def _zero(self):
+        self.requests = 0
+        self.failures = {}
+        self.short_circuited = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+
+    def observe(self, seconds, error=None):
+        with self._lock:
+            self.requests += 1
+            self.latency_sum += seconds
+            self.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if error is not None:
+                self.failures[error] = self.failures.get(error, 0) + 1
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), self.latency_buckets):
+                cumulative += n
+                buckets[str(bound)] = cumulative
+            return {
+                "requests": self.requests,
+                "failures": dict(self.failures),
+                "short_circuited": self.short_circuited,
+                "latency_seconds": {"count": self.requests, "sum": round(self.latency_sum, 6), "buckets": buckets},
+            }
+
+
+class ProviderClient:
+    """
+    Shared client for the price provider. One keep-alive ``Session`` with a bounded
+    connection pool is reused for every request, each request has separate connect and
+    read timeouts, and connection-level failures of these idempotent GETs are retried
+    with exponential backoff by urllib3. HTTP error statuses are raised to the caller
+    (the ingester has its own ``Retry-After``-aware backoff).
+
+    Consecutive failures trip a circuit breaker; while it is open no requests are sent
+    and callers fall back to the stored prices (``Currency.update_price``).
+
+    The ``a*`` methods are the same calls for async views: they go through one
+    ``httpx.AsyncClient`` per event loop (same timeouts and pool size, connect retries
+    only) and share the breaker and metrics with the sync path.
+    httpx errors are re-raised as the equivalent ``requests`` exceptions so callers
+    handle both paths alike.
+    """
+
+    def __init__(self, session=None, connect_timeout=None, read_timeout=None, retries=None, backoff=None,
+                 pool_size=None, breaker=None):
+        self.connect_timeout = connect_timeout or getattr(settings, "PRICE_PROVIDER_CONNECT_TIMEOUT", 3.05)
+        self.read_timeout = read_timeout or getattr(settings, "PRICE_FETCH_TIMEOUT", 5)
+        retries = retries if retries is not None else getattr(settings, "PRICE_PROVIDER_RETRIES", 2)
+        backoff = backoff if backoff is not None else getattr(settings, "PRICE_PROVIDER_BACKOFF", 0.3)
+        pool_size = pool_size or getattr(settings, "PRICE_PROVIDER_POOL_SIZE", 10)
+        self.retries, self.pool_size = retries, pool_size
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries, connect=retries, read=retries, backoff_factor=backoff, allowed_methods={"GET"},
+                respect_retry_after_header=False,
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.breaker = breaker or CircuitBreaker(
+            threshold=getattr(settings, "PRICE_PROVIDER_BREAKER_THRESHOLD", 5),
+            reset_timeout=getattr(settings, "PRICE_PROVIDER_BREAKER_RESET", 30),
+        )
+        self.metrics = ProviderMetrics()
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def get_json(self, url, params=None, headers=None):
+        """
+        GET ``url`` and decode the JSON body. Raises ``CircuitOpenError`` while the breaker
+        is open, ``requests.HTTPError`` on 4xx/5xx and ``requests.RequestException`` on
+        network failures.
+        """
+        if not self.breaker.allow():
+            self.metrics.count("short_circuited")
+            raise CircuitOpenError("price provider circuit is open")
+        start = time.perf_counter()
+        try:
+            response = self.session.get(
+                url, params=params, headers=headers, timeout=(self.connect_timeout, self.read_timeout)
+            )
+            response.raise_for_status()
+            data = response.json()
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            self._failed(start, f"http_{status}", client_error=status is not None and 400 <= status < 500 and status != 429)
+            raise
+        except requests.ConnectionError as e:
+            # Once retries are exhausted requests reports read timeouts as ConnectionError.
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, ReadTimeoutError):
+                self._failed(start, "ReadTimeout")
+                raise requests.ReadTimeout(*e.args, request=e.request) from e
+            self._failed(start, type(e).__name__)
+            raise
+        except (requests.RequestException, ValueError) as e:
+            self._failed(start, type(e).__name__)
+            raise
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        self.metrics.observe(time.perf_counter() - start)
+        self.breaker.record_success()
+        return data
+
+    def get_prices(self, ids, vs_currency="usd"):
+        """CoinGecko ``simple/price`` quotes for provider ``ids``: ``{id: {vs_currency: price}}``."""
+        return self.get_json(provider_url(), params={"ids": ",".join(ids), "vs_currencies": vs_currency})
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=self.retries),
+            )
+        return client
+
+    async def aget_json(self, url, params=None, headers=None):
+        """Async ``get_json()``; raises the same exception types."""
+        if not self.breaker.allow():
+            self.metrics.count("short_circuited")
+            raise CircuitOpenError("price provider circuit is open")
+        start = time.perf_counter()
+        try:
+            response = await self._async_client().get(url, params=params, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            self._failed(start, f"http_{status}", client_error=400 <= status < 500 and status != 429)
+            raise requests.HTTPError(str(e), response=_requests_response(e.response)) from e
+        except httpx.TimeoutException as e:
+            error = {httpx.ReadTimeout: requests.ReadTimeout, httpx.ConnectTimeout: requests.ConnectTimeout}.get(
+                type(e), requests.Timeout
+            )
+            self._failed(start, error.__name__)
+            raise error(str(e)) from e
+        except httpx.TransportError as e:
+            self._failed(start, "ConnectionError")
+            raise requests.ConnectionError(str(e)) from e
+        except ValueError as e:
+            self._failed(start, type(e).__name__)
+            raise
+        except BaseException:
+            # Cancelled (e.g. a straggler once the feed has its quorum): no verdict on the
+            # provider, but a half-open trial must not stay claimed forever.
+            self.breaker.release_trial()
+            raise
+        self.metrics.observe(time.perf_counter() - start)
+        self.breaker.record_success()
+        return data
+
+    async def aget_prices(self, ids, vs_currency="usd"):
+        """Async ``get_prices()``."""
+        return await self.aget_json(provider_url(), params={"ids": ",".join(ids), "vs_currencies": vs_currency})
+
+    def _failed(self, start, error, client_error=False):
+        self.metrics.observe(time.perf_counter() - start, error=error)
+        # A 4xx (other than 429) is our request's fault, not a sign the provider is down.
+        if client_error:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def status(self):
+        return {"circuit": self.breaker.state, "failures": self.breaker.failures, **self.metrics.snapshot()}
+
+    def reset(self):
+        self.breaker.reset()
+        self.metrics.reset()
+
+
+def _requests_response(response):
+    """A ``requests.Response`` carrying an httpx response's status, headers and body."""
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.headers.update(response.headers)
+    converted.url = str(response.url)
+    converted._content = response.content
+    return converted
+
+
+# One pooled client (session, breaker, metrics) per upstream API.
+provider = ProviderClient()
+coincap_client = ProviderClient()
+CLIENTS = {"coingecko": provider, "coincap": coincap_client}
@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import PriceCandle, PriceHistory
+
+# Each rollup is built from the next finer series; "raw" means PriceHistory ticks.
+ROLLUP_SOURCES = (("1m", "raw"), ("1h", "1m"), ("1d", "1h"))
+CHUNK_SIZE = 5000
+
+
+def bucket_start(ts, seconds):
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def build_candles(rows, seconds):
+    """
+    Merge time-ordered ``(timestamp, open, high, low, close, count)`` rows of one pair
+    into buckets of ``seconds``. Yields ``(bucket_start, open, high, low, close, count)``.
+    """
+    current = None
+    for ts, o, h, l, c, n in rows:
+        start = bucket_start(ts, seconds)
+        if current is not None and current[0] == start:
+            current[2] = max(current[2], h)
+            current[3] = min(current[3], l)
+            current[4] = c
+            current[5] += n
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [start, o, h, l, c, n]
+    if current is not None:
+        yield tuple(current)
+
+
+def _source_rows(source, pair_id, since):
+    if source == "raw":
+        qs = PriceHistory.objects.filter(currency_pair_id=pair_id)
+        if since is not None:
+            qs = qs.filter(timestamp__gte=since)
+        for ts, price in qs.order_by("timestamp").values_list("timestamp", "price").iterator(chunk_size=CHUNK_SIZE):
+            yield ts, price, price, price, price, 1
+    else:
+        qs = PriceCandle.objects.filter(currency_pair_id=pair_id, interval=source)
+        if since is not None:
+            qs = qs.filter(bucket_start__gte=since)
+        yield from qs.order_by("bucket_start").values_list(
+            "bucket_start", "open", "high", "low", "close", "count"
+        ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _source_pairs(source):
+    if source == "raw":
+        return PriceHistory.objects.values_list("currency_pair_id", flat=True).distinct()
+    return PriceCandle.objects.filter(interval=source).values_list("currency_pair_id", flat=True).distinct()
+
+
+def rollup(interval):
+    """
+    Incrementally compact the finer series into ``interval`` candles. Each pair resumes
+    from its latest existing bucket (which is rebuilt, since it may have been partial).
+    Returns the number of candles written.
+    """
+    source = dict(ROLLUP_SOURCES)[interval]
+    seconds = PriceCandle.INTERVAL_SECONDS[interval]
+    watermarks = dict(
+        PriceCandle.objects.filter(interval=interval)
+        .values("currency_pair_id")
+        .annotate(latest=Max("bucket_start"))
+        .values_list("currency_pair_id", "latest")
+    )
+    written = 0
+    for pair_id in list(_source_pairs(source)):
+        batch = []
+        for start, o, h, l, c, n in build_candles(_source_rows(source, pair_id, watermarks.get(pair_id)), seconds):
+            batch.append(PriceCandle(
+                currency_pair_id=pair_id, interval=interval, bucket_start=start,
+                open=o, high=h, low=l, close=c, count=n,
+            ))
+            if len(batch) >= CHUNK_SIZE:
+                written += _upsert(batch)
+                batch = []
+        written += _upsert(batch)
+    return written
+
+
+def _upsert(candles):
+    if not candles:
+        return 0
+    PriceCandle.objects.bulk_create(
+        candles,
+        update_conflicts=True,
+        unique_fields=["currency_pair", "interval", "bucket_start"],
+        update_fields=["open", "high", "low", "close", "count"],
+    )
+    return len(candles)
+
+
+def rollup_all():
+    return {interval: rollup(interval) for interval, _ in ROLLUP_SOURCES}
+
+
+def prune(now=None):
+    """
+    Apply the retention policy: delete raw ticks older than ``PRICE_HISTORY_RETENTION_DAYS``
+    and 1m candles older than ``PRICE_CANDLE_1M_RETENTION_DAYS``. Only rows already folded
+    into the next rollup are removed: each pair is cut at its own latest rollup bucket,
+    so a pair whose rollup lags keeps its rows. Returns ``(raw_deleted, minute_candles_deleted)``.
+    """
+    now = now or timezone.now()
+    raw_cutoff = now - timedelta(days=getattr(settings, "PRICE_HISTORY_RETENTION_DAYS", 7))
+    minute_cutoff = now - timedelta(days=getattr(settings, "PRICE_CANDLE_1M_RETENTION_DAYS", 90))
+
+    raw_deleted = minute_deleted = 0
+    for pair_id, minute_mark in _latest_buckets("1m"):
+        deleted, _ = PriceHistory.objects.filter(
+            currency_pair_id=pair_id, timestamp__lt=min(raw_cutoff, minute_mark)
+        ).delete()
+        raw_deleted += deleted
+    for pair_id, hour_mark in _latest_buckets("1h"):
+        deleted, _ = PriceCandle.objects.filter(
+            currency_pair_id=pair_id, interval="1m", bucket_start__lt=min(minute_cutoff, hour_mark)
+        ).delete()
+        minute_deleted += deleted
+    return raw_deleted, minute_deleted
+
+
+def _latest_buckets(interval):
+    """``(pair_id, latest bucket_start)`` for every pair with ``interval`` candles."""
+    return list(
+        PriceCandle.objects.filter(interval=interval)
+        .values("currency_pair_id")
+        .annotate(latest=Max("bucket_start"))
+        .values_list("currency_pair_id", "latest")
+    )
+
+
+def source_for_resolution(resolution):
+    """Pick the coarsest stored series whose bucket size is no larger than ``resolution`` seconds."""
+    best = "raw"
+    for interval, seconds in PriceCandle.INTERVAL_SECONDS.items():
+        if seconds <= resolution:
+            best = interval
+    return best
+
+
+def price_series(pair, resolution=0, limit=500):
+    """
+    Return the latest ``limit`` ``(timestamp, price)`` points for ``pair`` from the
+    smallest series that meets ``resolution`` (candle closes, or raw ticks below 1m).
+    """
+    source = source_for_resolution(resolution)
+    if source == "raw":
+        qs = PriceHistory.objects.filter(currency_pair=pair).order_by("-timestamp").values_list("timestamp", "price")
+    else:
+        qs = PriceCandle.objects.filter(currency_pair=pair, interval=source).order_by("-bucket_start").values_list(
+            "bucket_start", "close"
+        )
+    return source, list(reversed(qs[:limit]))
+
+
+# Intervals the candle API accepts, coarsest last. Each is a multiple of a stored rollup.
+CANDLE_INTERVALS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400}
+
+
+def choose_interval(requested, start, end, max_candles):
+    """Return the requested interval, coarsened until ``[start, end)`` fits in ``max_candles`` buckets."""
+    span = (end - start).total_seconds()
+    names = list(CANDLE_INTERVALS)
+    for name in names[names.index(requested):]:
+        if span / CANDLE_INTERVALS[name] <= max_candles:
+            return name
+    return names[-1]
+
+
+def candle_source(interval):
+    """The largest stored rollup that divides the candle ``interval``."""
+    seconds = CANDLE_INTERVALS[interval]
+    return max(
+        (name for name, size in PriceCandle.INTERVAL_SECONDS.items() if seconds % size == 0),
+        key=PriceCandle.INTERVAL_SECONDS.get,
+    )
+
+
+def candles(pair, interval, start, end):
+    """
+    OHLC candles for ``pair`` over ``[start, end)``. Read from the largest stored rollup
+    that divides ``interval`` and merged into ``interval`` buckets; ticks newer than that
+    rollup's last completed bucket are folded in from raw history.
+    Returns a list of ``(bucket_start, open, high, low, close, count)``.
+    """
+    seconds = CANDLE_INTERVALS[interval]
+    source = candle_source(interval)
+    start = bucket_start(start, seconds)
+    watermark = PriceCandle.objects.filter(currency_pair=pair, interval=source).aggregate(m=Max("bucket_start"))["m"]
+
+    rows = []
+    if watermark is not None:
+        rows.extend(
+            PriceCandle.objects.filter(
+                currency_pair=pair, interval=source, bucket_start__gte=start, bucket_start__lt=min(end, watermark)
+            ).order_by("bucket_start").values_list("bucket_start", "open", "high", "low", "close", "count")
+        )
+    tail = PriceHistory.objects.filter(currency_pair=pair, timestamp__gte=max(start, watermark or start), timestamp__lt=end)
+    rows.extend(
+        (ts, price, price, price, price, 1)
+        for ts, price in tail.order_by("timestamp").values_list("timestamp", "price").iterator(chunk_size=CHUNK_SIZE)
+    )
+    return list(build_candles(rows, seconds))
@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Sum
+
+from .models import Currency, Holding, Profile, Trade
+from .price_cache import price_cache
+
+START_BALANCE = Decimal("10000.00")
+
+
+def run_stress(users=4, threads=8, orders=400, pair="BTC", price=Decimal("50000"), seed=None, prefix="stress"):
+    """
+    Fire ``orders`` random BUY/SELL orders from ``threads`` threads at ``users`` accounts
+    through ``Trade.execute``, then check every account's books against its trade log.
+
+    Returns a report dict: overall and per-user orders/second, rejected orders, and a
+    list of balance/holding mismatches (empty when execution is correct).
+    """
+    currency = Currency.objects.get(base_currency=pair, quote_currency="USD")
+    price_cache.publish(currency, price)
+    accounts = [
+        User.objects.create_user(f"{prefix}-{int(time.time() * 1000)}-{i}") for i in range(users)
+    ]
+    rng = random.Random(seed)
+    plan = [
+        (rng.choice(accounts), rng.choice(("BUY", "BUY", "SELL")), Decimal(rng.randint(50, 2500)))
+        for _ in range(orders)
+    ]
+    results = {"filled": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    def submit(order):
+        user, side, usd = order
+        try:
+            Trade.execute(user, currency, side, usd, price=price)
+            outcome = "filled"
+        except ValueError:
+            outcome = "rejected"
+        finally:
+            connections.close_all()
+        with lock:
+            results[outcome] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(submit, plan))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "users": users,
+        "threads": threads,
+        "orders": orders,
+        "filled": results["filled"],
+        "rejected": results["rejected"],
+        "seconds": round(elapsed, 3),
+        "orders_per_second": round(orders / elapsed, 1),
+        "orders_per_second_per_user": round(orders / elapsed / users, 1),
+        "mismatches": verify_books(accounts, currency),
+        "usernames": [u.username for u in accounts],
+    }
+
+
+def verify_books(accounts, currency):
+    """Compare each account's balance and holding with what its trade log implies."""
+    mismatches = []
+    for user in accounts:
+        totals = {
+            side: Trade.objects.filter(user=user, side=side).aggregate(usd=Sum("usd_value"), qty=Sum("amount"))
+            for side in ("BUY", "SELL")
+        }
+        bought_usd = totals["BUY"]["usd"] or 0
+        sold_usd = totals["SELL"]["usd"] or 0
+        expected_balance = START_BALANCE - bought_usd + sold_usd
+        expected_amount = (totals["BUY"]["qty"] or 0) - (totals["SELL"]["qty"] or 0)
+        balance = Profile.objects.get(user=user).balance
+        amount = Holding.objects.filter(user=user, currency_pair=currency).values_list("amount", flat=True).first() or 0
+        if balance != expected_balance or amount != expected_amount or balance < 0 or amount < 0:
+            mismatches.append({
+                "user": user.username,
+                "balance": str(balance),
+                "expected_balance": str(expected_balance),
+                "amount": str(amount),
+                "expected_amount": str(expected_amount),
+            })
+    return mismatches
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Currency
+
+# Saves that only touch these fields (price ingestion) don't change the universe.
+_PRICE_FIELDS = frozenset({"current_price", "price_updated_at"})
+
+
+class SymbolIndex:
+    """
+    In-memory ``{symbol: provider_id}`` map of the tracked USD pairs.
+
+    Loaded once and reused until a ``Currency`` is added, removed or re-mapped in this
+    process. ``PRICE_SYMBOL_INDEX_TTL`` bounds how long another process's change
+    (e.g. an admin edit seen by the ingester) can go unnoticed.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._map = None
+        self._loaded_at = 0.0
+
+    def get(self):
+        ttl = getattr(settings, "PRICE_SYMBOL_INDEX_TTL", 60)
+        current = self._map
+        if current is not None and self._clock() - self._loaded_at < ttl:
+            return current
+        with self._lock:
+            # Reload unless another thread already did; invalidate() may also have run
+            # since the check above, leaving None.
+            if self._map is None or self._map is current:
+                self._map = dict(
+                    Currency.objects.filter(quote_currency="USD")
+                    .exclude(provider_id="")
+                    .order_by("base_currency")
+                    .values_list("base_currency", "provider_id")
+                )
+                self._loaded_at = self._clock()
+            return self._map
+
+    def invalidate(self):
+        with self._lock:
+            self._map = None
+
+
+symbol_index = SymbolIndex()
+
+
+def chunk_ids(ids, max_ids=None, max_length=None):
+    """
+    Split provider ids into comma-joined batches that stay under the provider's
+    per-request id limit and the length budget for the ``ids`` query parameter.
+    """
+    max_ids = max_ids or getattr(settings, "PRICE_PROVIDER_MAX_IDS", 250)
+    max_length = max_length or getattr(settings, "PRICE_PROVIDER_MAX_IDS_LENGTH", 1800)
+    batches, batch, length = [], [], 0
+    for provider_id in ids:
+        extra = len(provider_id) + (1 if batch else 0)
+        if batch and (len(batch) >= max_ids or length + extra > max_length):
+            batches.append(batch)
+            batch, length, extra = [], 0, len(provider_id)
+        batch.append(provider_id)
+        length += extra
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+@receiver(post_save, sender=Currency)
+def _invalidate_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= _PRICE_FIELDS:
+        return
+    symbol_index.invalidate()
+
+
+@receiver(post_delete, sender=Currency)
+def _invalidate_on_delete(sender, instance, **kwargs):
+    symbol_index.invalidate()
@@ -1,29 +1,74 @@
-import requests
 from decimal import Decimal
+from django.db import transaction
 from django.utils.timezone import now
-from .models import Currency, PriceHistory
+from .caching import prices
+from .feeds import shared_feed
+from .models import Currency, PortfolioValuation, PriceHistory
+from .price_cache import price_cache
+from .symbols import symbol_index
 
-COINGECKO_URL = "https://api.coingecko.com/api/v3/simple/price"
 
+def store_prices(data, id_map=None):
+    """Store a CoinGecko-shaped payload (``{provider_id: {"usd": price}}``) with ``store_quotes()``."""
+    id_map = symbol_index.get() if id_map is None else id_map
+    quotes = {
+        symbol: Decimal(str(data[coingecko_id]["usd"]))
+        for symbol, coingecko_id in id_map.items()
+        if coingecko_id in data
+    }
+    return store_quotes(quotes, id_map=id_map)
+
+
+def store_quotes(quotes, id_map=None):
+    """
+    Persist ``{symbol: price}`` quotes for the pairs in ``id_map`` (``{symbol:
+    provider_id}``, defaulting to the tracked universe) to ``Currency``/``PriceHistory``
+    and publish them to the quote cache.
+
+    Uses a constant number of queries however many symbols are tracked: one select of the
+    existing pairs, one bulk insert of new pairs, one bulk update of current prices, one
+    bulk insert of history rows and one UPDATE revaluing affected portfolios, all in a
+    single transaction.
+    """
+    id_map = symbol_index.get() if id_map is None else id_map
+    quotes = {symbol: price for symbol, price in quotes.items() if symbol in id_map}
+    if not quotes:
+        return []
+
+    stamp = now()
+    with transaction.atomic():
+        pairs = {
+            pair.base_currency: pair
+            for pair in Currency.objects.filter(quote_currency="USD", base_currency__in=quotes)
+        }
+        for pair in pairs.values():
+            pair.current_price = quotes[pair.base_currency]
+            pair.price_updated_at = stamp
+        missing = [
+            Currency(
+                base_currency=symbol, quote_currency="USD", provider_id=id_map[symbol],
+                current_price=price, price_updated_at=stamp,
+            )
+            for symbol, price in quotes.items()
+            if symbol not in pairs
+        ]
+        if pairs:
+            Currency.objects.bulk_update(pairs.values(), ["current_price", "price_updated_at"])
+        if missing:
+            for pair in Currency.objects.bulk_create(missing):
+                pairs[pair.base_currency] = pair
+        PriceHistory.objects.bulk_create(
+            [PriceHistory(currency_pair=pair, price=pair.current_price, timestamp=stamp) for pair in pairs.values()]
+        )
+        PortfolioValuation.revalue(currency_ids=[pair.pk for pair in pairs.values()])
+
+    # bulk_update sends no signals: retire every cached price-derived entry explicitly.
+    prices.bump_after_commit()
+    for pair in pairs.values():
+        price_cache.publish(pair, pair.current_price)
+    return list(pairs.values())
 
-ID_MAP = {
-    "BTC": "bitcoin",
-    "ETH": "ethereum",
-    "SOL": "solana",
-}
 
 def fetch_and_update_prices():
-    ids = ",".join(ID_MAP.values())
-    params = {"ids": ids, "vs_currencies": "usd"}
-    r = requests.get(COINGECKO_URL, params=params, timeout=20)
-    r.raise_for_status()
-    data = r.json()
-
-    for symbol, coingecko_id in ID_MAP.items():
-        if coingecko_id not in data:
-            continue
-        price = Decimal(str(data[coingecko_id]["usd"]))
-        pair, _ = Currency.objects.get_or_create(base_currency=symbol, quote_currency="USD")
-        pair.current_rate = price
-        pair.save(update_fields=["current_rate"])
-        PriceHistory.objects.create(currency_pair=pair, price=price)
+    id_map = symbol_index.get()
+    return store_quotes(shared_feed.get().fetch(id_map), id_map=id_map)
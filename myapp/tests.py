@@ -1,3 +1,1669 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import csv
+import io
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+import numpy as np
+import requests
+
+from myproject import cache_url
+
+from . import analytics, broadcast, leaderboard
+from .backtest import PRICE_SCALE, Portfolio, run_backtest
+from .benchmarks import summarize
+from .benchmarks.micro import BENCHMARKS, run_micro
+from .broadcast import Broadcaster
+from .caching import Namespace, prices
+from .db_router import ReplicaRouter, read_alias, replica_reads
+from .exports import TRADE_COLUMNS
+from .feeds import CoinCapProvider, FileProvider, PriceFeed, median_quote, shared_feed
+from .ingest import PriceIngester
+from .metrics import registry, request_seconds, trade_seconds
+from .orderbook import MatchingEngine, OrderBook
+from .models import Currency, Holding, Order, PortfolioValuation, PriceCandle, PriceHistory, Profile, Trade
+from .price_cache import PriceCache, price_cache
+from .provider import CLIENTS, CircuitBreaker, CircuitOpenError, ProviderClient, provider
+from .rollups import prune, rollup_all, source_for_resolution
+from .stress import run_stress
+from .symbols import SymbolIndex, chunk_ids, symbol_index
+from .tasks import store_prices, store_quotes
+
+
+class StubProvider:
+    """Local HTTP server that answers CoinGecko-style ``simple/price`` requests."""
+
+    def __init__(self, prices=None):
+        self.prices = prices or {"bitcoin": 60000, "ethereum": 3000, "solana": 150}
+        self.symbols = {"bitcoin": "BTC", "ethereum": "ETH", "solana": "SOL"}
+        self.statuses = []
+        self.requests = []
+        self.peers = []
+        self.delay = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real provider
+            disable_nagle_algorithm = True  # don't hold the body back for a delayed ACK
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                stub.requests.append(query)
+                stub.peers.append(self.client_address)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header("Retry-After", "7")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                ids = query.get("ids", [""])[0].split(",")
+                if urlparse(self.path).path.startswith("/v2/assets"):  # CoinCap
+                    body = json.dumps({"data": [
+                        {"id": i, "symbol": stub.symbols.get(i, i.upper()), "priceUsd": str(stub.prices[i])}
+                        for i in ids if i in stub.prices
+                    ]}).encode()
+                else:
+                    body = json.dumps({i: {"usd": stub.prices[i]} for i in ids if i in stub.prices}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/simple/price"
+        self.coincap_url = f"http://127.0.0.1:{self.server.server_address[1]}/v2/assets"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCurrency:
+    base_currency = "BTC"
+    quote_currency = "USD"
+    current_price = Decimal("0")
+
+    def __init__(self, price="100", delay=0):
+        self.price = Decimal(price)
+        self.delay = delay
+        self.calls = 0
+
+    def load_price(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.price
+
+    async def aload_price(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.price
+
+
+class PriceCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = PriceCache(ttl=10, max_staleness=60, clock=self.clock)
+
+    def test_fresh_quote_is_served_without_refresh(self):
+        currency = FakeCurrency()
+        self.assertEqual(self.cache.get(currency), Decimal("100"))
+        self.clock.now = 5
+        self.assertEqual(self.cache.get(currency), Decimal("100"))
+        self.assertEqual(currency.calls, 1)
+
+    def test_published_quote_keeps_its_age(self):
+        currency = FakeCurrency(price="200")
+        self.cache.publish(currency, Decimal("100"), updated_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(self.cache.get(currency), Decimal("200"))  # past max_staleness: refetched
+        self.assertEqual(currency.calls, 1)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        currency = FakeCurrency(delay=0.1)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get(currency))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(currency.calls, 1)
+        self.assertEqual(results, [Decimal("100")] * 8)
+
+    def test_expired_quote_is_served_stale_while_refreshing(self):
+        currency = FakeCurrency()
+        self.cache.get(currency)
+        currency.price = Decimal("200")
+        self.clock.now = 20
+        self.assertEqual(self.cache.get(currency), Decimal("100"))
+        for _ in range(50):
+            if self.cache.get(currency) == Decimal("200"):
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.get(currency), Decimal("200"))
+        self.assertEqual(currency.calls, 2)
+
+    def test_quote_past_staleness_bound_blocks_on_refresh(self):
+        currency = FakeCurrency()
+        self.cache.get(currency)
+        currency.price = Decimal("300")
+        self.clock.now = 61
+        self.assertEqual(self.cache.get(currency), Decimal("300"))
+
+
+class TradeExecuteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="pw")
+        self.btc = Currency.objects.get(base_currency="BTC")
+        price_cache.clear()
+        price_cache.publish(self.btc, Decimal("50000"))
+
+    def tearDown(self):
+        price_cache.clear()
+
+    def test_execute_reads_cached_quote(self):
+        with mock.patch.object(Currency, "load_price") as load_price:
+            trade = Trade.execute(self.user, self.btc, "BUY", Decimal("100"))
+        load_price.assert_not_called()
+        self.assertEqual(trade.price, Decimal("50000"))
+        self.assertEqual(Holding.objects.get(user=self.user).amount, Decimal("0.002"))
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.balance, Decimal("9900.00"))
+
+    def test_rejected_orders_leave_balances_untouched(self):
+        with self.assertRaisesMessage(ValueError, "Insufficient balance"):
+            Trade.execute(self.user, self.btc, "BUY", Decimal("10000.01"))
+        Trade.execute(self.user, self.btc, "BUY", Decimal("100"))
+        with self.assertRaisesMessage(ValueError, "Insufficient holdings"):
+            Trade.execute(self.user, self.btc, "SELL", Decimal("100.01"))
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.balance, Decimal("9900.00"))
+        self.assertEqual(Holding.objects.get(user=self.user).amount, Decimal("0.002"))
+        self.assertEqual(Trade.objects.count(), 1)
+
+
+@override_settings(PRICE_PROVIDER_RATE_LIMIT=0)
+class PriceIngesterTests(TestCase):
+    def setUp(self):
+        price_cache.clear()
+
+    def tearDown(self):
+        price_cache.clear()
+
+    def test_tick_publishes_to_db_and_cache(self):
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            self.assertTrue(PriceIngester(sleep=lambda s: None).run_once())
+        btc = Currency.objects.get(base_currency="BTC")
+        self.assertEqual(btc.current_price, Decimal("60000"))
+        self.assertIsNotNone(btc.price_updated_at)
+        self.assertEqual(PriceHistory.objects.count(), 3)
+        with mock.patch.object(Currency, "load_price") as load_price:
+            self.assertEqual(price_cache.get(btc), Decimal("60000"))
+        load_price.assert_not_called()
+
+    def test_backs_off_on_rate_limit(self):
+        delays = []
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            stub.statuses = [429, 503]
+            ingester = PriceIngester(interval=1, jitter=0, sleep=delays.append)
+            ingester.run(iterations=3)
+        self.assertEqual(delays, [7, 7])
+        self.assertEqual(ingester.failures, 0)
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(Currency.objects.count(), 3)
+
+    def test_survives_non_retryable_failures(self):
+        delays = []
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            stub.statuses = [404]
+            ingester = PriceIngester(interval=1, jitter=0, sleep=delays.append)
+            with self.assertLogs("myapp.ingest", "ERROR"):
+                ingester.run(iterations=2)
+            self.assertEqual((delays, ingester.failures), ([2], 0))
+
+            with mock.patch("myapp.ingest.store_quotes", side_effect=OperationalError("server closed the connection")):
+                with self.assertLogs("myapp.ingest", "ERROR"):
+                    self.assertFalse(ingester.run_once())
+            self.assertEqual(ingester.failures, 1)
+            self.assertTrue(ingester.run_once())
+
+    def test_large_universe_is_fetched_in_batches(self):
+        Currency.objects.bulk_create(
+            [Currency(base_currency=f"C{i}", provider_id=f"coin-{i}") for i in range(25)]
+        )
+        symbol_index.invalidate()
+        prices = {"bitcoin": 60000, **{f"coin-{i}": i + 1 for i in range(25)}}
+        with StubProvider(prices) as stub, override_settings(COINGECKO_URL=stub.url, PRICE_PROVIDER_MAX_IDS=10):
+            PriceIngester(max_in_flight=2).run_once()
+        self.assertEqual(len(stub.requests), 3)  # 28 ids, 10 per request
+        self.assertEqual(Currency.objects.get(base_currency="C24").current_price, Decimal("25"))
+        self.assertEqual(Currency.objects.get(base_currency="BTC").current_price, Decimal("60000"))
+
+    def test_backoff_grows_and_is_capped(self):
+        ingester = PriceIngester(interval=10, jitter=0, max_backoff=60)
+        ingester.failures = 1
+        self.assertEqual(ingester.next_delay(), 20)
+        ingester.failures = 5
+        self.assertEqual(ingester.next_delay(), 60)
+
+
+class StorePricesTests(TestCase):
+    def payload(self, n):
+        id_map = {f"SYM{i}": f"coin-{i}" for i in range(n)}
+        return {coin_id: {"usd": 10 + i} for i, coin_id in enumerate(id_map.values())}, id_map
+
+    def test_query_count_is_independent_of_symbol_count(self):
+        counts = []
+        for n in (3, 60):
+            data, id_map = self.payload(n)
+            store_prices(data, id_map=id_map)  # creates the pairs
+            with CaptureQueriesContext(connection) as ctx:
+                store_prices(data, id_map=id_map)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Currency.objects.get(base_currency="SYM59").current_price, Decimal("69"))
+        self.assertEqual(PriceHistory.objects.filter(currency_pair__base_currency="SYM0").count(), 4)
+
+
+class SymbolIndexTests(TestCase):
+    def setUp(self):
+        symbol_index.invalidate()
+
+    def test_index_maps_symbols_to_provider_ids(self):
+        self.assertEqual(symbol_index.get(), {"BTC": "bitcoin", "ETH": "ethereum", "SOL": "solana"})
+
+    def test_index_is_cached_and_invalidated_on_change(self):
+        symbol_index.get()
+        with self.assertNumQueries(0):
+            symbol_index.get()
+        btc = Currency.objects.get(base_currency="BTC")
+        btc.current_price = Decimal("1")
+        btc.save(update_fields=["current_price"])
+        with self.assertNumQueries(0):
+            symbol_index.get()
+        Currency.objects.create(base_currency="DOGE", provider_id="dogecoin")
+        self.assertEqual(symbol_index.get()["DOGE"], "dogecoin")
+
+    def test_invalidation_racing_a_stale_reload_still_reloads(self):
+        clock = FakeClock()
+        index = SymbolIndex(clock=clock)
+        index.get()
+
+        class InvalidateFirst:
+            """Lock that lets another thread's invalidate() win the race to it once."""
+            def __init__(self):
+                self.lock, self.armed = threading.Lock(), True
+
+            def __enter__(self):
+                if self.armed:
+                    self.armed = False
+                    index.invalidate()
+                self.lock.acquire()
+
+            def __exit__(self, *exc):
+                self.lock.release()
+
+        index._lock = InvalidateFirst()
+        clock.now = 61  # stale
+        self.assertEqual(index.get(), {"BTC": "bitcoin", "ETH": "ethereum", "SOL": "solana"})
+
+    def test_chunk_ids_respects_count_and_length_limits(self):
+        ids = [f"coin-{i}" for i in range(10)]
+        self.assertEqual([len(b) for b in chunk_ids(ids, max_ids=4, max_length=1000)], [4, 4, 2])
+        for batch in chunk_ids(ids, max_ids=100, max_length=20):
+            self.assertLessEqual(len(",".join(batch)), 20)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.btc = Currency.objects.get(base_currency="BTC")
+        self.t0 = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+    def tick(self, seconds, price):
+        PriceHistory.objects.create(currency_pair=self.btc, price=Decimal(price), timestamp=self.t0 + timedelta(seconds=seconds))
+
+    def test_rollup_builds_ohlc_buckets_incrementally(self):
+        for seconds, price in [(0, "10"), (20, "14"), (40, "9"), (70, "11")]:
+            self.tick(seconds, price)
+        rollup_all()
+        first = PriceCandle.objects.get(interval="1m", bucket_start=self.t0)
+        self.assertEqual((first.open, first.high, first.low, first.close, first.count), (10, 14, 9, 9, 3))
+
+        self.tick(90, "20")
+        rollup_all()
+        second = PriceCandle.objects.get(interval="1m", bucket_start=self.t0 + timedelta(minutes=1))
+        self.assertEqual((second.open, second.high, second.close, second.count), (11, 20, 20, 2))
+        hour = PriceCandle.objects.get(interval="1h")
+        self.assertEqual((hour.open, hour.high, hour.low, hour.close, hour.count), (10, 20, 9, 20, 5))
+        self.assertEqual(PriceCandle.objects.filter(interval="1d").count(), 1)
+
+    def test_prune_keeps_ticks_that_are_not_rolled_up(self):
+        self.tick(0, "10")
+        self.tick(120, "12")
+        now = self.t0 + timedelta(days=30)
+        self.assertEqual(prune(now=now), (0, 0))
+        rollup_all()
+        raw, _ = prune(now=now)
+        self.assertEqual(raw, 1)
+        self.assertEqual(PriceHistory.objects.get().price, Decimal("12"))
+
+    def test_prune_waits_for_each_pairs_own_rollup(self):
+        self.tick(0, "10")
+        self.tick(120, "12")
+        rollup_all()
+        eth = Currency.objects.get(base_currency="ETH")
+        PriceHistory.objects.create(currency_pair=eth, price=Decimal("3"), timestamp=self.t0)
+        prune(now=self.t0 + timedelta(days=30))
+        self.assertTrue(PriceHistory.objects.filter(currency_pair=eth).exists())
+
+    def test_history_reads_smallest_sufficient_rollup(self):
+        self.assertEqual(source_for_resolution(0), "raw")
+        self.assertEqual(source_for_resolution(300), "1m")
+        self.assertEqual(source_for_resolution(86400 * 7), "1d")
+        for seconds in range(0, 600, 30):
+            self.tick(seconds, str(100 + seconds))
+        rollup_all()
+        data = self.client.get("/api/price-history/btc/", {"resolution": 60}).json()
+        self.assertEqual(data["source"], "1m")
+        self.assertEqual(len(data["prices"]), 10)
+        raw = self.client.get("/api/price-history/btc/").json()
+        self.assertEqual(raw["prices"][-1], "670.00000000")
+
+
+class CandlesApiTests(TestCase):
+    def setUp(self):
+        self.btc = Currency.objects.get(base_currency="BTC")
+        self.t0 = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        PriceHistory.objects.bulk_create(
+            PriceHistory(currency_pair=self.btc, price=Decimal(100 + i), timestamp=self.t0 + timedelta(minutes=i))
+            for i in range(180)
+        )
+
+    def get(self, **params):
+        response = self.client.get("/api/candles/btc/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_candles_merge_rollups_with_unrolled_tail(self):
+        PriceHistory.objects.filter(timestamp__gte=self.t0 + timedelta(minutes=150)).delete()
+        rollup_all()
+        PriceHistory.objects.bulk_create(
+            PriceHistory(currency_pair=self.btc, price=Decimal(100 + i), timestamp=self.t0 + timedelta(minutes=i))
+            for i in range(150, 180)
+        )
+        start, end = int(self.t0.timestamp()), int((self.t0 + timedelta(hours=3)).timestamp())
+        data = self.get(interval="1h", start=start, end=end)
+        self.assertEqual(data["interval"], "1h")
+        self.assertEqual(data["t"], [start, start + 3600, start + 7200])
+        self.assertEqual(data["o"], [100, 160, 220])
+        self.assertEqual(data["c"], [159, 219, 279])
+        self.assertEqual(data["n"], [60, 60, 60])
+
+        five = self.get(interval="5m", start=start, end=end)
+        self.assertEqual(len(five["t"]), 36)
+        self.assertEqual((five["o"][0], five["h"][0], five["l"][0], five["c"][0]), (100, 104, 100, 104))
+
+    def test_wide_ranges_are_coarsened_to_bound_the_payload(self):
+        data = self.get(interval="1m", start="2024-01-01T00:00:00Z", end="2025-01-02T00:00:00Z")
+        self.assertEqual(data["interval"], "1d")
+        self.assertLessEqual(len(data["t"]), 1000)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get("/api/candles/btc/", {"interval": "7m"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/candles/btc/", {"start": "yesterday"}).status_code, 400)
+
+    def test_out_of_range_unix_times_are_rejected(self):
+        self.client.force_login(User.objects.create_user("olga", password="pw"))
+        for url, value in [("/api/candles/btc/", "1e20"), ("/api/trades/", "inf"), ("/export/trades/", "1e30")]:
+            with self.subTest(url=url, start=value):
+                self.assertEqual(self.client.get(url, {"start": value}).status_code, 400)
+
+
+class ConditionalHistoryTests(TestCase):
+    def setUp(self):
+        self.btc = Currency.objects.get(base_currency="BTC")
+        PriceHistory.objects.create(currency_pair=self.btc, price=Decimal("100"))
+
+    def test_unchanged_history_answers_304_until_a_new_tick(self):
+        end = timezone.now() + timedelta(minutes=1)
+        window = {"start": (end - timedelta(hours=6)).isoformat(), "end": end.isoformat()}
+        # Candles also look up the newest candle of the rollup they read.
+        for url, params, queries in (("/api/price-history/btc/", {}, 1), ("/api/candles/btc/", window, 2)):
+            first = self.client.get(url, params)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn("public", first["Cache-Control"])
+            self.assertIn("ETag", first)
+
+            with self.assertNumQueries(queries):
+                cached = self.client.get(url, params, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(cached.status_code, 304)
+            self.assertIn("max-age=15", cached["Cache-Control"])
+
+            other = self.client.get(url, {**params, "interval": "1m"}, HTTP_IF_NONE_MATCH=first["ETag"])
+            self.assertEqual(other.status_code, 200)
+
+        etag = self.client.get("/api/price-history/btc/")["ETag"]
+        PriceHistory.objects.create(currency_pair=self.btc, price=Decimal("101"))
+        self.assertEqual(self.client.get("/api/price-history/btc/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_a_rollup_run_invalidates_rollup_backed_responses(self):
+        end = timezone.now() + timedelta(minutes=1)
+        window = {"start": (end - timedelta(hours=6)).isoformat(), "end": end.isoformat()}
+        requests = (("/api/price-history/btc/", {"resolution": "60"}), ("/api/candles/btc/", window))
+        etags = [self.client.get(url, params)["ETag"] for url, params in requests]
+        rollup_all()  # no new tick, but the candles now exist
+        for (url, params), etag in zip(requests, etags):
+            self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sliding_candle_window_has_no_validators(self):
+        response = self.client.get("/api/candles/btc/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+
+class BroadcasterTests(TestCase):
+    async def test_one_poll_fans_out_to_every_subscriber(self):
+        btc = await Currency.objects.aget(base_currency="BTC")
+        hub = Broadcaster(poll_interval=0.01)
+        with mock.patch.object(broadcast, "ticks_since", wraps=broadcast.ticks_since) as poll:
+            everyone = [await hub.subscribe() for _ in range(20)]
+            eth_only = await hub.subscribe(["ETH"])
+            await PriceHistory.objects.acreate(currency_pair=btc, price=Decimal("123"))
+            batches = [await asyncio.wait_for(q.get(), timeout=2) for q in everyone]
+            polls = poll.call_count
+        self.assertTrue(all(b[0]["symbol"] == "BTC" and b[0]["price"] == "123.00000000" for b in batches))
+        self.assertTrue(eth_only.empty())
+        self.assertLess(polls, len(everyone))  # one query per poll, not per subscriber
+        for q in everyone + [eth_only]:
+            hub.unsubscribe(q)
+        self.assertIsNone(hub._task)
+
+    async def test_stream_replays_missed_ticks(self):
+        btc = await Currency.objects.aget(base_currency="BTC")
+        first = await PriceHistory.objects.acreate(currency_pair=btc, price=Decimal("1"))
+        await PriceHistory.objects.acreate(currency_pair=btc, price=Decimal("2"))
+        response = await self.async_client.get("/api/stream/prices/", {"symbols": "btc", "since": first.id})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        snapshot = await anext(stream)
+        self.assertIn(b"event: snapshot", snapshot)
+        backlog = await anext(stream)
+        self.assertIn(b"event: tick", backlog)
+        self.assertIn(b'"price": "2.00000000"', backlog)
+        await stream.aclose()
+
+
+class DashboardQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("bob", password="pw")
+        self.client.force_login(self.user)
+        self.pairs = list(Currency.objects.all())
+        for i, pair in enumerate(self.pairs):
+            pair.current_price = Decimal(10 * (i + 1))
+            pair.save(update_fields=["current_price"])
+
+    def add_activity(self, holdings, trades):
+        extra = Currency.objects.bulk_create(
+            [Currency(base_currency=f"X{i}", current_price=Decimal("1")) for i in range(holdings)]
+        )
+        Holding.objects.bulk_create([Holding(user=self.user, currency_pair=p, amount=Decimal("2")) for p in extra])
+        Trade.objects.bulk_create(
+            [Trade(user=self.user, currency_pair=extra[i % len(extra)], side="BUY", amount=1, price=1, usd_value=1)
+             for i in range(trades)]
+        )
+
+    def test_query_count_does_not_grow_with_holdings_or_trades(self):
+        Holding.objects.create(user=self.user, currency_pair=self.pairs[0], amount=Decimal("1.5"))
+        PortfolioValuation.revalue()
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get("/dashboard/")
+        self.assertEqual(response.context["portfolio_value"], Decimal("15"))
+
+        self.add_activity(holdings=25, trades=40)
+        PortfolioValuation.revalue()
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get("/dashboard/")
+        self.assertEqual(response.context["portfolio_value"], Decimal("65"))
+        self.assertEqual(response.context["total_equity"], Decimal("10065"))
+        self.assertContains(response, "X24/USD")
+        self.assertContains(response, 'data-symbol="X24"')
+        self.assertContains(response, "/api/stream/prices/")
+
+    def test_pinned_query_count(self):
+        self.add_activity(holdings=5, trades=12)
+        # user, valuation, holdings, recent trades, form choices (the session is cached)
+        with self.assertNumQueries(5):
+            self.client.get("/dashboard/")
+
+
+class PortfolioValuationTests(TestCase):
+    def setUp(self):
+        self.btc = Currency.objects.get(base_currency="BTC")
+        self.btc.current_price = Decimal("50000")
+        self.btc.save(update_fields=["current_price"])
+        price_cache.clear()
+        price_cache.publish(self.btc, Decimal("50000"))
+        self.users = [User.objects.create_user(f"u{i}") for i in range(3)]
+
+    def tearDown(self):
+        price_cache.clear()
+
+    def test_trade_updates_valuation_in_place(self):
+        Trade.execute(self.users[0], self.btc, "BUY", Decimal("1000"))
+        valuation = PortfolioValuation.objects.get(user=self.users[0])
+        self.assertEqual(valuation.cash, Decimal("9000.00"))
+        self.assertEqual(valuation.holdings_value, Decimal("1000"))
+        self.assertEqual(valuation.equity, Decimal("10000"))
+
+    def test_price_tick_revalues_all_holders_in_one_update(self):
+        for user in self.users[:2]:
+            Trade.execute(user, self.btc, "BUY", Decimal("5000"))
+        with CaptureQueriesContext(connection) as ctx:
+            store_prices({"bitcoin": {"usd": 60000}}, id_map={"BTC": "bitcoin"})
+        updates = [q for q in ctx.captured_queries if 'UPDATE "myapp_portfoliovaluation"' in q["sql"]]
+        self.assertEqual(len(updates), 1)
+        equities = dict(PortfolioValuation.objects.values_list("user__username", "equity"))
+        self.assertEqual(equities, {"u0": Decimal("11000"), "u1": Decimal("11000"), "u2": Decimal("10000")})
+
+    def test_revalue_without_a_profile_keeps_the_starting_cash(self):
+        Profile.objects.filter(user=self.users[2]).delete()
+        PortfolioValuation.revalue(users=[self.users[2]])
+        valuation = PortfolioValuation.objects.get(user=self.users[2])
+        self.assertEqual(valuation.cash, Decimal("10000.00"))
+        self.assertEqual(valuation.equity, Decimal("10000"))
+
+
+class ConcurrentTradeTests(TransactionTestCase):
+    def setUp(self):
+        Currency.objects.get_or_create(base_currency="BTC", defaults={"provider_id": "bitcoin"})
+        price_cache.clear()
+
+    def tearDown(self):
+        price_cache.clear()
+
+    @override_settings(TRADE_MAX_ATTEMPTS=40)  # in-memory SQLite reports lock conflicts without waiting
+    def test_concurrent_orders_keep_books_consistent(self):
+        report = run_stress(users=2, threads=4, orders=60, seed=1)
+        self.assertEqual(report["mismatches"], [])
+        self.assertEqual(report["filled"] + report["rejected"], 60)
+
+    def test_lock_conflicts_are_retried(self):
+        real_apply = Trade._apply
+        calls = []
+
+        def flaky(*args):
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError("database is locked")
+            return real_apply(*args)
+
+        user = User.objects.create_user("carol")
+        btc = Currency.objects.get(base_currency="BTC")
+        with mock.patch.object(Trade, "_apply", side_effect=flaky):
+            Trade.execute(user, btc, "BUY", Decimal("100"), price=Decimal("50000"))
+        self.assertEqual(len(calls), 3)
+
+
+class BatchOrderApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("dave", password="pw")
+        self.client.force_login(self.user)
+        price_cache.clear()
+        for symbol, price in (("BTC", "50000"), ("ETH", "2000")):
+            pair = Currency.objects.get(base_currency=symbol)
+            pair.current_price = Decimal(price)
+            pair.save(update_fields=["current_price"])
+            price_cache.publish(pair, Decimal(price))
+
+    def tearDown(self):
+        price_cache.clear()
+
+    def submit(self, orders, mode="all_or_nothing"):
+        return self.client.post(
+            "/api/orders/batch/", json.dumps({"mode": mode, "orders": orders}), content_type="application/json"
+        )
+
+    def test_batch_executes_in_constant_queries(self):
+        orders = [{"symbol": "btc", "side": "BUY", "usd_amount": "100"} for _ in range(10)]
+        orders += [{"symbol": "ETH", "side": "BUY", "usd_amount": "200"}, {"symbol": "BTC", "side": "SELL", "usd_amount": "500"}]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.submit(orders)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["executed"], 12)
+        self.assertLess(len(ctx.captured_queries), 15)
+        self.assertEqual(Trade.objects.filter(user=self.user).count(), 12)
+        self.assertEqual(Holding.objects.get(user=self.user, currency_pair__base_currency="BTC").amount, Decimal("0.01"))
+        valuation = PortfolioValuation.objects.get(user=self.user)
+        self.assertEqual(valuation.cash, Decimal("9300.00"))
+        self.assertEqual(valuation.equity, Decimal("10000"))
+
+    def test_user_without_profile_gets_one_on_first_batch(self):
+        Profile.objects.filter(user=self.user).delete()
+        response = self.submit([{"symbol": "BTC", "side": "BUY", "usd_amount": "100"}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["executed"], 1)
+        self.assertEqual(Profile.objects.get(user=self.user).balance, Decimal("9900.00"))
+
+    def test_all_or_nothing_rejects_whole_batch(self):
+        response = self.submit([
+            {"symbol": "BTC", "side": "BUY", "usd_amount": "100"},
+            {"symbol": "ETH", "side": "SELL", "usd_amount": "50"},
+        ])
+        self.assertEqual(response.status_code, 409)
+        statuses = [r["status"] for r in response.json()["results"]]
+        self.assertEqual(statuses, ["not_executed", "rejected"])
+        self.assertFalse(Trade.objects.exists())
+
+    def test_best_effort_skips_failing_orders(self):
+        response = self.submit([
+            {"symbol": "BTC", "side": "BUY", "usd_amount": "9000"},
+            {"symbol": "ETH", "side": "BUY", "usd_amount": "2000"},
+            {"symbol": "DOGE", "side": "BUY", "usd_amount": "1"},
+            {"symbol": "BTC", "side": "HOLD", "usd_amount": "1"},
+            {"symbol": "ETH", "side": "BUY", "usd_amount": "1000"},
+        ], mode="best_effort")
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in body["results"]], ["filled", "rejected", "rejected", "rejected", "filled"])
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.balance, Decimal("0.00"))
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.submit([{"symbol": "BTC", "side": "BUY", "usd_amount": "1"}]).status_code, 401)
+
+
+class OrderBookTests(SimpleTestCase):
+    def order(self, pk, side, order_type, trigger):
+        return Order(pk=pk, side=side, order_type=order_type, trigger_price=Decimal(trigger))
+
+    def test_only_crossed_orders_fire(self):
+        book = OrderBook()
+        book.add(self.order(1, "BUY", "LIMIT", "100"))
+        book.add(self.order(2, "BUY", "LIMIT", "90"))
+        book.add(self.order(3, "SELL", "STOP", "95"))
+        book.add(self.order(4, "SELL", "LIMIT", "120"))
+        book.add(self.order(5, "BUY", "STOP", "110"))
+        self.assertEqual([o.pk for o in book.crossing(Decimal("105"))], [])
+        self.assertEqual([o.pk for o in book.crossing(Decimal("95"))], [1, 3])
+        book.remove(2)
+        self.assertEqual([o.pk for o in book.crossing(Decimal("80"))], [])
+        self.assertEqual([o.pk for o in book.crossing(Decimal("125"))], [5, 4])
+        self.assertEqual(len(book), 0)
+
+
+class OrderApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("erin", password="pw")
+        self.client.force_login(self.user)
+        self.btc = Currency.objects.get(base_currency="BTC")
+
+    def place(self, **order):
+        return self.client.post("/api/orders/", json.dumps(order), content_type="application/json")
+
+    def tick(self, engine, price):
+        self.btc.current_price = Decimal(price)
+        self.btc.save(update_fields=["current_price"])
+        engine.sync()
+        return engine.on_prices({self.btc.pk: Decimal(price)})
+
+    def test_resting_orders_fill_when_price_crosses(self):
+        buy = self.place(symbol="btc", side="BUY", type="LIMIT", usd_amount="1000", trigger_price="40000").json()["order"]
+        stop = self.place(symbol="BTC", side="SELL", type="STOP", usd_amount="500", trigger_price="39000").json()["order"]
+        cancelled = self.place(symbol="BTC", side="BUY", type="LIMIT", usd_amount="100", trigger_price="39500").json()["order"]
+
+        engine = MatchingEngine()
+        engine.load()
+        self.assertEqual(self.tick(engine, "41000"), [])
+        self.client.post(f"/api/orders/{cancelled['id']}/cancel/")
+
+        self.assertEqual([o.pk for o in self.tick(engine, "39400")], [buy["id"]])
+        self.assertEqual(Order.objects.get(pk=buy["id"]).trade.price, Decimal("39400"))
+        self.assertEqual(Order.objects.get(pk=cancelled["id"]).status, "CANCELLED")
+
+        # A restarted engine recovers the remaining open order from the database.
+        engine = MatchingEngine()
+        self.assertEqual([o.pk for o in self.tick(engine, "38000")], [stop["id"]])
+        self.assertEqual(Order.objects.get(pk=stop["id"]).status, "FILLED")
+        self.assertEqual(Trade.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.client.get("/api/orders/").json()["orders"], [])
+
+    def test_unaffordable_orders_are_rejected_on_trigger(self):
+        order = self.place(symbol="BTC", side="SELL", type="LIMIT", usd_amount="100", trigger_price="50000").json()["order"]
+        engine = MatchingEngine()
+        self.tick(engine, "51000")
+        rejected = Order.objects.get(pk=order["id"])
+        self.assertEqual(rejected.status, "REJECTED")
+        self.assertIn("Insufficient holdings", rejected.reason)
+
+    def test_a_failing_fill_keeps_the_order_and_fills_the_rest(self):
+        first = self.place(symbol="BTC", side="BUY", type="LIMIT", usd_amount="100", trigger_price="40000").json()["order"]
+        second = self.place(symbol="BTC", side="BUY", type="LIMIT", usd_amount="100", trigger_price="39000").json()["order"]
+        engine = MatchingEngine()
+        engine.load()
+        execute = Trade.execute
+
+        def flaky(user, pair, side, usd_amount, price=None):
+            if not flaky.failed:
+                flaky.failed = True
+                raise OperationalError("deadlock detected")
+            return execute(user, pair, side, usd_amount, price=price)
+        flaky.failed = False
+
+        with mock.patch.object(Trade, "execute", side_effect=flaky), self.assertLogs("myapp.orderbook", "ERROR"):
+            self.assertEqual([o.pk for o in self.tick(engine, "38000")], [second["id"]])
+        self.assertEqual(Order.objects.get(pk=first["id"]).status, "OPEN")
+        self.assertEqual([o.pk for o in self.tick(engine, "38000")], [first["id"]])
+
+    def test_sync_picks_up_orders_committed_out_of_id_order(self):
+        engine = MatchingEngine()
+        engine.load()
+        late = self.place(symbol="BTC", side="BUY", type="LIMIT", usd_amount="100", trigger_price="40000").json()["order"]
+        newer = self.place(symbol="BTC", side="BUY", type="LIMIT", usd_amount="100", trigger_price="40000").json()["order"]
+        # The lower id commits after the previous sync already saw the higher one.
+        Order.objects.filter(pk=late["id"]).update(status="CANCELLED")
+        engine.sync()
+        Order.objects.filter(pk=late["id"]).update(status="OPEN", updated_at=engine.synced_at - timedelta(seconds=5))
+        handled = self.tick(engine, "39000")
+        self.assertEqual(sorted(o.pk for o in handled), sorted([late["id"], newer["id"]]))
+
+    def test_invalid_orders_are_refused(self):
+        self.assertEqual(self.place(symbol="BTC", side="BUY", type="MARKET", usd_amount="1", trigger_price="1").status_code, 400)
+        self.assertEqual(self.place(symbol="BTC", side="BUY", type="LIMIT", usd_amount="-1", trigger_price="1").status_code, 400)
+        self.assertEqual(self.place(symbol="NOPE", side="BUY", type="LIMIT", usd_amount="1", trigger_price="1").status_code, 400)
+
+
+class TradeHistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("fay", password="pw")
+        self.client.force_login(self.user)
+        btc = Currency.objects.get(base_currency="BTC")
+        t0 = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        # Pairs of trades share a timestamp so the id tiebreak matters.
+        Trade.objects.bulk_create(
+            Trade(user=self.user, currency_pair=btc, side="BUY" if i % 3 else "SELL", amount=1, price=1,
+                  usd_value=i, timestamp=t0 + timedelta(hours=i // 2))
+            for i in range(25)
+        )
+
+    def collect(self, **params):
+        seen, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            with self.assertNumQueries(2):  # user, one page (the session is cached)
+                body = self.client.get("/api/trades/", query).json()
+            seen += [t["id"] for t in body["trades"]]
+            pages += 1
+            cursor = body["next_cursor"]
+            if not cursor:
+                return seen, pages
+
+    @override_settings(TRADE_HISTORY_PAGE_SIZE=4)
+    def test_cursor_walks_every_trade_once_newest_first(self):
+        ids, pages = self.collect()
+        expected = list(Trade.objects.filter(user=self.user).order_by("-timestamp", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 7)
+
+    @override_settings(TRADE_HISTORY_PAGE_SIZE=4)
+    def test_filters_apply_across_pages(self):
+        ids, _ = self.collect(side="sell", start="2025-01-01T02:00:00Z", end="2025-01-01T10:00:00Z")
+        expected = Trade.objects.filter(
+            side="SELL", timestamp__gte=datetime(2025, 1, 1, 2, tzinfo=dt_timezone.utc),
+            timestamp__lt=datetime(2025, 1, 1, 10, tzinfo=dt_timezone.utc),
+        ).order_by("-timestamp", "-id")
+        self.assertEqual(ids, list(expected.values_list("id", flat=True)))
+
+    def test_html_page_links_to_older_trades(self):
+        with override_settings(TRADE_HISTORY_PAGE_SIZE=10):
+            response = self.client.get("/history/", {"side": "BUY", "start": "2025-01-01", "end": "2025-01-02"})
+        self.assertEqual(len(response.context["trades"]), 10)
+        self.assertContains(response, "Older trades")
+        self.assertEqual(self.client.get("/history/", {"cursor": "garbage"}).status_code, 400)
+
+    def test_date_only_end_includes_that_day(self):
+        ids, _ = self.collect(start="2025-01-01", end="2025-01-01")
+        self.assertEqual(len(ids), 25)  # every trade is on 2025-01-01
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("gus", password="pw")
+        other = User.objects.create_user("hal", password="pw")
+        self.btc = Currency.objects.get(base_currency="BTC")
+        Trade.objects.bulk_create(
+            Trade(user=user, currency_pair=self.btc, side="BUY", amount=Decimal("0.5"), price=100, usd_value=50)
+            for user in (self.user, self.user, other)
+        )
+        t0 = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        PriceHistory.objects.bulk_create(
+            PriceHistory(currency_pair=self.btc, price=100 + i, timestamp=t0 + timedelta(minutes=i)) for i in range(5)
+        )
+
+    def body(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_trades_csv_streams_only_own_trades(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/export/trades/")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="trades.csv"', response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(self.body(response))))
+        self.assertEqual(rows[0], list(TRADE_COLUMNS))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row[2] for row in rows[1:]}, {"gus"})
+        self.assertEqual(rows[1][5], "0.50000000")
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_price_history_ndjson_with_range(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            "/export/price-history/btc/", {"format": "ndjson", "start": "2025-01-01T00:01:00Z", "end": "2025-01-01T00:04:00Z"}
+        )
+        lines = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual([row["price"] for row in lines], ["101.00000000", "102.00000000", "103.00000000"])
+        self.assertEqual(lines[0]["symbol"], "BTC")
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_asgi_exports_stream_asynchronously(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get("/export/price-history/btc/")
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)  # header + 5 rows, two lines per chunk
+        self.assertEqual(b"".join(chunks).decode().splitlines()[1].split(",")[3], "100.00000000")
+
+    def test_bad_format_and_unknown_symbol(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/export/trades/", {"format": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get("/export/price-history/NOPE/").status_code, 404)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prices.ndjson")
+            call_command("export_data", "prices", "--symbol", "BTC", "--format", "ndjson", "--output", path, stdout=io.StringIO())
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 5)
+
+
+class AnalyticsMathTests(SimpleTestCase):
+    sign = np.array([1.0, 1.0, -1.0])
+    amount = np.array([1.0, 1.0, 1.0])
+    usd = np.array([100.0, 200.0, 300.0])
+
+    def test_fifo_sells_oldest_lots_first(self):
+        self.assertEqual(analytics.fifo_pnl(self.sign, self.amount, self.usd), (1.0, 200.0, 200.0))
+
+    def test_average_cost(self):
+        position, basis, realized = analytics.average_cost_pnl(self.sign, self.amount, self.usd)
+        self.assertEqual((position, basis, realized), (1.0, 150.0, 150.0))
+
+    def test_average_cost_matches_sequential_reference(self):
+        rng = np.random.default_rng(1)
+        sign, amount, usd = [], [], []
+        position = 0.0
+        for _ in range(500):
+            buy = position < 1e-9 or rng.random() < 0.5
+            units = rng.uniform(0.1, 2.0) if buy else position * rng.choice([rng.uniform(0.1, 0.9), 1.0])
+            position += units if buy else -units
+            sign.append(1.0 if buy else -1.0)
+            amount.append(units)
+            usd.append(units * rng.uniform(50, 150))
+        position = cost = realized = 0.0
+        for s, a, u in zip(sign, amount, usd):
+            if s > 0:
+                position, cost = position + a, cost + u
+            else:
+                released = cost * a / position
+                position, cost, realized = position - a, cost - released, realized + u - released
+        got = analytics.average_cost_pnl(np.array(sign), np.array(amount), np.array(usd))
+        np.testing.assert_allclose(got, (position, cost, realized), rtol=1e-9, atol=1e-6)
+
+    def test_drawdown_and_rolling_volatility(self):
+        np.testing.assert_allclose(analytics.drawdown(np.array([100.0, 120.0, 90.0, 130.0])), [0, 0, -0.25, 0])
+        returns = np.random.default_rng(2).normal(0, 0.01, 300)
+        expected = np.lib.stride_tricks.sliding_window_view(returns, 20).std(axis=1, ddof=1)
+        np.testing.assert_allclose(analytics.rolling_volatility(returns, 20), expected, rtol=1e-8)
+
+    def test_equity_curve_marks_positions_to_latest_tick(self):
+        trades = {
+            "ts": np.array([10.0]), "pair": np.array([1]), "sign": np.array([1.0]),
+            "amount": np.array([2.0]), "usd": np.array([200.0]), "price": np.array([100.0]),
+        }
+        prices = {"ts": np.array([5.0, 20.0]), "pair": np.array([1, 1]), "price": np.array([90.0, 150.0])}
+        equity = analytics.equity_curve(np.array([0.0, 10.0, 15.0, 20.0]), trades, prices, 1000.0)
+        np.testing.assert_allclose(equity, [1000.0, 1000.0, 1000.0, 1100.0])
+
+
+class AnalyticsApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("ivy", password="pw")
+        self.client.force_login(self.user)
+        self.btc = Currency.objects.get(base_currency="BTC")
+        self.btc.current_price = Decimal("400")
+        self.btc.save(update_fields=["current_price"])
+        for side, usd, price in (("BUY", "100", "100"), ("BUY", "200", "200"), ("SELL", "300", "300")):
+            Trade.execute(self.user, self.btc, side, Decimal(usd), price=Decimal(price))
+
+    def test_report(self):
+        with self.assertNumQueries(6):  # user + five report queries (the session is cached)
+            body = self.client.get("/api/analytics/", {"method": "average"}).json()
+        self.assertEqual(body["realized"], 150.0)
+        self.assertEqual(body["unrealized"], 250.0)
+        self.assertEqual(body["positions"][0]["symbol"], "BTC")
+        self.assertEqual(body["equity"]["v"][0], 10000.0)
+        self.assertEqual(body["max_drawdown"], 0.0)
+        fifo = self.client.get("/api/analytics/").json()
+        self.assertEqual((fifo["realized"], fifo["unrealized"]), (200.0, 200.0))
+
+    def test_rejects_unknown_method(self):
+        self.assertEqual(self.client.get("/api/analytics/", {"method": "lifo"}).status_code, 400)
+
+    def test_hourly_prices_come_from_rollups_past_the_raw_retention(self):
+        t0 = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        PriceHistory.objects.bulk_create(
+            PriceHistory(currency_pair=self.btc, price=100 + i, timestamp=t0 + timedelta(minutes=10 * i))
+            for i in range(21)  # 00:00 .. 03:20
+        )
+        rollup_all()
+        PriceHistory.objects.filter(timestamp__lt=t0 + timedelta(hours=3)).delete()  # pruned
+
+        with self.assertNumQueries(2):
+            prices = analytics.load_prices([self.btc.pk], start=t0, resolution=3600)
+        hours = [(t - t0.timestamp()) / 3600 for t in prices["ts"]]
+        # Closes of the complete hours at each hour's end, then the newest hour's raw ticks.
+        self.assertEqual(hours, [1, 2, 3, 3, 3 + 1 / 6, 3 + 2 / 6])
+        self.assertEqual(prices["price"].tolist(), [105, 111, 117, 118, 119, 120])
+
+    def test_pair_report(self):
+        t0 = timezone.now() - timedelta(hours=1)
+        PriceHistory.objects.bulk_create(
+            PriceHistory(currency_pair=self.btc, price=p, timestamp=t0 + timedelta(minutes=i))
+            for i, p in enumerate([100, 110, 99, 120])
+        )
+        body = self.client.get("/api/analytics/btc/", {"window": 2}).json()
+        self.assertEqual((body["ticks"], body["return"], body["max_drawdown"]), (4, 0.2, -0.1))
+        self.assertIsNotNone(body["volatility"])
+
+
+class BacktestTests(TestCase):
+    def setUp(self):
+        self.btc = Currency.objects.get(base_currency="BTC")
+        self.eth = Currency.objects.get(base_currency="ETH")
+        t0 = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        prices = [100, 100, 100, 120, 140, 160, 150, 120, 90, 80, 100, 130]
+        PriceHistory.objects.bulk_create(
+            PriceHistory(currency_pair=pair, price=p * scale, timestamp=t0 + timedelta(minutes=i))
+            for i, p in enumerate(prices)
+            for pair, scale in ((self.btc, 1), (self.eth, 2))
+        )
+
+    def test_buy_and_hold_matches_trade_rounding(self):
+        result = run_backtest("buy_and_hold", {"usd": "1000"}, symbols=["BTC"], chunk_size=5)
+        self.assertEqual((result["ticks"], result["fills"], result["rejected"]), (12, 1, 0))
+        units = Trade.units_for(Decimal("1000"), Decimal("100"))
+        self.assertEqual(result["final_equity"], float(Decimal("9000") + units * 130))
+        self.assertEqual(result["max_drawdown"], round(float((9000 + 10 * 80) / Decimal(9000 + 10 * 160) - 1), 6))
+        self.assertFalse(Trade.objects.exists())
+
+    def test_chunk_size_does_not_change_results(self):
+        runs = [
+            run_backtest("ma_cross", {"fast": 2, "slow": 4, "usd": 500}, chunk_size=size)
+            for size in (3, 7, 1000)
+        ]
+        for run in runs:
+            run.pop("seconds"), run.pop("ticks_per_second")
+        self.assertEqual(runs[0], runs[1])
+        self.assertEqual(runs[0], runs[2])
+        self.assertGreater(runs[0]["fills"], 0)
+
+    def test_portfolio_rejects_like_trade_execute(self):
+        portfolio = Portfolio("10.00", 1)
+        price = 100 * PRICE_SCALE
+        self.assertFalse(portfolio.execute(0, 0, "BUY", 1001, price))  # more than the balance
+        self.assertFalse(portfolio.execute(0, 0, "SELL", 100, price))  # nothing to sell
+        self.assertTrue(portfolio.execute(0, 0, "BUY", 1000, price))
+        self.assertEqual((portfolio.cash, int(portfolio.units[0])), (0, 10_000_000))
+        self.assertTrue(portfolio.execute(1, 0, "SELL", None, 2 * price))
+        self.assertEqual((portfolio.cash, int(portfolio.units[0]), portfolio.rejected), (2000, 0, 2))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("backtest", "buy_and_hold", "ma_cross:fast=2,slow=4", "--symbols", "BTC,ETH", "--json", "--workers", "1", stdout=out)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r["strategy"] for r in results], ["buy_and_hold", "ma_cross"])
+        self.assertEqual(results[0]["symbols"], ["BTC", "ETH"])
+        self.assertEqual(results[0]["ticks"], 24)
+
+
+class ProviderClientTests(TestCase):
+    def setUp(self):
+        provider.reset()
+        self.clock = FakeClock()
+
+    def make_client(self, **kwargs):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=30, clock=self.clock)
+        return ProviderClient(breaker=breaker, retries=0, **kwargs)
+
+    def test_reuses_one_keep_alive_connection(self):
+        client = self.make_client()
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            for _ in range(3):
+                self.assertEqual(client.get_prices(["bitcoin"]), {"bitcoin": {"usd": 60000}})
+        self.assertEqual(len(set(stub.peers)), 1)
+        self.assertEqual(client.metrics.snapshot()["latency_seconds"]["count"], 3)
+
+    def test_cancelled_half_open_trial_lets_the_next_call_through(self):
+        client = self.make_client()
+        for _ in range(2):
+            client.breaker.record_failure()
+        self.clock.now = 31
+
+        async def cancel_trial(stub):
+            call = asyncio.ensure_future(client.aget_prices(["bitcoin"]))
+            while not stub.requests:
+                await asyncio.sleep(0.01)
+            call.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await call
+
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            stub.delay = 0.5
+            asyncio.run(cancel_trial(stub))
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(client.breaker.allow())
+
+    def test_read_timeout(self):
+        client = self.make_client(read_timeout=0.1)
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            stub.delay = 0.5
+            with self.assertRaises(requests.Timeout):
+                client.get_prices(["bitcoin"])
+        self.assertEqual(client.metrics.snapshot()["failures"], {"ReadTimeout": 1})
+
+    def test_breaker_opens_then_recovers(self):
+        client = self.make_client()
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            self.assertEqual(client.get_prices(["bitcoin"]), {"bitcoin": {"usd": 60000}})
+            stub.statuses = [503, 503]
+            stub.prices["bitcoin"] = 61000
+            for _ in range(2):
+                with self.assertRaises(requests.HTTPError):
+                    client.get_prices(["bitcoin"])
+            self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+            with self.assertRaises(CircuitOpenError):
+                client.get_prices(["bitcoin"])
+            self.assertEqual(len(stub.requests), 3)  # the open circuit sent nothing
+
+            self.clock.now = 31
+            self.assertEqual(client.get_prices(["bitcoin"]), {"bitcoin": {"usd": 61000}})
+            self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+        status = client.status()
+        self.assertEqual((status["short_circuited"], status["failures"]), (1, {"http_503": 2}))
+
+    def test_client_errors_do_not_trip_the_breaker(self):
+        client = self.make_client()
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            stub.statuses = [404, 404, 404]
+            for _ in range(3):
+                with self.assertRaises(requests.HTTPError):
+                    client.get_prices(["bitcoin"])
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_update_price_does_not_record_stale_quotes(self):
+        btc = Currency.objects.get(base_currency="BTC")
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            self.assertEqual(btc.update_price(), Decimal("60000"))
+            provider.breaker.opened_at = time.monotonic()
+            stub.prices["bitcoin"] = 1
+            self.assertEqual(btc.update_price(), Decimal("60000"))
+        self.assertEqual(PriceHistory.objects.filter(currency_pair=btc).count(), 1)
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(self.client.get("/api/provider-status/").json()["coingecko"]["circuit"], "open")
+
+
+class FakeProvider:
+    def __init__(self, name, quotes=None, delay=0, error=None):
+        self.name, self.quotes, self.delay, self.error = name, quotes or {}, delay, error
+
+    def fetch(self, id_map):
+        time.sleep(self.delay)
+        return self._quotes(id_map)
+
+    async def afetch(self, id_map):
+        await asyncio.sleep(self.delay)
+        return self._quotes(id_map)
+
+    def _quotes(self, id_map):
+        if self.error:
+            raise self.error
+        return {symbol: Decimal(str(p)) for symbol, p in self.quotes.items() if symbol in id_map}
+
+
+@override_settings(PRICE_PROVIDER_RATE_LIMIT=0)
+class PriceFeedTests(TestCase):
+    id_map = {"BTC": "bitcoin", "ETH": "ethereum", "SOL": "solana"}
+
+    def setUp(self):
+        price_cache.clear()
+        for client in CLIENTS.values():
+            client.reset()
+
+    def test_median_rejects_outliers(self):
+        self.assertEqual(median_quote([Decimal(100), Decimal(101), Decimal(150)], Decimal("0.02")), Decimal("100.5"))
+        self.assertIsNone(median_quote([Decimal(100), Decimal(110)], Decimal("0.02")))
+        self.assertEqual(median_quote([Decimal(100)], Decimal("0.02")), Decimal(100))
+
+    def test_returns_at_quorum_without_waiting_for_slow_provider(self):
+        feed = PriceFeed([
+            FakeProvider("a", {"BTC": 100}), FakeProvider("b", {"BTC": 102, "ETH": 10}),
+            FakeProvider("slow", {"BTC": 1}, delay=2),
+        ], quorum=2, max_deviation=0.05)
+        start = time.monotonic()
+        self.assertEqual(feed.fetch(self.id_map), {"BTC": Decimal(101), "ETH": Decimal(10)})
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_fails_over_and_raises_only_when_every_provider_fails(self):
+        down = requests.ConnectionError("down")
+        feed = PriceFeed([FakeProvider("a", error=down), FakeProvider("b", {"BTC": 100})], quorum=2)
+        self.assertEqual(feed.fetch(self.id_map), {"BTC": Decimal(100)})
+        feed = PriceFeed([FakeProvider("a", error=down), FakeProvider("b", error=requests.Timeout())], quorum=2)
+        with self.assertRaises(requests.ConnectionError):
+            feed.fetch(self.id_map)
+
+    def test_feed_is_built_once_per_process_until_settings_change(self):
+        feed = shared_feed.get()
+        self.assertIs(shared_feed.get(), feed)
+        with override_settings(PRICE_PROVIDERS="coingecko,file"):
+            self.assertEqual([p.name for p in shared_feed.get().providers], ["coingecko", "file"])
+        self.assertIsNot(shared_feed.get(), feed)
+
+    def test_coincap_matches_assets_by_symbol(self):
+        with StubProvider() as stub:
+            stub.symbols["solana"] = "WRONG"
+            quotes = CoinCapProvider(url=stub.coincap_url).fetch(self.id_map)
+        self.assertEqual(quotes, {"BTC": Decimal("60000"), "ETH": Decimal("3000")})
+
+    def test_file_provider_replays_exported_ticks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ticks.ndjson")
+            with open(path, "w") as f:
+                for ts, symbol, price in (("t1", "BTC", "1"), ("t1", "ETH", "2"), ("t2", "BTC", "3")):
+                    f.write(json.dumps({"id": 0, "timestamp": ts, "symbol": symbol, "price": price}) + "\n")
+            replay = FileProvider(path)
+            self.assertEqual(replay.fetch(self.id_map), {"BTC": Decimal(1), "ETH": Decimal(2)})
+            self.assertEqual(replay.fetch(self.id_map), {"BTC": Decimal(3)})
+            with self.assertRaises(EOFError):
+                replay.fetch(self.id_map)
+
+    def test_ingester_publishes_the_median_of_all_providers(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as snapshot, StubProvider() as stub:
+            json.dump({"BTC": 60600, "ETH": 9000}, snapshot)
+            snapshot.flush()
+            with override_settings(
+                PRICE_PROVIDERS="coingecko,coincap,file", PRICE_FEED_QUORUM=3, PRICE_REPLAY_FILE=snapshot.name,
+                COINGECKO_URL=stub.url, COINCAP_URL=stub.coincap_url,
+            ):
+                stub.prices["bitcoin"] = 60000
+                self.assertTrue(PriceIngester(sleep=lambda s: None).run_once())
+        prices = dict(Currency.objects.values_list("base_currency", "current_price"))
+        self.assertEqual(prices["BTC"], Decimal("60000"))  # median of 60000, 60000, 60600
+        self.assertEqual(prices["ETH"], Decimal("3000"))  # the 9000 outlier is dropped
+        self.assertEqual(prices["SOL"], Decimal("150"))
+
+
+class AsyncPathTests(TestCase):
+    def setUp(self):
+        price_cache.clear()
+        for client in CLIENTS.values():
+            client.reset()
+        self.user = User.objects.create_user("ann", password="pw")
+        self.client.force_login(self.user)
+
+    def test_async_client_raises_requests_errors_and_shares_the_breaker(self):
+        client = ProviderClient(breaker=CircuitBreaker(threshold=2), retries=0, read_timeout=0.2)
+
+        async def calls(stub):
+            data = await client.aget_prices(["bitcoin"])
+            stub.statuses = [429]
+            with self.assertRaises(requests.HTTPError) as raised:
+                await client.aget_prices(["bitcoin"])
+            stub.delay = 0.5
+            with self.assertRaises(requests.ReadTimeout):
+                await client.aget_prices(["bitcoin"])
+            return data, raised.exception.response
+
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            data, response = asyncio.run(calls(stub))
+        self.assertEqual(data, {"bitcoin": {"usd": 60000}})
+        self.assertEqual((response.status_code, response.headers["Retry-After"]), (429, "7"))
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(client.status()["failures"], {"http_429": 1, "ReadTimeout": 1})
+
+    def test_feed_afetch_returns_at_quorum(self):
+        feed = PriceFeed([
+            FakeProvider("a", {"BTC": 100}), FakeProvider("b", {"BTC": 102}),
+            FakeProvider("slow", {"BTC": 1}, delay=5),
+        ], quorum=2, max_deviation=0.05)
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(feed.afetch({"BTC": "bitcoin"})), {"BTC": Decimal(101)})
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_cache_aget_shares_one_fetch(self):
+        cache = PriceCache(ttl=10, max_staleness=60)
+        currency = FakeCurrency(delay=0.05)
+
+        async def many():
+            return await asyncio.gather(*(cache.aget(currency) for _ in range(8)))
+
+        self.assertEqual(asyncio.run(many()), [Decimal("100")] * 8)
+        self.assertEqual(currency.calls, 1)
+
+    @override_settings(PRICE_PROVIDER_RATE_LIMIT=0, PRICE_CACHE_MAX_STALENESS=0)
+    def test_quote_api_fetches_and_records_the_price(self):
+        with StubProvider() as stub, override_settings(COINGECKO_URL=stub.url):
+            response = self.client.get("/api/quote/btc/")
+        self.assertEqual(response.json(), {"symbol": "BTC", "price": "60000"})
+        self.assertEqual(PriceHistory.objects.filter(currency_pair__base_currency="BTC").count(), 1)
+        self.assertEqual(self.client.get("/api/quote/NOPE/").status_code, 404)
+
+    def test_update_prices_publishes_stored_prices_with_their_age(self):
+        Currency.objects.filter(base_currency="BTC").update(
+            current_price=Decimal("60000"), price_updated_at=timezone.now() - timedelta(hours=2)
+        )
+        price_cache.clear()
+        body = self.client.post("/api/update-prices/").json()
+        self.assertEqual(body["prices"], {"BTC": "60000.00000000"})  # never-priced pairs are skipped
+        entry = price_cache._entries[("BTC", "USD")]
+        self.assertGreater(time.monotonic() - entry.fetched_at, 7000)
+        price_cache.clear()
+
+    def test_dashboard_api(self):
+        btc = Currency.objects.get(base_currency="BTC")
+        btc.current_price = Decimal("100")
+        btc.save(update_fields=["current_price"])
+        Trade.execute(self.user, btc, "BUY", Decimal("50"), price=Decimal("100"))
+        # user, valuation, holdings, recent trades (the session is cached)
+        with self.assertNumQueries(4):
+            data = self.client.get("/api/dashboard/").json()
+        self.assertEqual((data["cash"], data["total_equity"]), ("9950.00", "10000.00000000"))
+        self.assertEqual(data["holdings"][0]["symbol"], "BTC")
+        self.assertEqual(data["holdings"][0]["amount"], "0.50000000")
+        self.assertEqual([t["side"] for t in data["trades"]], ["BUY"])
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/dashboard/").status_code, 401)
+
+
+class SharedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_urls(self):
+        self.assertEqual(cache_url.parse("redis://:pw@cache:6379/1")["LOCATION"], "redis://:pw@cache:6379/1")
+        self.assertEqual(cache_url.parse("memcached://a:11211,b:11211")["LOCATION"], ["a:11211", "b:11211"])
+        self.assertTrue(cache_url.parse("locmem://")["BACKEND"].endswith("LocMemCache"))
+        with self.assertRaises(ValueError):
+            cache_url.parse("mongodb://db")
+
+    def test_bump_retires_every_entry(self):
+        ns = Namespace("test")
+        calls = []
+        build = lambda: calls.append(1) or len(calls)
+        self.assertEqual(ns.get_or_set(("a",), build), 1)
+        self.assertEqual(ns.get_or_set(("a",), build), 1)
+        ns.bump()
+        self.assertEqual(ns.get_or_set(("a",), build), 2)
+        cache.delete(ns.version_key)  # evicted: a fresh version, never an old one
+        self.assertEqual(ns.get_or_set(("a",), build), 3)
+
+    def test_stored_prices_are_read_once_per_tick(self):
+        btc = Currency.objects.get(base_currency="BTC")
+        store_quotes({"BTC": Decimal("100")}, id_map={"BTC": "bitcoin"})
+        self.assertEqual(Currency.objects.get(pk=btc.pk).load_price(), Decimal("100"))
+        with self.assertNumQueries(0):
+            self.assertEqual(btc.load_price(), Decimal("100"))
+        store_quotes({"BTC": Decimal("200")}, id_map={"BTC": "bitcoin"})
+        self.assertEqual(btc.load_price(), Decimal("200"))
+
+    def test_history_body_is_cached_until_the_next_tick(self):
+        store_quotes({"BTC": Decimal("100")}, id_map={"BTC": "bitcoin"})
+        first = self.client.get("/api/price-history/BTC/").json()["prices"]
+        PriceHistory.objects.create(currency_pair=Currency.objects.get(base_currency="BTC"), price=Decimal("5"))
+        self.assertEqual(self.client.get("/api/price-history/BTC/").json()["prices"], first)
+        store_quotes({"BTC": Decimal("200")}, id_map={"BTC": "bitcoin"})
+        self.assertEqual(len(self.client.get("/api/price-history/BTC/").json()["prices"]), len(first) + 2)
+
+
+class CacheServerTests(TestCase):
+    """The shared cache against a real server (redis-server or memcached on PATH), as two workers would use it."""
+
+    @classmethod
+    def setUpClass(cls):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        if shutil.which("redis-server"):
+            cmd, url = ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"], f"redis://127.0.0.1:{port}/0"
+        elif shutil.which("memcached"):
+            cmd, url = ["memcached", "-l", "127.0.0.1", "-p", str(port)], f"memcached://127.0.0.1:{port}"
+        else:
+            raise unittest.SkipTest("no redis-server or memcached on PATH")
+        super().setUpClass()
+        cls.server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        cls.addClassCleanup(cls.server.terminate)
+        for _ in range(50):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        cls.settings = override_settings(CACHES={"default": cache_url.parse(url, key_prefix="test")})
+        cls.settings.enable()
+        cls.addClassCleanup(cls.settings.disable)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_workers_share_versions_and_entries(self):
+        worker_a, worker_b = caches.create_connection("default"), caches.create_connection("default")
+        worker_a.set("prices:version", 1, timeout=None)
+        worker_a.set("prices:1:pair:1", "stale")
+        self.assertEqual(worker_b.incr("prices:version"), 2)
+        self.assertEqual(prices.key("pair", 1), "prices:2:pair:1")
+        self.assertEqual(prices.get_or_set(("pair", 1), lambda: "fresh"), "fresh")
+        self.assertEqual(worker_b.get("prices:2:pair:1"), "fresh")
+
+    def test_sessions_are_served_from_the_cache(self):
+        session = SessionStore()
+        session["user"] = "ann"
+        session.create()
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(session.session_key)["user"], "ann")
+
+    def test_leaderboard_sorted_set_follows_trades(self):
+        ranking = leaderboard.backend()
+        if not ranking.stored:
+            self.skipTest("the leaderboard sorted set needs Redis")
+        with self.captureOnCommitCallbacks(execute=True):
+            ann, bob = User.objects.create_user("ann"), User.objects.create_user("bob")
+        self.assertTrue(leaderboard.ensure_built())
+        btc = Currency.objects.get(base_currency="BTC")
+        btc.current_price = Decimal("50000")
+        btc.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Trade.execute(bob, btc, "BUY", Decimal("1000"), price=Decimal("50000"))
+            Currency.objects.filter(pk=btc.pk).update(current_price=Decimal("100000"))
+            PortfolioValuation.revalue(currency_ids=[btc.pk])
+        self.assertEqual(leaderboard.rank_of(bob), {"rank": 1, "equity": Decimal("11000.00")})
+        self.assertEqual(leaderboard.rank_of(ann)["rank"], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.delete()
+        self.assertEqual(leaderboard.rank_of(ann)["rank"], 1)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRouterTests(SimpleTestCase):
+    def route(self, fn):
+        return contextvars.copy_context().run(fn)
+
+    def test_only_opted_in_reads_use_a_replica(self):
+        def reads():
+            plain = read_alias()
+            with replica_reads():
+                opted_in = read_alias()
+            return plain, opted_in
+        self.assertEqual(self.route(reads), ("default", "replica_0"))
+
+    def test_writing_keeps_later_reads_on_the_primary(self):
+        router = ReplicaRouter()
+
+        def write_then_read():
+            with replica_reads():
+                before = router.db_for_read(Trade)
+                self.assertEqual(router.db_for_write(Trade), "default")
+                return before, router.db_for_read(Trade)
+        self.assertEqual(self.route(write_then_read), ("replica_0", "default"))
+        self.assertFalse(router.allow_migrate("replica_0", "myapp"))
+
+    @override_settings(DATABASE_REPLICAS=[f"replica_{i}" for i in range(8)])
+    def test_one_replica_serves_a_whole_block(self):
+        def reads():
+            with replica_reads():
+                return {read_alias() for _ in range(50)}
+        self.assertEqual(len(self.route(reads)), 1)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_default(self):
+        def reads():
+            with replica_reads():
+                return read_alias()
+        self.assertEqual(self.route(reads), "default")
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaPinningTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("pia", password="pw")
+        self.client.force_login(self.user)
+
+    def test_a_write_pins_the_user_to_the_primary(self):
+        self.client.get("/api/trades/")
+        self.assertIsNone(cache.get(f"db:pin:{self.user.pk}"))
+        order = {"symbol": "BTC", "side": "BUY", "type": "LIMIT", "usd_amount": "10", "trigger_price": "1"}
+        self.client.post("/api/orders/", json.dumps(order), content_type="application/json")
+        self.assertIsNotNone(cache.get(f"db:pin:{self.user.pk}"))
+
+
+@unittest.skipUnless("replica_0" in connections.databases, "set DATABASE_REPLICA_URLS to run against a replica")
+class ReplicaReadTests(TransactionTestCase):
+    """End to end against a configured replica (mirrored to the test database)."""
+
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        Currency.objects.get_or_create(base_currency="BTC", quote_currency="USD", defaults={"provider_id": "bitcoin"})
+        self.user = User.objects.create_user("rita", password="pw")
+        self.client.force_login(self.user)
+
+    def test_history_reads_go_to_the_replica_until_the_user_trades(self):
+        with CaptureQueriesContext(connections["replica_0"]) as replica:
+            self.client.get("/api/trades/")
+        self.assertGreater(len(replica.captured_queries), 0)
+
+        order = {"symbol": "BTC", "side": "BUY", "type": "LIMIT", "usd_amount": "10", "trigger_price": "1"}
+        response = self.client.post("/api/orders/", json.dumps(order), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        with CaptureQueriesContext(connections["replica_0"]) as replica:
+            self.client.get("/api/trades/")
+        self.assertEqual(len(replica.captured_queries), 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        provider.reset()
+        self.user = User.objects.create_user("mia", password="pw", is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_requests_are_timed_with_their_queries(self):
+        self.client.get("/api/trades/")
+        self.assertEqual(request_seconds.count("trades_api", "GET"), 1)
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('cryptoo_http_requests_total{view="trades_api",method="GET",status="200"} 1', body)
+        self.assertIn('cryptoo_http_request_db_queries_count{view="trades_api"} 1', body)
+        self.assertNotIn('cryptoo_http_request_db_queries_bucket{view="trades_api",le="0"} 1', body)
+        self.assertIn('cryptoo_provider_latency_seconds_count{provider="coingecko"} 0', body)
+
+    async def test_async_views_count_queries_made_in_threads(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get("/api/dashboard/")
+        body = registry.render()
+        self.assertIn('cryptoo_http_request_db_queries_count{view="dashboard_api"} 1', body)
+        self.assertIn('cryptoo_http_request_db_queries_bucket{view="dashboard_api",le="0"} 0', body)
+
+    def test_trade_outcomes(self):
+        btc = Currency.objects.get(base_currency="BTC")
+        Trade.execute(self.user, btc, "BUY", Decimal("100"), price=Decimal("50000"))
+        with self.assertRaises(ValueError):
+            Trade.execute(self.user, btc, "SELL", Decimal("1000"), price=Decimal("50000"))
+        self.assertEqual((trade_seconds.count("BUY", "ok"), trade_seconds.count("SELL", "rejected")), (1, 1))
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=1e-9)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs("myapp.metrics", "WARNING") as logs:
+            self.client.get("/api/trades/")
+        self.assertIn("trades_api", logs.output[0])
+        self.assertIn("myapp_trade", logs.output[0])
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code, 200)
+
+    def test_closed_to_non_staff_without_a_token(self):
+        self.client.force_login(User.objects.create_user("ned", password="pw"))
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.client.logout()
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+
+    def test_unusual_methods_share_one_label(self):
+        self.client.generic("BREW", "/api/trades/")
+        self.assertEqual(request_seconds.count("trades_api", "other"), 1)
+        self.assertNotIn('method="BREW"', registry.render())
+
+
+class BenchmarkTests(TestCase):
+    def test_summarize(self):
+        stats = summarize([0.001] * 99 + [0.1], seconds=2)
+        self.assertEqual((stats["n"], stats["p50_ms"], stats["per_second"]), (100, 1.0, 50.0))
+        self.assertGreater(stats["p99_ms"], 1.0)
+
+    def test_micro_benchmarks_leave_nothing_behind(self):
+        pairs, users = Currency.objects.count(), User.objects.count()
+        with tempfile.NamedTemporaryFile(suffix=".json") as out:
+            call_command("benchmark", "micro", "--sizes", "3", "--repeat", "2", "--warmup", "1", "--output", out.name,
+                         stdout=io.StringIO())
+            with open(out.name) as f:
+                report = json.load(f)
+        self.assertEqual([r["benchmark"] for r in report["results"]], list(BENCHMARKS))
+        self.assertTrue(all(r["n"] == 2 and r["errors"] == 0 for r in report["results"]))
+        self.assertEqual((Currency.objects.count(), User.objects.count()), (pairs, users))
+
+    def test_micro_counts_failed_calls(self):
+        calls = itertools.count()
+
+        def flaky():
+            if next(calls) % 2:
+                raise ValueError("Insufficient holdings")
+
+        with mock.patch.dict(BENCHMARKS, {"flaky": lambda size: flaky}):
+            [result] = run_micro([1], repeat=4, warmup=0, names=["flaky"])
+        self.assertEqual((result["n"], result["errors"]), (2, 2))
+
+
+@override_settings(LEADERBOARD_PAGE_SIZE=2)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.btc = Currency.objects.get(base_currency="BTC")
+        self.users = [User.objects.create_user(name, password="pw") for name in ("ann", "bob", "cat")]
+        PortfolioValuation.objects.filter(user=self.users[2]).update(equity=Decimal("12000"))
+        self.assertTrue(leaderboard.ensure_built())
+
+    def test_ranks_by_equity_and_follows_trades(self):
+        ann, bob, cat = self.users
+        self.assertEqual([r["username"] for r in leaderboard.page(1, 3)["results"]], ["cat", "ann", "bob"])
+        self.assertEqual(leaderboard.rank_of(bob), {"rank": 3, "equity": Decimal("10000.00")})
+
+        Currency.objects.filter(pk=self.btc.pk).update(current_price=Decimal("50000"))
+        self.btc.refresh_from_db()
+        Trade.execute(bob, self.btc, "BUY", Decimal("5000"), price=Decimal("50000"))
+        Currency.objects.filter(pk=self.btc.pk).update(current_price=Decimal("100000"))
+        PortfolioValuation.revalue(currency_ids=[self.btc.pk])
+        # The stored position moves on the next rebuild; the equity is already current.
+        self.assertEqual(leaderboard.rank_of(bob), {"rank": 3, "equity": Decimal("15000.00")})
+        leaderboard.ensure_built()
+        self.assertEqual(leaderboard.rank_of(bob), {"rank": 1, "equity": Decimal("15000.00")})
+
+    def test_stored_ranks_are_read_without_counting(self):
+        with CaptureQueriesContext(connection) as ctx:
+            board = leaderboard.page(2, 2)
+            me = leaderboard.rank_of(self.users[0])
+        self.assertEqual(([r["username"] for r in board["results"]], me["rank"]), (["bob"], 2))
+        self.assertFalse([q["sql"] for q in ctx.captured_queries if "COUNT(" in q["sql"].upper()])
+
+    def test_unranked_users_are_counted_live(self):
+        dan = User.objects.create_user("dan", password="pw")
+        self.assertEqual(leaderboard.rank_of(dan), {"rank": 4, "equity": Decimal("10000.00")})
+        PortfolioValuation.objects.update(equity_rank=None)
+        self.assertEqual(leaderboard.page(1, 4)["total"], 4)
+        self.assertEqual(leaderboard.rank_of(dan)["rank"], 4)
+        leaderboard.ensure_built()
+        self.assertEqual([r["username"] for r in leaderboard.page(1, 4)["results"]], ["cat", "ann", "bob", "dan"])
+
+    def test_api_pages_and_my_rank(self):
+        self.client.force_login(self.users[1])
+        first = self.client.get("/api/leaderboard/").json()
+        self.assertEqual((first["total"], [r["rank"] for r in first["results"]]), (3, [1, 2]))
+        self.assertEqual(first["me"], {"rank": 3, "equity": "10000.00"})
+        second = self.client.get("/api/leaderboard/?page=2").json()
+        self.assertEqual(second["results"], [{"rank": 3, "username": "bob", "equity": "10000.00"}])
+        self.assertEqual(self.client.get("/api/leaderboard/?page=0").status_code, 400)
+        clamped = self.client.get("/api/leaderboard/?page=99999999999999999999").json()
+        self.assertEqual((clamped["page"], clamped["results"]), (2, second["results"]))
+        self.client.logout()
+        self.assertIsNone(self.client.get("/api/leaderboard/").json()["me"])
+
+    def test_page(self):
+        self.client.force_login(self.users[0])
+        response = self.client.get("/leaderboard/")
+        self.assertContains(response, "Your rank: #2")
+        self.assertContains(response, "?page=2")
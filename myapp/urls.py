@@ -8,6 +8,22 @@ urlpatterns = [
     path("logout/", views.logout_view, name="logout"),
     path("dashboard/", views.dashboard, name="dashboard"),
     path("history/", views.trade_history, name="trade_history"),
+    path("leaderboard/", views.leaderboard_view, name="leaderboard"),
+    path("export/trades/", views.export_trades, name="export_trades"),
+    path("export/price-history/<str:symbol>/", views.export_price_history, name="export_price_history"),
+    path("api/analytics/", views.analytics_api, name="analytics_api"),
+    path("api/analytics/<str:symbol>/", views.pair_analytics_api, name="pair_analytics_api"),
+    path("api/dashboard/", views.dashboard_api, name="dashboard_api"),
+    path("api/leaderboard/", views.leaderboard_api, name="leaderboard_api"),
+    path("api/trades/", views.trades_api, name="trades_api"),
+    path("api/orders/", views.orders_api, name="orders_api"),
+    path("api/orders/<int:order_id>/cancel/", views.cancel_order_api, name="cancel_order_api"),
+    path("api/orders/batch/", views.orders_batch_api, name="orders_batch_api"),
     path("api/price-history/<str:symbol>/", views.price_history_api, name="price_history_api"),
+    path("api/candles/<str:symbol>/", views.candles_api, name="candles_api"),
+    path("api/quote/<str:symbol>/", views.quote_api, name="quote_api"),
+    path("api/stream/prices/", views.price_stream, name="price_stream"),
+    path("api/provider-status/", views.provider_status_api, name="provider_status_api"),
     path("api/update-prices/", views.update_prices_api, name="update_prices_api"),
+    path("metrics", views.metrics, name="metrics"),
 ]
\ No newline at end of file
@@ -1,13 +1,38 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseBadRequest
-from django.shortcuts import render, redirect, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.views.decorators.http import condition
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
 
-from .models import Currency, Holding, Trade, PriceHistory, Profile
+from . import leaderboard
+from .analytics import pair_report, portfolio_report
+from .broadcast import broadcaster, current_prices, ticks_since
+from .caching import prices
+from .db_router import read_alias, read_replica
+from .models import Currency, Holding, Order, PortfolioValuation, Trade, PriceCandle, PriceHistory, Profile
 from .forms import TradeForm
-from .tasks import fetch_and_update_prices
+from .exports import FORMATS, PRICE_COLUMNS, TRADE_COLUMNS, achunks, price_rows, serialize, trade_rows
+from .orders import aexecute_batch
+from .pagination import keyset_page
+from .price_cache import price_cache
+from .metrics import registry
+from .provider import CLIENTS
+from .rollups import CANDLE_INTERVALS, candle_source, candles, choose_interval, price_series, source_for_resolution
 
 
 def home_view(request):
@@ -61,28 +86,23 @@ def logout_view(request):
     return redirect("login")
 
 
-@login_required
-def dashboard(request):
-    if request.GET.get("refresh") == "1":
-        try:
-            fetch_and_update_prices()
-            messages.info(request, "Prices refreshed.")
-        except Exception as e:
-            messages.error(request, f"Price refresh failed: {e}")
-
-    currencies = Currency.objects.all().order_by("base_currency")
-    holdings = Holding.objects.filter(user=request.user).select_related("currency_pair")
-    recent_trades = Trade.objects.filter(user=request.user).order_by("-timestamp")[:10]
-
-    # Always ensure profile exists
-    profile, _ = Profile.objects.get_or_create(
-        user=request.user, defaults={"balance": Decimal("10000.00")}
+def dashboard_queries(user):
+    """The dashboard's valuation row, plus its holdings and recent trades (lazy querysets)."""
+    # Totals come from the maintained valuation row; holdings are valued in SQL for the table.
+    valuation = PortfolioValuation.for_user(user)
+    holdings = (
+        Holding.objects.filter(user=user)
+        .select_related("currency_pair")
+        .annotate(value=F("amount") * F("currency_pair__current_price"))
+        .order_by("currency_pair__base_currency")
     )
-    cash = profile.balance
+    recent_trades = Trade.objects.filter(user=user).select_related("currency_pair").order_by("-timestamp")[:10]
+    return valuation, holdings, recent_trades
 
-    portfolio_value = sum(h.market_value for h in holdings)
-    total_equity = cash + portfolio_value
 
+@login_required
+def dashboard(request):
+    # Handle orders first: a successful POST just redirects, so skip the read work.
     if request.method == "POST":
         form = TradeForm(request.POST)
         if form.is_valid():
@@ -109,45 +129,624 @@ def dashboard(request):
     else:
         form = TradeForm()
 
+    valuation, holdings, recent_trades = dashboard_queries(request.user)
     return render(
         request,
         "dashboard.html",
         {
-            "currencies": currencies,
             "holdings": holdings,
             "trades": recent_trades,
             "form": form,
-            "cash": cash,
-            "portfolio_value": portfolio_value,
-            "total_equity": total_equity,
+            "cash": valuation.cash,
+            "portfolio_value": valuation.holdings_value,
+            "total_equity": valuation.equity,
         },
     )
 
 
+async def dashboard_api(request):
+    """The dashboard's data as JSON: valuation totals, holdings with their value and the last 10 trades."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "authentication required"}, status=401)
+    valuation = await PortfolioValuation.objects.filter(user=user).afirst()
+    if valuation is None:
+        valuation = await sync_to_async(PortfolioValuation.for_user)(user)
+    holdings = (
+        Holding.objects.filter(user=user)
+        .annotate(value=F("amount") * F("currency_pair__current_price"))
+        .order_by("currency_pair__base_currency")
+        .values_list("currency_pair__base_currency", "amount", "currency_pair__current_price", "value")
+    )
+    trades = (
+        Trade.objects.filter(user=user)
+        .order_by("-timestamp")
+        .values_list("id", "currency_pair__base_currency", "side", "amount", "usd_value", "price", "timestamp")[:10]
+    )
+    return JsonResponse({
+        "cash": str(valuation.cash),
+        "portfolio_value": str(valuation.holdings_value),
+        "total_equity": str(valuation.equity),
+        "holdings": [
+            {"symbol": symbol, "amount": str(amount), "price": str(price), "value": str(value)}
+            async for symbol, amount, price, value in holdings
+        ],
+        "trades": [
+            {
+                "id": pk, "symbol": symbol, "side": side, "amount": str(amount), "usd_value": str(usd_value),
+                "price": str(price), "timestamp": ts.isoformat(),
+            }
+            async for pk, symbol, side, amount, usd_value, price, ts in trades
+        ],
+    })
+
+
+async def orders_batch_api(request):
+    """
+    Submit many market orders at once as JSON:
+    ``{"mode": "all_or_nothing" | "best_effort", "orders": [{"symbol", "side", "usd_amount"}, ...]}``.
+    Returns per-order results; a rejected all-or-nothing batch answers 409.
+    """
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST required")
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "authentication required"}, status=401)
+    try:
+        payload = json.loads(request.body)
+        mode = payload.get("mode", "all_or_nothing")
+        executed, results = await aexecute_batch(user, payload.get("orders"), mode=mode)
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    ok = executed == len(results)
+    status = 409 if mode == "all_or_nothing" and not ok else 200
+    return JsonResponse({"ok": ok, "mode": mode, "executed": executed, "results": results}, status=status)
+
+
+def _order_json(order):
+    return {
+        "id": order.pk,
+        "symbol": order.currency_pair.base_currency,
+        "side": order.side,
+        "type": order.order_type,
+        "usd_amount": str(order.usd_amount),
+        "trigger_price": str(order.trigger_price),
+        "status": order.status,
+        "reason": order.reason,
+        "trade_id": order.trade_id,
+        "created_at": order.created_at.isoformat(),
+    }
+
+
+async def orders_api(request):
+    """
+    GET lists the user's open limit/stop orders. POST places one:
+    ``{"symbol", "side": "BUY"|"SELL", "type": "LIMIT"|"STOP", "usd_amount", "trigger_price"}``.
+    Orders rest until an ingested price crosses the trigger.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "authentication required"}, status=401)
+    if request.method == "GET":
+        orders = Order.objects.filter(user=user, status="OPEN").select_related("currency_pair").order_by("-id")
+        return JsonResponse({"orders": [_order_json(o) async for o in orders]})
+    if request.method != "POST":
+        return HttpResponseBadRequest("GET or POST required")
+
+    try:
+        payload = json.loads(request.body)
+        side = str(payload.get("side", "")).upper()
+        order_type = str(payload.get("type", "")).upper()
+        usd_amount = Decimal(str(payload.get("usd_amount")))
+        trigger_price = Decimal(str(payload.get("trigger_price")))
+    except (ValueError, AttributeError, ArithmeticError):
+        return JsonResponse({"ok": False, "error": "invalid order"}, status=400)
+    if side not in ("BUY", "SELL") or order_type not in ("LIMIT", "STOP"):
+        return JsonResponse({"ok": False, "error": "side must be BUY/SELL and type LIMIT/STOP"}, status=400)
+    if not usd_amount.is_finite() or usd_amount <= 0 or not trigger_price.is_finite() or trigger_price <= 0:
+        return JsonResponse({"ok": False, "error": "usd_amount and trigger_price must be positive"}, status=400)
+    pair = await Currency.objects.filter(
+        base_currency=str(payload.get("symbol", "")).upper(), quote_currency="USD"
+    ).afirst()
+    if pair is None:
+        return JsonResponse({"ok": False, "error": "unknown symbol"}, status=400)
+
+    order = await Order.objects.acreate(
+        user=user, currency_pair=pair, side=side, order_type=order_type,
+        usd_amount=usd_amount, trigger_price=trigger_price,
+    )
+    return JsonResponse({"ok": True, "order": _order_json(order)}, status=201)
+
+
+async def cancel_order_api(request, order_id):
+    if request.method != "POST":
+        return HttpResponseBadRequest("POST required")
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "authentication required"}, status=401)
+    cancelled = await Order.objects.filter(pk=order_id, user=user, status="OPEN").aupdate(
+        status="CANCELLED", updated_at=timezone.now()
+    )
+    if not cancelled:
+        return JsonResponse({"ok": False, "error": "no open order with that id"}, status=404)
+    return JsonResponse({"ok": True})
+
+
+def _filtered_trades(request):
+    """The user's trades narrowed by ``?side=``, ``?start=`` and ``?end=`` (unix seconds or ISO 8601)."""
+    trades = Trade.objects.filter(user=request.user).select_related("currency_pair")
+    side = request.GET.get("side", "").upper()
+    if side:
+        if side not in ("BUY", "SELL"):
+            raise ValueError("side must be BUY or SELL")
+        trades = trades.filter(side=side)
+    if request.GET.get("start"):
+        trades = trades.filter(timestamp__gte=_parse_time(request.GET["start"]))
+    if request.GET.get("end"):
+        trades = trades.filter(timestamp__lt=_parse_time(request.GET["end"], end=True))
+    return trades
+
+
+def _trade_page(request):
+    page_size = getattr(settings, "TRADE_HISTORY_PAGE_SIZE", 50)
+    return keyset_page(_filtered_trades(request), cursor=request.GET.get("cursor"), page_size=page_size)
+
+
+@read_replica
 @login_required
 def trade_history(request):
-    trades = Trade.objects.filter(user=request.user).select_related("currency_pair").order_by("-timestamp")
-    return render(request, "trade_history.html", {"trades": trades})
+    try:
+        trades, next_cursor = _trade_page(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    next_query = None
+    if next_cursor:
+        query = request.GET.copy()
+        query["cursor"] = next_cursor
+        next_query = query.urlencode()
+    return render(
+        request,
+        "trade_history.html",
+        {"trades": trades, "next_query": next_query, "filters": request.GET},
+    )
+
+
+def _leaderboard_page(request):
+    """The requested ``?page=`` of the leaderboard and the viewer's rank; ValueError for a bad page."""
+    try:
+        number = int(request.GET.get("page", 1))
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise ValueError("page must be a positive integer")
+    board = leaderboard.page(number, settings.LEADERBOARD_PAGE_SIZE)
+    me = leaderboard.rank_of(request.user) if request.user.is_authenticated else None
+    return board, me
+
+
+@read_replica
+def leaderboard_view(request):
+    try:
+        board, me = _leaderboard_page(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    pages = -(-board["total"] // board["page_size"])
+    return render(request, "leaderboard.html", {
+        "board": board,
+        "me": me,
+        "previous_page": board["page"] - 1 if board["page"] > 1 else None,
+        "next_page": board["page"] + 1 if board["page"] < pages else None,
+    })
 
 
-def price_history_api(request, symbol):
+@read_replica
+def leaderboard_api(request):
+    """Users ranked by total equity, ``?page=`` at a time, plus ``me`` (the viewer's rank) when logged in."""
+    try:
+        board, me = _leaderboard_page(request)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({
+        **board,
+        "results": [{**row, "equity": str(row["equity"])} for row in board["results"]],
+        "me": {"rank": me["rank"], "equity": str(me["equity"])} if me else None,
+    })
+
+
+@read_replica
+def trades_api(request):
+    """JSON version of the trade history, with the same filters and ``next_cursor`` pagination."""
+    if not request.user.is_authenticated:
+        return JsonResponse({"ok": False, "error": "authentication required"}, status=401)
+    try:
+        trades, next_cursor = _trade_page(request)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse(
+        {
+            "trades": [
+                {
+                    "id": t.pk,
+                    "symbol": t.currency_pair.base_currency,
+                    "side": t.side,
+                    "amount": str(t.amount),
+                    "usd_value": str(t.usd_value),
+                    "price": str(t.price),
+                    "timestamp": t.timestamp.isoformat(),
+                }
+                for t in trades
+            ],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
+@read_replica
+@login_required
+def analytics_api(request):
+    """
+    P&L (``?method=fifo|average``), equity curve, drawdown and rolling volatility of the
+    user's portfolio, sampled every ``?step=`` seconds with a ``?window=``-sample volatility.
+    """
+    try:
+        step = int(request.GET.get("step", 3600))
+        window = int(request.GET.get("window", 24))
+        report = portfolio_report(request.user, request.GET.get("method", "fifo"), step=step, window=window)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(report)
+
+
+@read_replica
+def pair_analytics_api(request, symbol):
+    """Return, max drawdown and rolling per-tick volatility of ``symbol`` over ``?start=&end=``."""
+    pair = get_object_or_404(Currency, base_currency=symbol.upper(), quote_currency="USD")
+    try:
+        end = _parse_time(request.GET["end"], end=True) if "end" in request.GET else timezone.now()
+        start = _parse_time(request.GET["start"]) if "start" in request.GET else end - timedelta(days=1)
+        window = int(request.GET.get("window", 60))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(pair_report(pair, start, end, window))
+
+
+def _export_response(request, columns, rows, fmt, filename):
+    lines = serialize(columns, rows, fmt)
+    if isinstance(request, ASGIRequest):
+        lines = achunks(lines)
+    response = StreamingHttpResponse(lines, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def _export_params(request):
+    fmt = request.GET.get("format", "csv")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    start = _parse_time(request.GET["start"]) if request.GET.get("start") else None
+    end = _parse_time(request.GET["end"], end=True) if request.GET.get("end") else None
+    return fmt, start, end
+
+
+@read_replica
+@login_required
+def export_trades(request):
+    """Stream the user's full trade log as CSV or NDJSON (``?format=``, ``?start=``, ``?end=``)."""
+    try:
+        fmt, start, end = _export_params(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    # The body streams after the view returns, so pin the rows' database now.
+    rows = trade_rows(user=request.user, start=start, end=end, using=read_alias())
+    return _export_response(request, TRADE_COLUMNS, rows, fmt, "trades")
+
+
+@read_replica
+@login_required
+def export_price_history(request, symbol):
+    """Stream every stored tick for ``symbol`` as CSV or NDJSON."""
+    get_object_or_404(Currency, base_currency=symbol.upper(), quote_currency="USD")
+    try:
+        fmt, start, end = _export_params(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    rows = price_rows(symbol=symbol, start=start, end=end, using=read_alias())
+    return _export_response(request, PRICE_COLUMNS, rows, fmt, f"{symbol.upper()}-price-history")
+
+
+def _latest_tick_query(symbol):
+    return (
+        PriceHistory.objects.filter(currency_pair__base_currency=symbol.upper(), currency_pair__quote_currency="USD")
+        .order_by("-timestamp")
+        .values_list("timestamp", flat=True)
+    )
+
+
+def _latest_tick(request, symbol):
+    """Timestamp of the newest tick for ``symbol`` (one index lookup, memoised per request)."""
+    if not hasattr(request, "_latest_tick"):
+        request._latest_tick = _latest_tick_query(symbol).first()
+    return request._latest_tick
+
+
+def _latest_candle_query(symbol, interval):
+    return (
+        PriceCandle.objects.filter(
+            currency_pair__base_currency=symbol.upper(), currency_pair__quote_currency="USD", interval=interval
+        )
+        .order_by("-bucket_start")
+        .values_list("bucket_start", "count")
+    )
+
+
+def _prefetch_versions(source_interval, sliding=None):
+    """
+    ``condition()`` calls the validator functions synchronously, which can't query from
+    an async view: look up what the response is built from asynchronously first, so
+    they hit the memo. That is the newest tick, plus the newest candle of the rollup
+    ``source_interval(request)`` reads, which ``rollup_prices`` rewrites without a new tick.
+    A response that also depends on the clock (``sliding(request)``) gets no validators.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, symbol, *args, **kwargs):
+            request._latest_tick = request._latest_candle = None
+            if not (sliding and sliding(request)):
+                request._latest_tick = await _latest_tick_query(symbol).afirst()
+                interval = source_interval(request)
+                if interval is not None:
+                    request._latest_candle = await _latest_candle_query(symbol, interval).afirst()
+            return await view(request, symbol, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _query_digest(request):
+    return hashlib.md5(request.GET.urlencode().encode()).hexdigest()[:12]
+
+
+def _history_etag(request, symbol):
+    latest = _latest_tick(request, symbol)
+    if latest is None:
+        return None
+    candle = getattr(request, "_latest_candle", None)
+    rollup = f"{int(candle[0].timestamp())}.{candle[1]}" if candle else "0"
+    return f"{symbol.upper()}-{int(latest.timestamp() * 1_000_000)}-{rollup}-{_query_digest(request)}"
+
+
+def _history_last_modified(request, symbol):
+    # A rewritten candle keeps its bucket time, so only raw-tick responses get a date.
+    if getattr(request, "_latest_candle", None):
+        return None
+    return _latest_tick(request, symbol)
+
+
+# Price history only changes when a tick is ingested or a rollup runs: validators come
+# from the newest tick and candle so unchanged charts get a 304, and shared caches may
+# hold responses briefly. These views read the primary, not a replica: a lagging body
+# stored under an up-to-date ETag would be served to shared caches as current.
+history_cache = condition(etag_func=_history_etag, last_modified_func=_history_last_modified)
+
+
+def _public_cache(view):
+    def patch(response):
+        if response.status_code in (200, 304):
+            patch_cache_control(response, public=True, max_age=getattr(settings, "PRICE_HISTORY_MAX_AGE", 15))
+        return response
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            return patch(await view(request, *args, **kwargs))
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return patch(view(request, *args, **kwargs))
+    return wrapper
+
+
+def _history_source(request):
+    try:
+        source = source_for_resolution(int(request.GET.get("resolution", 0)))
+    except ValueError:
+        return None
+    return None if source == "raw" else source
+
+
+@_public_cache
+@_prefetch_versions(_history_source)
+@history_cache
+async def price_history_api(request, symbol):
+    """
+    Latest 500 points for ``symbol``. ``?resolution=<seconds>`` reads the coarsest
+    stored rollup that still meets the requested resolution instead of raw ticks.
+    The body is shared between workers until the next ingested tick.
+    """
     symbol = symbol.upper()
-    pair = get_object_or_404(Currency, base_currency=symbol, quote_currency="USD")
-    rows = PriceHistory.objects.filter(currency_pair=pair).order_by("timestamp").values("timestamp", "price")[:500]
+    pair = await aget_object_or_404(Currency, base_currency=symbol, quote_currency="USD")
+    try:
+        resolution = int(request.GET.get("resolution", 0))
+    except ValueError:
+        return HttpResponseBadRequest("resolution must be an integer number of seconds")
+
+    def payload():
+        source, rows = price_series(pair, resolution=resolution, limit=500)
+        return {
+            "symbol": symbol,
+            "source": source,
+            "timestamps": [ts.isoformat() for ts, _ in rows],
+            "prices": [str(price) for _, price in rows],
+        }
+
+    return JsonResponse(await prices.aget_or_set(("history", symbol, _query_digest(request)), payload))
+
+
+def _parse_time(value, end=False):
+    """
+    Accept unix seconds, an ISO 8601 timestamp or a date (naive values are UTC). As an
+    exclusive ``end`` bound a date includes that whole day, i.e. means the next midnight.
+    """
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        try:
+            return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            # nan, inf or a number of seconds outside the representable range
+            raise ValueError(f"invalid time: {value!r}")
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime(day.year, day.month, day.day) + timedelta(days=1 if end else 0)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"invalid time: {value!r}")
+    return parsed if timezone.is_aware(parsed) else parsed.replace(tzinfo=dt_timezone.utc)
+
+
+def _candle_window(request):
+    """``(interval, start, end)`` for a candles request, the interval already coarsened; ValueError if invalid."""
+    interval = request.GET.get("interval", "1h")
+    if interval not in CANDLE_INTERVALS:
+        raise ValueError(f"interval must be one of {', '.join(CANDLE_INTERVALS)}")
+    end = _parse_time(request.GET["end"], end=True) if "end" in request.GET else timezone.now()
+    start = _parse_time(request.GET["start"]) if "start" in request.GET else end - timedelta(days=1)
+    if start >= end:
+        raise ValueError("start must be before end")
+    return choose_interval(interval, start, end, getattr(settings, "CANDLES_MAX_POINTS", 1000)), start, end
+
+
+def _candles_source(request):
+    try:
+        interval, _, _ = _candle_window(request)
+    except ValueError:
+        return None
+    return candle_source(interval)
+
+
+@_public_cache
+@_prefetch_versions(_candles_source, sliding=lambda request: "end" not in request.GET)
+@history_cache
+async def candles_api(request, symbol):
+    """
+    OHLC candles for ``symbol`` over ``?start=&end=`` at ``?interval=`` (1m, 5m, 15m, 1h, 4h, 1d).
+    The interval is coarsened server-side so a response never holds more than
+    ``CANDLES_MAX_POINTS`` buckets. Columns: t (unix seconds), o, h, l, c, n (tick count).
+    """
+    symbol = symbol.upper()
+    pair = await aget_object_or_404(Currency, base_currency=symbol, quote_currency="USD")
+    try:
+        interval, start, end = _candle_window(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    max_points = getattr(settings, "CANDLES_MAX_POINTS", 1000)
+    rows = (await sync_to_async(candles)(pair, interval, start, end))[-max_points:]
     return JsonResponse(
         {
             "symbol": symbol,
-            "timestamps": [r["timestamp"].isoformat() for r in rows],
-            "prices": [str(r["price"]) for r in rows],
+            "interval": interval,
+            "start": int(start.timestamp()),
+            "end": int(end.timestamp()),
+            "t": [int(r[0].timestamp()) for r in rows],
+            "o": [float(r[1]) for r in rows],
+            "h": [float(r[2]) for r in rows],
+            "l": [float(r[3]) for r in rows],
+            "c": [float(r[4]) for r in rows],
+            "n": [r[5] for r in rows],
         }
     )
 
 
-def update_prices_api(request):
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def price_stream(request):
+    """
+    Server-sent events for ``?symbols=BTC,ETH`` (default: all pairs). Sends a ``snapshot``
+    of current prices, then every new tick as a ``tick`` event. Reconnecting clients
+    (``Last-Event-ID`` or ``?since=<tick id>``) first receive the ticks they missed.
+    """
+    symbols = [s.strip().upper() for s in request.GET.get("symbols", "").split(",") if s.strip()]
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.GET.get("since") or 0)
+    except ValueError:
+        return HttpResponseBadRequest("since must be a tick id")
+    keepalive = getattr(settings, "PRICE_STREAM_KEEPALIVE", 15)
+
+    async def events():
+        queue = await broadcaster.subscribe(symbols)
+        try:
+            yield _sse("snapshot", await sync_to_async(current_prices)(symbols))
+            sent = since
+            if since:
+                backlog = await sync_to_async(ticks_since)(since, symbols)
+                if backlog:
+                    sent = backlog[-1]["id"]
+                    yield _sse("tick", backlog, event_id=sent)
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                batch = [t for t in batch if t["id"] > sent]
+                if batch:
+                    sent = batch[-1]["id"]
+                    yield _sse("tick", batch, event_id=sent)
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def quote_api(request, symbol):
+    """This worker's quote for ``symbol``, refreshed through the price cache (and the providers) when stale."""
+    pair = await aget_object_or_404(Currency, base_currency=symbol.upper(), quote_currency="USD")
+    price = await price_cache.aget(pair)
+    return JsonResponse({"symbol": pair.base_currency, "price": str(price) if price else None})
+
+
+async def update_prices_api(request):
+    """
+    Prices are refreshed by the ``ingest_prices`` daemon; this only syncs this worker's
+    quote cache from the latest ingested prices and returns them.
+    """
     if request.method != "POST":
         return HttpResponseBadRequest("POST required")
-    try:
-        fetch_and_update_prices()
-        return JsonResponse({"ok": True})
-    except Exception as e:
-        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+    prices = {}
+    pairs = Currency.objects.filter(quote_currency="USD", price_updated_at__isnull=False).order_by("base_currency")
+    async for pair in pairs:
+        # Keep the price's real age: one the daemon stopped updating must not look fresh.
+        price_cache.publish(pair, pair.current_price, updated_at=pair.price_updated_at)
+        prices[pair.base_currency] = str(pair.current_price)
+    return JsonResponse({"ok": True, "prices": prices})
+
+
+def provider_status_api(request):
+    """Per provider: circuit state, request/failure counters and latency histogram of this process's client."""
+    return JsonResponse({name: client.status() for name, client in CLIENTS.items()})
+
+
+def metrics(request):
+    """
+    This process's metrics (see metrics.py) in the Prometheus text format, for
+    ``Authorization: Bearer <METRICS_TOKEN>`` or a staff session (anyone under DEBUG
+    when no token is configured).
+    """
+    token = settings.METRICS_TOKEN
+    authorized = (
+        bool(token) and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    ) or request.user.is_staff or (settings.DEBUG and not token)
+    if not authorized:
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,31 @@
+"""
+Build a ``CACHES`` entry from a URL, the way ``dj_database_url`` does for databases:
+
+* ``locmem://[name]`` - per-process memory (development; nothing is shared between workers)
+* ``redis://[:password@]host:port/db`` (or ``rediss://``) - Django's Redis backend
+* ``memcached://host:port[,host:port...]`` - Django's pymemcache backend
+* ``dummy://`` - caches nothing
+"""
+from urllib.parse import urlsplit
+
+BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache",
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def parse(url, timeout=300, key_prefix=""):
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ValueError(f"unsupported cache URL scheme {parts.scheme!r}; use one of {', '.join(BACKENDS)}")
+    config = {"BACKEND": BACKENDS[parts.scheme], "TIMEOUT": timeout, "KEY_PREFIX": key_prefix}
+    if parts.scheme in ("redis", "rediss"):
+        config["LOCATION"] = url
+    elif parts.scheme == "memcached":
+        config["LOCATION"] = parts.netloc.split(",")
+    elif parts.scheme == "locmem":
+        config["LOCATION"] = parts.netloc or "default"
+    return config
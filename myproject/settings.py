@@ -17,6 +17,7 @@ import cloudinary.api
 from decouple import config
 import os
 import dj_database_url
+from myproject import cache_url
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -62,11 +63,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myapp.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myapp.db_router.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -94,15 +97,129 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Persistent connections suit the WSGI workers; the ASGI profile (deploy/gunicorn_asgi.py)
+# sets DB_CONN_MAX_AGE=0 since async requests don't reliably reuse a thread's connection.
 DATABASES = {
     'default': dj_database_url.config(
        
         default= os.getenv('DATABASE_URL'),
-        conn_max_age = 600
+        conn_max_age = int(os.getenv('DB_CONN_MAX_AGE', 600))
     )
        
 }
 
+# Read replicas: DATABASE_REPLICA_URLS is a comma-separated list of database URLs.
+# Views and commands that opt in (history, exports, analytics, backtests) read from a
+# replica picked once per request; a user who just wrote is pinned to the primary for
+# REPLICA_PIN_SECONDS (keep it above the replicas' lag). Tests mirror them to default.
+DATABASE_REPLICAS = []
+for _i, _url in enumerate(u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()):
+    DATABASES[f'replica_{_i}'] = dj_database_url.parse(
+        _url, conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', 600)), test_options={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(f'replica_{_i}')
+DATABASE_ROUTERS = ['myapp.db_router.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+
+# Shared cache, configured from CACHE_URL (see myproject/cache_url.py): locmem:// for
+# development, redis://host:6379/0 or memcached://host:11211 (needs pymemcache) so
+# every worker sees the same entries. CACHE_TIMEOUT is the default entry lifetime.
+CACHES = {
+    'default': cache_url.parse(
+        os.getenv('CACHE_URL', 'locmem://'),
+        timeout=int(os.getenv('CACHE_TIMEOUT', 300)),
+        key_prefix=os.getenv('CACHE_KEY_PREFIX', 'cryptoo'),
+    )
+}
+# Sessions are read from the cache and written through to the database.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+
+# Price quotes
+# Seconds a cached quote is served without refreshing, and the upper bound on how
+# stale a quote may be before callers block on a fresh fetch.
+PRICE_CACHE_TTL = int(os.getenv('PRICE_CACHE_TTL', 30))
+PRICE_CACHE_MAX_STALENESS = int(os.getenv('PRICE_CACHE_MAX_STALENESS', 300))
+PRICE_FETCH_TIMEOUT = float(os.getenv('PRICE_FETCH_TIMEOUT', 5))
+
+# Attempts for Trade.execute when the database reports a lock conflict or deadlock.
+TRADE_MAX_ATTEMPTS = int(os.getenv('TRADE_MAX_ATTEMPTS', 5))
+# Trades per page on /history/ and /api/trades/.
+TRADE_HISTORY_PAGE_SIZE = int(os.getenv('TRADE_HISTORY_PAGE_SIZE', 50))
+
+# Upper bound on equity-curve samples per analytics report; the step widens to fit.
+ANALYTICS_MAX_POINTS = int(os.getenv('ANALYTICS_MAX_POINTS', 5000))
+
+# Ticks per chunk streamed into the backtester.
+BACKTEST_CHUNK_SIZE = int(os.getenv('BACKTEST_CHUNK_SIZE', 50000))
+
+# Rows fetched per server-side cursor round-trip by the streaming exports.
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+
+# Maximum orders accepted by /api/orders/batch/.
+ORDER_BATCH_MAX = int(os.getenv('ORDER_BATCH_MAX', 100))
+
+# Matching engine: each sync re-reads orders updated this many seconds before the previous
+# one (late commits), and the books are fully reloaded from the database every RESYNC_INTERVAL.
+ORDER_SYNC_OVERLAP = float(os.getenv('ORDER_SYNC_OVERLAP', 60))
+ORDER_BOOK_RESYNC_INTERVAL = float(os.getenv('ORDER_BOOK_RESYNC_INTERVAL', 300))
+
+# Background ingestion (`manage.py ingest_prices`)
+COINGECKO_URL = os.getenv('COINGECKO_URL', 'https://api.coingecko.com/api/v3/simple/price')
+PRICE_INGEST_INTERVAL = float(os.getenv('PRICE_INGEST_INTERVAL', 15))
+PRICE_INGEST_JITTER = float(os.getenv('PRICE_INGEST_JITTER', 0.2))
+PRICE_INGEST_MAX_IN_FLIGHT = int(os.getenv('PRICE_INGEST_MAX_IN_FLIGHT', 4))
+PRICE_INGEST_MAX_BACKOFF = float(os.getenv('PRICE_INGEST_MAX_BACKOFF', 300))
+# Provider request limits: ids per request, length of the joined ids parameter, requests per minute.
+PRICE_PROVIDER_MAX_IDS = int(os.getenv('PRICE_PROVIDER_MAX_IDS', 250))
+PRICE_PROVIDER_MAX_IDS_LENGTH = int(os.getenv('PRICE_PROVIDER_MAX_IDS_LENGTH', 1800))
+PRICE_PROVIDER_RATE_LIMIT = int(os.getenv('PRICE_PROVIDER_RATE_LIMIT', 30))
+# Price feed: comma-separated providers (coingecko, coincap, file) queried concurrently.
+# A tick returns once QUORUM providers answered (or TIMEOUT seconds passed); each symbol's
+# price is the median after dropping quotes more than MAX_DEVIATION (a fraction) from it.
+PRICE_PROVIDERS = os.getenv('PRICE_PROVIDERS', 'coingecko')
+PRICE_FEED_QUORUM = int(os.getenv('PRICE_FEED_QUORUM', 2))
+PRICE_FEED_MAX_DEVIATION = float(os.getenv('PRICE_FEED_MAX_DEVIATION', 0.02))
+PRICE_FEED_TIMEOUT = float(os.getenv('PRICE_FEED_TIMEOUT', 10))
+COINCAP_URL = os.getenv('COINCAP_URL', 'https://api.coincap.io/v2/assets')
+COINCAP_API_KEY = os.getenv('COINCAP_API_KEY', '')
+# JSON snapshot or NDJSON replay (the `export_data prices --format ndjson` layout) for the file provider.
+PRICE_REPLAY_FILE = os.getenv('PRICE_REPLAY_FILE', '')
+# Shared provider client: pooled keep-alive connections, connect timeout (the read timeout is
+# PRICE_FETCH_TIMEOUT), retries of failed connections/reads with exponential backoff, and a
+# circuit breaker that opens after N consecutive failures for RESET seconds.
+PRICE_PROVIDER_POOL_SIZE = int(os.getenv('PRICE_PROVIDER_POOL_SIZE', 10))
+PRICE_PROVIDER_CONNECT_TIMEOUT = float(os.getenv('PRICE_PROVIDER_CONNECT_TIMEOUT', 3.05))
+PRICE_PROVIDER_RETRIES = int(os.getenv('PRICE_PROVIDER_RETRIES', 2))
+PRICE_PROVIDER_BACKOFF = float(os.getenv('PRICE_PROVIDER_BACKOFF', 0.3))
+PRICE_PROVIDER_BREAKER_THRESHOLD = int(os.getenv('PRICE_PROVIDER_BREAKER_THRESHOLD', 5))
+PRICE_PROVIDER_BREAKER_RESET = float(os.getenv('PRICE_PROVIDER_BREAKER_RESET', 30))
+# Retention for raw PriceHistory ticks and 1m candles (`manage.py rollup_prices --prune`).
+PRICE_HISTORY_RETENTION_DAYS = int(os.getenv('PRICE_HISTORY_RETENTION_DAYS', 7))
+PRICE_CANDLE_1M_RETENTION_DAYS = int(os.getenv('PRICE_CANDLE_1M_RETENTION_DAYS', 90))
+# Upper bound on buckets returned by /api/candles/; wider ranges get a coarser interval.
+CANDLES_MAX_POINTS = int(os.getenv('CANDLES_MAX_POINTS', 1000))
+# max-age (seconds) for public caching of price history and candle responses.
+PRICE_HISTORY_MAX_AGE = int(os.getenv('PRICE_HISTORY_MAX_AGE', 15))
+# Server-sent price stream: seconds between DB polls for new ticks, and between keepalives.
+PRICE_STREAM_POLL_INTERVAL = float(os.getenv('PRICE_STREAM_POLL_INTERVAL', 1))
+PRICE_STREAM_KEEPALIVE = float(os.getenv('PRICE_STREAM_KEEPALIVE', 15))
+# Seconds before the tracked-symbol index is reloaded even without a local change.
+PRICE_SYMBOL_INDEX_TTL = int(os.getenv('PRICE_SYMBOL_INDEX_TTL', 60))
+
+# Where leaderboard rankings are read from: auto (a Redis sorted set when CACHE_URL is
+# Redis, else ranks stored in the database and renumbered each ingestion tick), redis
+# or database.
+LEADERBOARD_BACKEND = os.getenv('LEADERBOARD_BACKEND', 'auto')
+LEADERBOARD_PAGE_SIZE = int(os.getenv('LEADERBOARD_PAGE_SIZE', 50))
+
+# Requests slower than this (seconds) are logged with their slowest SQL; 0 disables.
+METRICS_SLOW_REQUEST_SECONDS = float(os.getenv('METRICS_SLOW_REQUEST_SECONDS', 0))
+# /metrics answers "Authorization: Bearer <METRICS_TOKEN>" and staff sessions; with no
+# token it is open only under DEBUG.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators